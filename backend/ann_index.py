@@ -0,0 +1,138 @@
+import numpy as np
+
+from embedding_store import l2_normalize
+
+def default_list_count(num_vectors):
+    return int(max(1, min(num_vectors, round(4 * np.sqrt(num_vectors)))))
+
+def nearest_centroids(vectors, centroids, chunk=65536):
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        assignment[start:start + chunk] = np.argmax(np.asarray(vectors[start:start + chunk], dtype=np.float32) @ centroids.T, axis=1)
+    return assignment
+
+def train_centroids(vectors, n_lists, iterations=10, sample_size=None, seed=0):
+    # Spherical k-means on a sample: centroids stay unit length so assignment is a dot product
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), sample_size or min(64 * n_lists, 100000))
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), size=sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = nearest_centroids(sample, centroids)
+        counts = np.bincount(assignment, minlength=n_lists)
+        order = np.argsort(assignment, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        sums[counts > 0] = np.add.reduceat(sample[order], starts[counts > 0], axis=0)
+        # Reseed empty lists from random sample points so no list goes to waste
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(len(sample), size=len(empty))]
+        centroids = l2_normalize(sums).astype(np.float32)
+    return centroids
+
+def build_ivf_arrays(vectors, attributes, n_lists=None, seed=0):
+    # Inverted file layout: rows grouped by their nearest centroid, with every
+    # filterable attribute stored in the same order so filters run inside the scan
+    n_lists = n_lists or default_list_count(len(vectors))
+    centroids = train_centroids(vectors, n_lists, seed=seed)
+    assignment = nearest_centroids(vectors, centroids)
+
+    rows = np.argsort(assignment, kind='stable')
+    counts = np.bincount(assignment, minlength=n_lists)
+    arrays = {
+        'centroids': centroids,
+        'offsets': np.concatenate([[0], np.cumsum(counts)]),
+        'rows': rows,
+        'vectors': np.asarray(vectors[rows], dtype=np.float32),
+    }
+    for name, values in attributes.items():
+        arrays[f"attr_{name}"] = np.asarray(values)[rows]
+    return arrays
+
+class IVFIndex:
+    """Approximate cosine search over unit-length vectors.
+
+    Only the `n_probe` lists whose centroids are closest to the query are
+    scanned. Filters are applied to each scanned list, and probing keeps going
+    until `k` matches are found, so a selective filter costs more lists
+    rather than missing results. Lists holding no row with a filtered value
+    are skipped, so a filter nothing matches returns at once instead of
+    scanning the whole index.
+    """
+
+    def __init__(self, centroids, offsets, rows, vectors, attributes):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+        self.attributes = attributes
+        self.list_values = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def filter_mask(self, positions, filters, exclude):
+        mask = np.ones(len(positions), dtype=bool)
+        for name, value in (filters or {}).items():
+            mask &= np.isin(self.attributes[name][positions], value)
+        for name, value in (exclude or {}).items():
+            mask &= ~np.isin(self.attributes[name][positions], value)
+        return mask
+
+    def lists_holding(self, name, value):
+        # Per list, whether any of its rows has one of these values; the (lists x values) table is built on first use
+        if name not in self.list_values:
+            values, inverse = np.unique(np.asarray(self.attributes[name]), return_inverse=True)
+            table = np.zeros((len(self.centroids), len(values)), dtype=bool)
+            table[np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets)), inverse] = True
+            self.list_values[name] = values, table
+        values, table = self.list_values[name]
+        return table[:, np.isin(values, value)].any(axis=1)
+
+    def search(self, query, k=10, n_probe=8, filters=None, exclude=None):
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if k <= 0 or len(self.rows) == 0:
+            return empty
+        candidates = np.ones(len(self.centroids), dtype=bool)
+        for name, value in (filters or {}).items():
+            candidates &= self.lists_holding(name, value)
+        if not candidates.any():
+            return empty
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        list_order = np.argsort(-(self.centroids @ query))
+        # Probe in the same groups of n_probe as without the check, stopping after the last list that can match
+        list_order = list_order[:np.flatnonzero(candidates[list_order])[-1] + 1]
+
+        found_rows, found_scores = [], []
+        found = 0
+        for start in range(0, len(list_order), n_probe):
+            probed = list_order[start:start + n_probe]
+            probed = probed[candidates[probed]]
+            if len(probed) == 0:
+                continue
+            positions = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probed])
+            positions = positions[self.filter_mask(positions, filters, exclude)]
+
+            found_rows.append(self.rows[positions])
+            found_scores.append(self.vectors[positions] @ query)
+            found += len(positions)
+            if found >= k:
+                break
+
+        rows = np.concatenate(found_rows) if found_rows else np.zeros(0, dtype=np.int64)
+        scores = np.concatenate(found_scores) if found_scores else np.zeros(0, dtype=np.float32)
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+def exact_search(vectors, query, k=10):
+    query = np.asarray(query, dtype=np.float32)
+    scores = np.asarray(vectors, dtype=np.float32) @ (query / (np.linalg.norm(query) or 1))
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top, scores[top]
@@ -0,0 +1,49 @@
+# Run from the backend directory: python -m benchmarks.ann_recall [scale]
+# Recall@K of the IVF index against exact search, and queries/sec, over the catalog tiled `scale` times.
+import sys
+import time
+import numpy as np
+
+from ann_index import IVFIndex, build_ivf_arrays, exact_search
+from embedding_store import l2_normalize
+
+NPY_PATH = 'final_backend_embeddings.npy'
+SCALE = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+K = 10
+QUERIES = 200
+PROBES = [1, 2, 4, 8, 16, 32]
+AREAS = 8
+
+rng = np.random.default_rng(0)
+base = np.load(NPY_PATH).astype(np.float32)
+vectors = l2_normalize(np.tile(l2_normalize(base), (SCALE, 1)) + rng.normal(scale=0.1, size=(len(base) * SCALE, base.shape[1])).astype(np.float32))
+areas = rng.integers(0, AREAS, size=len(vectors))
+
+start = time.perf_counter()
+arrays = build_ivf_arrays(vectors, {'area': areas})
+build_seconds = time.perf_counter() - start
+index = IVFIndex(arrays['centroids'], arrays['offsets'], arrays['rows'], arrays['vectors'], {'area': arrays['attr_area']})
+print(f"{len(vectors)} vectors x {vectors.shape[1]}d, {len(arrays['centroids'])} lists, built in {build_seconds:.2f}s")
+
+queries = vectors[rng.choice(len(vectors), size=QUERIES, replace=False)]
+query_areas = rng.integers(0, AREAS, size=QUERIES)
+
+def run(search):
+    results = []
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        results.append(set(search(i, query).tolist()))
+    return results, QUERIES / (time.perf_counter() - start)
+
+truth, exact_qps = run(lambda i, q: exact_search(vectors, q, K)[0])
+area_rows = [np.flatnonzero(areas == a) for a in range(AREAS)]
+filtered_truth, filtered_exact_qps = run(lambda i, q: area_rows[query_areas[i]][exact_search(vectors[area_rows[query_areas[i]]], q, K)[0]])
+
+print(f"exact: {exact_qps:.0f} qps, exact with area filter: {filtered_exact_qps:.0f} qps")
+print(f"{'n_probe':>8} {f'recall@{K}':>10} {'qps':>8} {'filtered recall':>16} {'filtered qps':>13}")
+for n_probe in PROBES:
+    found, qps = run(lambda i, q: index.search(q, K, n_probe)[0])
+    filtered, filtered_qps = run(lambda i, q: index.search(q, K, n_probe, filters={'area': query_areas[i]})[0])
+    recall = np.mean([len(f & t) / K for f, t in zip(found, truth)])
+    filtered_recall = np.mean([len(f & t) / K for f, t in zip(filtered, filtered_truth)])
+    print(f"{n_probe:>8} {recall:>10.3f} {qps:>8.0f} {filtered_recall:>16.3f} {filtered_qps:>13.0f}")
@@ -0,0 +1,92 @@
+# Run from the backend directory: python -m benchmarks.bpr_sampler [--pairs 500000]  (needs torch)
+# Samples/sec on CPU of the old per-sample BPRDataset + DataLoader collation against the tensor batch
+# sampler in training_pipeline/bpr_sampler.py, for data loading alone and with an embedding BPR step.
+import argparse
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+
+from training_pipeline.bpr_sampler import BPRBatches
+
+BATCH_SIZE = 2048
+
+class LegacyBPRDataset(Dataset):
+    # What train_twotower.py used before: one tensor triple per sample, collated by the DataLoader
+    def __init__(self, user_item_pairs, num_items):
+        self.user_item_pairs = user_item_pairs
+        self.num_items = num_items
+
+    def __len__(self):
+        return len(self.user_item_pairs)
+
+    def __getitem__(self, idx):
+        user_idx, pos_item_idx = self.user_item_pairs[idx]
+        neg_item_idx = np.random.randint(self.num_items)
+        return torch.tensor(user_idx), torch.tensor(pos_item_idx), torch.tensor(neg_item_idx)
+
+class EmbeddingBPR(nn.Module):
+    def __init__(self, num_users, num_items):
+        super().__init__()
+        self.users = nn.Embedding(num_users, 64)
+        self.items = nn.Embedding(num_items, 64)
+
+    def forward(self, users, pos_items, neg_items):
+        user_vec = self.users(users)
+        pos_scores = (user_vec * self.items(pos_items)).sum(dim=-1)
+        if neg_items.dim() == 1:
+            neg_items = neg_items[:, None]
+        neg_scores = (user_vec[:, None, :] * self.items(neg_items)).sum(dim=-1)
+        return -torch.nn.functional.logsigmoid(pos_scores[:, None] - neg_scores).mean()
+
+def samples_per_second(loader, step=None, max_batches=None):
+    start = time.perf_counter()
+    seen = 0
+    for i, (users, pos_items, neg_items) in enumerate(loader):
+        if step is not None:
+            step(users, pos_items, neg_items)
+        seen += len(users)
+        if max_batches and i + 1 >= max_batches:
+            break
+    return seen / (time.perf_counter() - start)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--pairs', type=int, default=500000)
+parser.add_argument('--users', type=int, default=3500)
+parser.add_argument('--items', type=int, default=50000)
+parser.add_argument('--workers', type=int, default=2)
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+pairs = np.stack([rng.integers(0, args.users, args.pairs), rng.integers(0, args.items, args.pairs)], axis=1)
+# About 35 items per restaurant, like the generated catalogs
+item_restaurants = np.sort(rng.integers(0, args.items // 35 + 1, args.items))
+
+model = EmbeddingBPR(args.users, args.items)
+optimizer = torch.optim.Adam(model.parameters(), lr=0.005)
+
+def train_step(users, pos_items, neg_items):
+    optimizer.zero_grad()
+    loss = model(users, pos_items, neg_items)
+    loss.backward()
+    optimizer.step()
+
+def batches(num_negatives=1, hard_negative_ratio=0.0):
+    return BPRBatches(pairs[:, 0], pairs[:, 1], args.items, BATCH_SIZE, num_negatives, item_restaurants, hard_negative_ratio)
+
+# The legacy loader is slow enough that a slice of the epoch gives a stable rate
+legacy_batches = max(1, min(50, args.pairs // BATCH_SIZE))
+configs = [
+    ('legacy Dataset + DataLoader', lambda: DataLoader(LegacyBPRDataset(pairs, args.items), batch_size=BATCH_SIZE, shuffle=True), legacy_batches),
+    ('BPRBatches, 1 negative', lambda: DataLoader(batches(), batch_size=None), None),
+    ('BPRBatches, 4 negatives (2 hard)', lambda: DataLoader(batches(4, 0.5), batch_size=None), None),
+    (f'BPRBatches, 4 negatives, {args.workers} workers', lambda: DataLoader(batches(4, 0.5), batch_size=None, num_workers=args.workers), None),
+]
+
+print(f"{args.pairs} positive pairs, batch size {BATCH_SIZE}, torch {torch.__version__}, {torch.get_num_threads()} threads")
+print(f"{'':>40} {'loading samples/s':>18} {'with BPR step samples/s':>24}")
+for name, make_loader, max_batches in configs:
+    loading = samples_per_second(make_loader(), max_batches=max_batches)
+    training = samples_per_second(make_loader(), step=train_step, max_batches=max_batches)
+    print(f"{name:>40} {loading:>18,.0f} {training:>24,.0f}")
@@ -0,0 +1,87 @@
+# Run from the backend directory: python -m benchmarks.catalog_memory [--items 1000000]
+# Memory per million items and filter speed for the catalog as a plain read_csv frame and the
+# previous snapshot layout (fixed-width string columns), against the dictionary-encoded layout.
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from snapshot import CodedColumn, load_catalog_column, write_catalog_columns
+from training_pipeline.generate_catalog import CatalogWriter, build_menu, synthetic_restaurants
+from benchmarks.synthetic_catalog import LOCALITY_TYPE
+
+REPEATS = 20
+
+def median_ms(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def dir_mb(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1e6
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--items', type=int, default=1000000)
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+menu = build_menu(synthetic_restaurants(args.items // 35 + 1), rng, LOCALITY_TYPE).iloc[:args.items]
+per_million = 1e6 / len(menu)
+
+with tempfile.TemporaryDirectory() as tmp:
+    csv_path = os.path.join(tmp, 'items.csv')
+    writer = CatalogWriter(csv_path)
+    writer.write(menu.copy())
+    plain = pd.read_csv(csv_path)
+
+    # Before: every string column as a fixed-width unicode array, ints as int64, and a DataFrame over them
+    old_columns = {}
+    for col in plain.columns:
+        values = plain[col]
+        is_text = values.dtype == object or pd.api.types.is_string_dtype(values)
+        old_columns[col] = values.fillna('').astype(str).to_numpy(dtype=str) if is_text else values.to_numpy()
+    old_df = pd.DataFrame(old_columns)
+
+    # After: the snapshot writer's layout, loaded the way the server maps it
+    coded = write_catalog_columns(plain, os.path.join(tmp, 'catalog'))
+    catalog = {col: load_catalog_column(os.path.join(tmp, 'catalog', col), col in coded) for col in plain.columns}
+    new_df = pd.DataFrame({col: v.to_categorical() if isinstance(v, CodedColumn) else v for col, v in catalog.items()})
+
+    print(f"{len(plain)} items; MB per million items")
+    print(f"  read_csv frame (deep)            {frame_mb(plain) * per_million:>8.1f}")
+    print(f"  snapshot columns, before         {sum(v.nbytes for v in old_columns.values()) / 1e6 * per_million:>8.1f}")
+    print(f"  snapshot columns, after          {dir_mb(os.path.join(tmp, 'catalog')) * per_million:>8.1f}")
+    print(f"  serving DataFrame, before (deep) {frame_mb(old_df) * per_million:>8.1f}")
+    print(f"  serving DataFrame, after (deep)  {frame_mb(new_df) * per_million:>8.1f}")
+    print(f"  dictionary-encoded: {', '.join(coded)}")
+    print(f"  dtypes after: {', '.join(f'{c}={catalog[c].dtype}' for c in plain.columns if c not in coded)}")
+
+    category, locality = catalog['category'], catalog['locality']
+    drink = int(np.flatnonzero(category.vocab == 'Drink')[0])
+    filters = {
+        "category == 'Drink'": (
+            lambda: np.flatnonzero(plain['category'].to_numpy() == 'Drink'),
+            lambda: np.flatnonzero(category.codes == drink),
+        ),
+        "locality contains 'patia'": (
+            lambda: np.flatnonzero(plain['locality'].str.contains('patia', case=False, regex=False).to_numpy()),
+            # Match the dictionary once, then test each row's code against it
+            lambda: np.flatnonzero(pd.Series(locality.vocab).str.contains('patia', case=False, regex=False).to_numpy()[locality.codes]),
+        ),
+        "veg desserts": (
+            lambda: np.flatnonzero((plain['category'].to_numpy() == 'Dessert') & (plain['is_veg'].to_numpy() == 1)),
+            lambda: np.flatnonzero((category.codes == int(np.flatnonzero(category.vocab == 'Dessert')[0])) & (catalog['is_veg'] == 1)),
+        ),
+    }
+    print(f"\n{'filter':>28} {'strings ms':>11} {'codes ms':>9} {'rows':>8}")
+    for name, (before, after) in filters.items():
+        assert np.array_equal(before(), after())
+        print(f"{name:>28} {median_ms(before):>11.2f} {median_ms(after):>9.2f} {len(after()):>8}")
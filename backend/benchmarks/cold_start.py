@@ -0,0 +1,31 @@
+# Run from the backend directory: python -m benchmarks.cold_start
+# Times a worker's `import model_utils` with and without a ready snapshot.
+import shutil
+import statistics
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RUNS = 5
+
+def timed_import(snapshot_dir, statement="import model_utils"):
+    env = dict(os.environ, ZOMATHON_SNAPSHOT_DIR=snapshot_dir)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True, stdout=subprocess.DEVNULL, env=env)
+    return time.perf_counter() - start
+
+snapshot_dir = tempfile.mkdtemp(prefix="zomathon-snapshots-")
+try:
+    # First import has to build the snapshot, which is what every worker paid before
+    cold = timed_import(snapshot_dir)
+    warm = [timed_import(snapshot_dir) for _ in range(RUNS)]
+    libraries = [timed_import(snapshot_dir, "import pandas, numpy") for _ in range(RUNS)]
+finally:
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+baseline = statistics.median(libraries)
+print(f"interpreter + pandas/numpy import: {baseline:.3f}s")
+print(f"import model_utils, building snapshot: {cold:.3f}s ({cold - baseline:.3f}s over baseline)")
+print(f"import model_utils, snapshot ready:    {statistics.median(warm):.3f}s ({statistics.median(warm) - baseline:.3f}s over baseline, median of {RUNS})")
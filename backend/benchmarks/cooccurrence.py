@@ -0,0 +1,109 @@
+# Run from the backend directory: python -m benchmarks.cooccurrence [--sessions 100000 500000 2000000]
+# Mining co-purchase neighbours from simulated session logs of growing size: time and peak memory of the
+# chunked miner in training_pipeline/mine_cooccurrence.py against loading the whole log into pandas and
+# self-joining it on session_id. Then the cost of the co-occurrence signal in the hybrid score: p50/p99
+# of scored recommendations with and without it, interleaved per request.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from cooccurrence import CooccurrenceTable, write_cooccurrence
+from model_utils import ITEMS_PATH, current_model
+from result_cache import ResultCache
+from training_pipeline.simulate_interactions import simulate
+from benchmarks.suite import BACKEND_DIR
+
+REQUESTS = 5000
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sessions', type=int, nargs='+', default=[100000, 500000, 2000000])
+parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+parser.add_argument('--naive-max-sessions', type=int, default=500000, help="largest log the in-memory self-join runs on")
+args = parser.parse_args()
+
+MINER = """
+import json, time
+from benchmarks.suite import memory_mb
+from training_pipeline.mine_cooccurrence import mine
+start = time.perf_counter()
+edges = mine({log!r}, {items!r}, {out!r}, {chunk_rows}, 3, 20, 50_000_000)
+print(json.dumps({{'seconds': time.perf_counter() - start, 'peak_mb': memory_mb()['VmHWM'], 'edges': edges}}))
+"""
+
+NAIVE = """
+import json, time
+import pandas as pd
+from benchmarks.suite import memory_mb
+start = time.perf_counter()
+df = pd.read_csv({log!r}, usecols=['session_id', 'item_id', 'interaction_type'])
+baskets = df[df['interaction_type'].isin(['add_to_cart', 'order'])].drop_duplicates(['session_id', 'item_id'])
+pairs = baskets.merge(baskets, on='session_id')
+pairs = pairs[pairs['item_id_x'] < pairs['item_id_y']].groupby(['item_id_x', 'item_id_y']).size()
+print(json.dumps({{'seconds': time.perf_counter() - start, 'peak_mb': memory_mb()['VmHWM'], 'pairs': len(pairs)}}))
+"""
+
+def run_child(code):
+    # Its own process, so the peak resident memory is this job's alone
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BACKEND_DIR, os.environ.get('PYTHONPATH', '')]))
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def interleaved_percentiles(variants, args_list):
+    timings = {name: [] for name in variants}
+    for arg in args_list:
+        for name, fn in variants.items():
+            start = time.perf_counter()
+            fn(arg)
+            timings[name].append((time.perf_counter() - start) * 1000)
+    return {name: np.percentile(values, [50, 99]) for name, values in timings.items()}
+
+workdir = tempfile.mkdtemp(prefix='zomathon-cooc-')
+try:
+    print(f"{'':>26} {'log rows':>11} {'seconds':>8} {'rows/s':>11} {'peak MB':>8}")
+    for sessions in args.sessions:
+        log = os.path.join(workdir, f"interactions-{sessions}.csv")
+        rows = simulate(ITEMS_PATH, log, sessions, 250000, 42, 1)
+        out = os.path.join(workdir, 'item_cooccurrence.npz')
+        mined = run_child(MINER.format(log=log, items=ITEMS_PATH, out=out, chunk_rows=args.chunk_rows))
+        results = [('chunked miner', mined)]
+        if sessions <= args.naive_max_sessions:
+            results.append(('whole log self-join', run_child(NAIVE.format(log=log))))
+        for name, result in results:
+            print(f"{name:>26} {rows:>11,} {result['seconds']:>8.2f} {rows / result['seconds']:>11,.0f} {result['peak_mb']:>8.0f}")
+        if sessions != args.sessions[-1]:
+            os.remove(log)
+    print(f"{mined['edges']:,} neighbour edges mined from the largest log")
+
+    model = current_model()
+    model.precomputed_recs = None
+    model.result_cache = ResultCache(max_entries=0, version=model.version)
+    table_dir = os.path.join(workdir, 'table')
+    os.makedirs(table_dir)
+    write_cooccurrence(table_dir, out, model.catalog['item_id'], model.snapshot['restaurant_slots'])
+    table = CooccurrenceTable.load(table_dir)
+
+    def scored(row, cooccurrence):
+        model.cooccurrence = cooccurrence
+        return model.compute_meal_completion_rows(row, 6)
+
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(model.catalog['item_id']), REQUESTS)
+    print(f"{REQUESTS} scored requests, catalog {len(model.df)} items, {len(table)} edges on the catalog's menus")
+    print(f"{'':>26} {'p50 ms':>8} {'p99 ms':>8}")
+    results = interleaved_percentiles({
+        'without co-occurrence': lambda row: scored(row, None),
+        'with co-occurrence': lambda row: scored(row, table),
+        'neighbour lookup only': lambda row: table.edges(np.array([row])),
+    }, rows.tolist())
+    for name, (p50, p99) in results.items():
+        print(f"{name:>26} {p50:>8.4f} {p99:>8.4f}")
+    added = results['with co-occurrence'] - results['without co-occurrence']
+    print(f"{'added by co-occurrence':>26} {added[0]:>8.4f} {added[1]:>8.4f}")
+finally:
+    shutil.rmtree(workdir)
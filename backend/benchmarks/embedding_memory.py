@@ -0,0 +1,67 @@
+# Run from the backend directory: python -m benchmarks.embedding_memory
+# Reports per-worker resident memory for the embedding matrix at 1x, 10x and 100x the catalog size.
+# Linux only: reads RssAnon (private to the worker) and RssFile (shared page cache) from /proc.
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+from embedding_store import write_embedding_store
+
+NPY_PATH = 'final_backend_embeddings.npy'
+SCALES = [1, 10, 100]
+WORKERS = 4
+
+WORKER = """
+import sys
+import numpy as np
+from embedding_store import EmbeddingStore
+
+mode, path = sys.argv[1], sys.argv[2]
+if mode == 'np.load':
+    vectors = np.load(path)
+else:
+    vectors = EmbeddingStore(path, normalized=True)
+
+# Score every row once, the way a full scan would touch the whole matrix
+query = np.ones(vectors.shape[1], dtype=np.float32)
+for start in range(0, len(vectors), 8192):
+    vectors[start:start + 8192] @ query
+
+status = dict(line.split(':', 1) for line in open('/proc/self/status'))
+print(int(status['RssAnon'].split()[0]), int(status['RssFile'].split()[0]))
+"""
+
+def worker_rss(mode, path):
+    out = subprocess.run([sys.executable, '-c', WORKER, mode, path], check=True, capture_output=True, text=True)
+    anon_kb, file_kb = map(int, out.stdout.split())
+    return anon_kb / 1024, file_kb / 1024
+
+base = np.load(NPY_PATH).astype(np.float32)
+rng = np.random.default_rng(0)
+workdir = tempfile.mkdtemp(prefix='zomathon-embeddings-')
+
+# A worker holding a single row: interpreter, numpy and shared libraries only
+np.save(os.path.join(workdir, 'idle.npy'), base[:1])
+idle_anon, idle_file = worker_rss('np.load', os.path.join(workdir, 'idle.npy'))
+
+print(f"Base catalog: {base.shape[0]} x {base.shape[1]}, {WORKERS} workers")
+print(f"Idle worker: RssAnon {idle_anon:.1f} MB, RssFile {idle_file:.1f} MB (subtracted below)")
+print(f"{'scale':>6} {'mode':>14} {'matrix MB':>10} {'RssAnon MB':>11} {'RssFile MB':>11} {f'total x{WORKERS} MB':>14}")
+try:
+    for scale in SCALES:
+        vectors = np.tile(base, (scale, 1)) + rng.normal(scale=0.01, size=(base.shape[0] * scale, base.shape[1])).astype(np.float32)
+        for mode, dtype in [('np.load', 'float32'), ('mmap float32', 'float32'), ('mmap float16', 'float16')]:
+            path = os.path.join(workdir, f"{scale}_{dtype}.npy")
+            if not os.path.exists(path):
+                write_embedding_store(path, vectors, dtype=dtype, normalize=True)
+            anon, shared = worker_rss(mode, path)
+            anon, shared = anon - idle_anon, shared - idle_file
+            matrix_mb = os.path.getsize(path) / 2 ** 20
+            # Private pages are paid per worker, file-backed pages once for the whole host
+            total = WORKERS * anon + shared
+            print(f"{scale:>5}x {mode:>14} {matrix_mb:>10.1f} {anon:>11.1f} {shared:>11.1f} {total:>14.1f}")
+finally:
+    shutil.rmtree(workdir, ignore_errors=True)
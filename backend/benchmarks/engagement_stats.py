@@ -0,0 +1,87 @@
+# Run from the backend directory: python -m benchmarks.engagement_stats [--events 2000000]
+# Refreshing last-hour engagement stats from the interaction log: re-reading every segment with pandas
+# and grouping (what answering the question took before) against the incremental tailer in
+# engagement_stats.py, for a cold pass, a pass after new events, a report and a restart from checkpoint.
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from engagement_stats import ADD, IMPRESSION, EngagementStats
+from interaction_log import LOG_COLUMNS
+
+SEGMENT_ROWS = 1_000_000
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--events', type=int, default=2_000_000)
+parser.add_argument('--new-events', type=int, default=10000)
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+log_dir = tempfile.mkdtemp(prefix='zomathon-engagement-')
+segment_seq = 0
+
+def write_segment(n, hours_ago):
+    # Same layout as a CSV segment from interaction_log.py, spread over the last `hours_ago` hours
+    global segment_seq
+    now = datetime.now()
+    stamps = pd.Series([now - timedelta(seconds=s) for s in np.sort(rng.uniform(0, hours_ago * 3600, n))[::-1]])
+    frame = pd.DataFrame({
+        'timestamp': stamps.map(datetime.isoformat),
+        'user_id': 'user_' + pd.Series(rng.integers(0, 5000, n)).astype(str),
+        'anchor_item_id': rng.zipf(1.2, n) % 50000,
+        'recommended_item_id': rng.integers(0, 50000, n),
+        'action': np.where(rng.random(n) < 0.12, ADD, IMPRESSION),
+    }, columns=LOG_COLUMNS)
+    path = os.path.join(log_dir, f"interactions-{now.strftime('%Y%m%dT%H%M%S')}-1-{segment_seq:04d}.csv")
+    frame.to_csv(path, index=False)
+    segment_seq += 1
+    return path
+
+def full_rescan():
+    frames = [pd.read_csv(os.path.join(log_dir, name)) for name in sorted(os.listdir(log_dir)) if name.endswith('.csv')]
+    df = pd.concat(frames, ignore_index=True)
+    df = df[pd.to_datetime(df['timestamp'], format='ISO8601') >= datetime.now() - timedelta(hours=1)]
+    return df.groupby(['anchor_item_id', 'recommended_item_id', 'action']).size()
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+try:
+    for start in range(0, args.events, SEGMENT_ROWS):
+        write_segment(min(SEGMENT_ROWS, args.events - start), 23)
+    log_bytes = sum(os.path.getsize(os.path.join(log_dir, name)) for name in os.listdir(log_dir))
+    print(f"{args.events} logged events in {segment_seq} segments ({log_bytes / 1e6:.0f} MB)")
+
+    stats = EngagementStats(log_dir=log_dir, interval=0)
+    rescan_cold, _ = timed(full_rescan)
+    tail_cold, read = timed(stats.poll)
+    checkpoint, _ = timed(stats.save_checkpoint)
+
+    write_segment(args.new_events, 0.01)
+    rescan_new, _ = timed(full_rescan)
+    tail_new, read_new = timed(stats.poll)
+    report, result = timed(lambda: stats.report(3600))
+    restart, resumed = timed(lambda: EngagementStats(log_dir=log_dir, interval=0))
+    resume_pass, reread = timed(resumed.poll)
+
+    print(f"{'':>44} {'seconds':>9}")
+    print(f"{'full rescan + groupby, cold':>44} {rescan_cold:>9.3f}")
+    print(f"{'tailer first pass (' + str(read) + ' rows)':>44} {tail_cold:>9.3f}")
+    print(f"{'full rescan + groupby, +' + str(args.new_events) + ' events':>44} {rescan_new:>9.3f}")
+    print(f"{'tailer pass, +' + str(read_new) + ' rows':>44} {tail_new:>9.3f}")
+    print(f"{'report (window, baseline, alerts, top 20)':>44} {report:>9.4f}")
+    print(f"{'checkpoint write':>44} {checkpoint:>9.3f}")
+    print(f"{'restart from checkpoint + pass (' + str(reread) + ' rows)':>44} {restart + resume_pass:>9.3f}")
+    summary = stats.stats()
+    print(f"counter memory {summary['memory_bytes'] / 1e6:.1f} MB for {summary['anchors_tracked']} anchors and "
+          f"{summary['pairs_tracked']} pairs tracked ({summary['evictions']} evictions), whatever the log size; "
+          f"last hour: {result['total']}")
+finally:
+    shutil.rmtree(log_dir)
@@ -0,0 +1,76 @@
+# Run from the backend directory: python -m benchmarks.graph_build [--items 20000]
+# Memory and build time of the old `graphs` dict (one networkx graph per restaurant, turned into score
+# tables with nx.to_numpy_array) against the synergy matrix + item CSR path the snapshot builder uses.
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import networkx as nx
+import pandas as pd
+
+from graph_scores import (
+    build_graph_score_tables, build_restaurant_graph, item_concept_csr, personalized_pagerank_matrix, synergy_matrix,
+)
+from training_pipeline.generate_catalog import build_menu, synthetic_restaurants
+from benchmarks.synthetic_catalog import LOCALITY_TYPE
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--items', type=int, default=20000)
+args = parser.parse_args()
+
+menu = build_menu(synthetic_restaurants(args.items // 35 + 1), np.random.default_rng(0), LOCALITY_TYPE).iloc[:args.items]
+menu.insert(0, 'item_id', np.arange(1, len(menu) + 1))
+df = menu.astype({col: object for col in ['locality', 'cuisine_type', 'category']})
+groups = df.groupby('restaurant_id', sort=True).indices
+print(f"{len(df)} items across {len(groups)} restaurants")
+
+def build_graphs():
+    return {res_id: build_restaurant_graph(df.iloc[rows]) for res_id, rows in groups.items()}
+
+# Timed without tracemalloc, which slows networkx's many small allocations down severalfold
+start = time.perf_counter()
+graphs = build_graphs()
+graphs_seconds = time.perf_counter() - start
+del graphs
+tracemalloc.start()
+graphs = build_graphs()
+graphs_mb = tracemalloc.get_traced_memory()[0] / 1e6
+tracemalloc.stop()
+
+start = time.perf_counter()
+old_tables = []
+for rows, G in zip(groups.values(), graphs.values()):
+    items = df['item_id'].to_numpy()[rows].tolist()
+    nodelist = items + [n for n in G.nodes if n not in set(items)]
+    scores = personalized_pagerank_matrix(nx.to_numpy_array(G, nodelist=nodelist, weight='weight'))
+    old_tables.append(scores[:len(items), :len(items)].astype(np.float32).ravel())
+old_table_seconds = time.perf_counter() - start
+del graphs
+
+def build_structure():
+    restaurant_rows = np.concatenate(list(groups.values()))
+    offsets = np.concatenate([[0], np.cumsum([len(rows) for rows in groups.values()])])
+    category_codes, category_vocab = pd.factorize(df['category'])
+    cuisine_codes, cuisine_vocab = pd.factorize(df['cuisine_type'])
+    synergy, n_category_nodes = synergy_matrix(category_vocab, len(cuisine_vocab))
+    indptr, indices = item_concept_csr(category_codes[restaurant_rows], cuisine_codes[restaurant_rows], n_category_nodes, len(cuisine_vocab))
+    return offsets, synergy, indptr, indices
+
+start = time.perf_counter()
+build_structure()
+structure_seconds = time.perf_counter() - start
+tracemalloc.start()
+offsets, synergy, indptr, indices = build_structure()
+structure_mb = tracemalloc.get_traced_memory()[0] / 1e6
+tracemalloc.stop()
+
+start = time.perf_counter()
+new_scores, _ = build_graph_score_tables(offsets, indptr, indices, synergy)
+new_table_seconds = time.perf_counter() - start
+
+error = float(np.abs(np.concatenate(old_tables) - new_scores).max())
+print(f"{'':>28} {'build s':>8} {'memory MB':>10} {'score tables s':>15}")
+print(f"{'networkx graphs dict':>28} {graphs_seconds:>8.2f} {graphs_mb:>10.1f} {old_table_seconds:>15.2f}")
+print(f"{'synergy matrix + CSR':>28} {structure_seconds:>8.2f} {structure_mb:>10.1f} {new_table_seconds:>15.2f}")
+print(f"  synergy matrix {synergy.shape[0]}x{synergy.shape[1]} ({synergy.nbytes / 1e3:.1f} KB), "
+      f"CSR {(indptr.nbytes + indices.nbytes) / 1e6:.2f} MB; max abs table difference {error:.2e}")
@@ -0,0 +1,43 @@
+# Run from the backend directory: python -m benchmarks.graph_scores
+# Checks the snapshot's graph score table against nx.pagerank for every item and times both paths.
+import sys
+import time
+import numpy as np
+import networkx as nx
+
+from graph_scores import build_restaurant_graph
+from model_utils import current_model
+
+TOLERANCE = 1e-5
+
+model = current_model()
+
+worst = 0.0
+checked = 0
+pagerank_time = 0.0
+lookup_time = 0.0
+
+for slot in range(len(model.restaurant_offsets) - 1):
+    index = model.restaurant_candidates(slot)
+    item_ids = index['item_ids'].tolist()
+    G = build_restaurant_graph(model.df.iloc[index['rows']])
+
+    for local, item_id in enumerate(item_ids):
+        start = time.perf_counter()
+        expected = nx.pagerank(G, personalization={item_id: 1.0}, weight='weight', alpha=0.85, tol=1e-10)
+        pagerank_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        row = model.graph_score_row(slot, local)
+        lookup_time += time.perf_counter() - start
+
+        expected_row = np.array([expected[i] for i in item_ids])
+        worst = max(worst, float(np.abs(expected_row - row).max()))
+        checked += 1
+
+print(f"Compared {checked} personalized PageRank vectors, max abs error {worst:.2e}")
+print(f"nx.pagerank: {pagerank_time / checked * 1000:.3f}ms per item, table lookup: {lookup_time / checked * 1e6:.3f}us per item")
+
+if worst > TOLERANCE:
+    print(f"FAILED: graph score table deviates from nx.pagerank by more than {TOLERANCE}")
+    sys.exit(1)
@@ -0,0 +1,96 @@
+# Run from the backend directory: python -m benchmarks.ingest_throughput
+# Interaction ingest under load: the old open/append-per-click path against the queued logger,
+# first in-process from several threads, then through the ASGI app with concurrent clients.
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+EVENTS = 20000
+THREADS = 8
+CONCURRENCY = 64
+BATCH = 100
+
+log_dir = tempfile.mkdtemp(prefix='zomathon-ingest-')
+os.environ['ZOMATHON_LOG_DIR'] = log_dir
+
+from interaction_log import InteractionLogger
+
+def event(i):
+    return (datetime.now().isoformat(), f"user_{i % 500}", i % 4000, (i * 7) % 4000, 'added_to_cart')
+
+def legacy_log(path, e):
+    # What /log_interaction used to do for every click
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            f.write("timestamp,user_id,anchor_item_id,recommended_item_id,action\n")
+    with open(path, "a") as f:
+        f.write(",".join(str(v) for v in e) + "\n")
+
+def run_threads(fn):
+    per_thread = EVENTS // THREADS
+    def work(t):
+        for i in range(t * per_thread, (t + 1) * per_thread):
+            fn(event(i))
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+print(f"In-process, {EVENTS} events from {THREADS} threads")
+elapsed = run_threads(lambda e: legacy_log(os.path.join(log_dir, 'legacy.csv'), e))
+print(f"{'open/append per event':>28}: {EVENTS / elapsed:>10.0f} events/s")
+
+for fmt in ['csv', 'parquet', 'arrow']:
+    logger = InteractionLogger(log_dir=os.path.join(log_dir, fmt), fmt=fmt)
+    logger.start()
+    enqueue = run_threads(logger.log)
+    start = time.perf_counter()
+    logger.close()
+    drain = time.perf_counter() - start
+    stats = logger.stats()
+    assert stats['written'] == EVENTS and stats['dropped'] == 0
+    print(f"{'queued logger (' + fmt + ')':>28}: {EVENTS / enqueue:>10.0f} events/s enqueued, "
+          f"{EVENTS / (enqueue + drain):>10.0f} events/s on disk, {stats['flushes']} flushes")
+
+import httpx
+import main
+
+async def drive(client, requests):
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    async def send(path, body):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200
+    start = time.perf_counter()
+    await asyncio.gather(*(send(path, body) for path, body in requests))
+    return time.perf_counter() - start, np.percentile(latencies, [50, 99])
+
+def body(i):
+    return {'user_id': f"user_{i % 500}", 'anchor_item_id': i % 4000, 'recommended_item_id': (i * 7) % 4000, 'action': 'added_to_cart'}
+
+async def asgi_benchmark():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        single = [('/log_interaction', body(i)) for i in range(EVENTS // 4)]
+        elapsed, (p50, p99) = await drive(client, single)
+        print(f"{'POST /log_interaction':>28}: {len(single) / elapsed:>10.0f} events/s, p50 {p50:.2f}ms p99 {p99:.2f}ms")
+
+        batches = [('/log_interactions', {'events': [body(i * BATCH + j) for j in range(BATCH)]}) for i in range(EVENTS // BATCH)]
+        elapsed, (p50, p99) = await drive(client, batches)
+        print(f"{'POST /log_interactions':>28}: {EVENTS / elapsed:>10.0f} events/s, p50 {p50:.2f}ms p99 {p99:.2f}ms per {BATCH}-event request")
+
+print(f"\nThrough ASGI, {CONCURRENCY} concurrent clients")
+main.interaction_logger.start()
+asyncio.run(asgi_benchmark())
+main.interaction_logger.close()
+print(f"Logger after shutdown: {main.interaction_logger.stats()}  (segments in {log_dir})")
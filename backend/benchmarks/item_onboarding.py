@@ -0,0 +1,62 @@
+# Run from the backend directory: python -m benchmarks.item_onboarding [--items 1000000]
+# Seconds until new menu items are servable: a full snapshot build of the grown catalog against
+# ModelState.with_items on the running state, for batches of 10, 100 and 1000 items, then the first
+# recommendation for a new item. Item vectors come from a random text projection over random text
+# embeddings (sentence encoding is left out; see benchmarks/text_embedding_cache.py for that stage).
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_catalog import write_synthetic_catalog
+from item_additions import TextProjection, new_item_vectors
+from model_state import ModelState
+from result_cache import ResultCache
+from snapshot import build_snapshot, load_snapshot, read_catalog
+
+BATCH_SIZES = [10, 100, 1000]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--items', type=int, default=1000000)
+args = parser.parse_args()
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+with tempfile.TemporaryDirectory() as tmp:
+    write_synthetic_catalog(tmp, args.items)
+    items_path, npy_path = os.path.join(tmp, 'items.parquet'), os.path.join(tmp, 'final_backend_embeddings.npy')
+    state = ModelState(load_snapshot(build_snapshot(items_path, npy_path, os.path.join(tmp, 'snapshots'))), ResultCache())
+    catalog = read_catalog(items_path)
+
+    rng = np.random.default_rng(0)
+    projection_path = os.path.join(tmp, 'text_projection.npz')
+    np.savez(projection_path, w1=rng.standard_normal((128, 384), dtype=np.float32) / 20, b1=np.zeros(128, dtype=np.float32),
+             w2=rng.standard_normal((32, 128), dtype=np.float32) / 11, b2=np.zeros(32, dtype=np.float32), text_model='all-MiniLM-L6-v2')
+    projection = TextProjection(projection_path)
+
+    print(f"{len(catalog)} items, {state.manifest['num_restaurants']} restaurants")
+    print(f"{'new items':>10} {'full rebuild s':>15} {'vectors s':>10} {'with_items s':>13} {'first rec ms':>13}")
+    for size in BATCH_SIZES:
+        # Dishes copied onto existing menus, the last tenth as a restaurant that is not in the catalog yet
+        new = catalog.iloc[rng.choice(len(catalog), size, replace=False)].reset_index(drop=True)
+        new['item_id'] = catalog['item_id'].max() + 1 + np.arange(size)
+        new.loc[size - max(1, size // 10):, 'restaurant_id'] = catalog['restaurant_id'].max() + 1
+
+        vector_seconds, vectors = timed(lambda: new_item_vectors(state.snapshot, new, rng.standard_normal((size, 384)), projection))
+        add_seconds, grown = timed(lambda: state.with_items(new, vectors, f"{size:06d}"))
+        rec_seconds, _ = timed(lambda: grown.get_meal_completion_rows(int(new['item_id'].iloc[0])))
+
+        grown_dir = os.path.join(tmp, f"grown{size}")
+        os.makedirs(grown_dir)
+        pd.concat([catalog, new], ignore_index=True).to_parquet(os.path.join(grown_dir, 'items.parquet'))
+        np.save(os.path.join(grown_dir, 'final_backend_embeddings.npy'), np.concatenate([np.load(npy_path, mmap_mode='r'), vectors]))
+        rebuild_seconds, _ = timed(lambda: ModelState(load_snapshot(build_snapshot(
+            os.path.join(grown_dir, 'items.parquet'), os.path.join(grown_dir, 'final_backend_embeddings.npy'),
+            os.path.join(grown_dir, 'snapshots'))), ResultCache()))
+
+        print(f"{size:>10} {rebuild_seconds:>15.2f} {vector_seconds:>10.3f} {add_seconds:>13.3f} {rec_seconds * 1000:>13.2f}")
@@ -0,0 +1,51 @@
+# Run from the backend directory: python -m benchmarks.metrics_overhead
+# Cost of the instrumentation itself: one stage span, and the metrics middleware around a minimal ASGI app.
+import asyncio
+import time
+
+from metrics import Histogram, MetricsMiddleware
+
+CALLS = 200000
+REQUESTS = 50000
+
+def per_call_ns(fn):
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        fn()
+    return (time.perf_counter() - start) / CALLS * 1e9
+
+histogram = Histogram()
+
+def span():
+    with histogram.time():
+        pass
+
+baseline = per_call_ns(lambda: None)
+print(f"stage span: {per_call_ns(span) - baseline:.0f}ns per observation")
+
+async def app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'[]'})
+
+class Passthrough:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+async def per_request_us(wrapped):
+    scope = {'type': 'http', 'method': 'GET', 'path': '/recommend/1'}
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await wrapped(scope, receive, send)
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+passthrough = asyncio.run(per_request_us(Passthrough(app)))
+measured = asyncio.run(per_request_us(MetricsMiddleware(app)))
+print(f"metrics middleware: {measured - passthrough:.1f}us per request over a pass-through ASGI layer")
@@ -0,0 +1,73 @@
+# Run from the backend directory: python -m benchmarks.personalized_latency [--users 1000000]
+# Added latency of personalized recommendations: p50/p99 of the scored (cache-miss) path without a
+# user, with an unknown user and with a known user, and of the user lookup alone. Uses the snapshot's
+# user tower, or a synthetic one of --users users when the model has none.
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from model_utils import current_model
+from result_cache import ResultCache
+from user_store import UserStore, write_user_store
+
+REQUESTS = 5000
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=1_000_000)
+args = parser.parse_args()
+
+def interleaved_percentiles(variants, args_list):
+    # Every variant runs on the same request back to back, so drift over the run affects them all alike
+    timings = {name: [] for name in variants}
+    for arg in args_list:
+        for name, fn in variants.items():
+            start = time.perf_counter()
+            fn(*arg)
+            timings[name].append((time.perf_counter() - start) * 1000)
+    return {name: np.percentile(values, [50, 99]) for name, values in timings.items()}
+
+model = current_model()
+model.precomputed_recs = None
+model.result_cache = ResultCache(max_entries=0, version=model.version)
+rng = np.random.default_rng(0)
+
+tmp = None
+if model.user_store is None:
+    # Users near random items, the way BPR places them, in a store built exactly like a snapshot's
+    tmp = tempfile.mkdtemp(prefix='zomathon-users-')
+    dim = model.embeddings.shape[1]
+    users = rng.standard_normal((args.users, dim)).astype(np.float32)
+    np.save(f"{tmp}/vectors.npy", users)
+    np.save(f"{tmp}/ids.npy", np.array([f"U_{i}" for i in range(args.users)]))
+    start = time.perf_counter()
+    write_user_store(tmp, f"{tmp}/vectors.npy", f"{tmp}/ids.npy")
+    print(f"Built a synthetic user store of {args.users} users in {time.perf_counter() - start:.1f}s")
+    model.user_store = UserStore.load(tmp)
+    user_ids = [f"U_{i}" for i in rng.integers(0, args.users, REQUESTS)]
+else:
+    # The real ids are not in the store, only their hashes: recover them from the exported id file when present
+    ids = np.load('final_user_ids.npy')
+    user_ids = ids[rng.integers(0, len(ids), REQUESTS)].tolist()
+
+try:
+    item_ids = rng.choice(model.catalog['item_id'], REQUESTS).tolist()
+    for item_id, user_id in zip(item_ids[:200], user_ids[:200]):
+        model.get_meal_completion_rows(item_id, 6, user_id)
+
+    print(f"{REQUESTS} scored requests, catalog {len(model.df)} items, {len(model.user_store)} users")
+    print(f"{'':>26} {'p50 ms':>8} {'p99 ms':>8}")
+    results = interleaved_percentiles({
+        'no user': lambda i, u: model.get_meal_completion_rows(i, 6),
+        'unknown user': lambda i, u: model.get_meal_completion_rows(i, 6, 'not-a-user'),
+        'known user': lambda i, u: model.get_meal_completion_rows(i, 6, u),
+        'user lookup only': lambda i, u: model.user_vector(u),
+    }, list(zip(item_ids, user_ids)))
+    for name, (p50, p99) in results.items():
+        print(f"{name:>26} {p50:>8.4f} {p99:>8.4f}")
+    added = results['known user'] - results['no user']
+    print(f"{'added by personalization':>26} {added[0]:>8.4f} {added[1]:>8.4f}")
+finally:
+    if tmp:
+        shutil.rmtree(tmp)
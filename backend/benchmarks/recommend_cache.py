@@ -0,0 +1,67 @@
+# Run from the backend directory: python -m benchmarks.recommend_cache
+# Sizing the recommendation result cache: hit rate and memory for a range of cache sizes under
+# Zipf-distributed anchor popularity, and per-call latency of a miss, an LRU hit and the precomputed table.
+import os
+import time
+import numpy as np
+
+from model_utils import current_model
+from result_cache import ResultCache
+
+REQUESTS = 50000
+ZIPF_EXPONENT = 1.1
+CACHE_SIZES = [100, 1000, 10000, 100000]
+
+def percentiles(fn, item_ids):
+    timings = []
+    for item_id in item_ids:
+        start = time.perf_counter()
+        fn(item_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, [50, 99])
+
+model = current_model()
+item_ids = model.catalog['item_id']
+rng = np.random.default_rng(0)
+# Popular anchors (biryani, burgers) dominate real traffic; rank r is requested with probability ~ 1/r^s
+ranks = rng.zipf(ZIPF_EXPONENT, REQUESTS * 2)
+requests = item_ids[rng.permutation(len(item_ids))[ranks[ranks <= len(item_ids)][:REQUESTS] - 1]].tolist()
+
+# Measure the LRU on its own, without a precomputed table
+table = model.precomputed_recs
+model.precomputed_recs = None
+
+print(f"{len(requests)} requests over {len(set(requests))} distinct anchors (Zipf s={ZIPF_EXPONENT}, catalog {len(item_ids)} items)")
+print(f"{'max entries':>12} {'hit rate':>9} {'evictions':>10} {'memory MB':>10} {'bytes/entry':>12} {'total s':>8}")
+for size in CACHE_SIZES:
+    model.result_cache = ResultCache(max_entries=size, ttl=0, version=model.version)
+    start = time.perf_counter()
+    for item_id in requests:
+        model.get_meal_completion_rows(item_id, 6)
+    elapsed = time.perf_counter() - start
+    stats = model.result_cache.stats()
+    print(f"{size:>12} {stats['hit_rate']:>9.3f} {stats['evictions']:>10} {stats['memory_bytes'] / 1e6:>10.2f} "
+          f"{stats['memory_bytes'] / max(stats['entries'], 1):>12.0f} {elapsed:>8.2f}")
+
+sample = rng.choice(item_ids, 2000).tolist()
+model.result_cache = ResultCache(max_entries=0, version=model.version)
+miss = percentiles(lambda i: model.get_meal_completion_rows(i, 6), sample)
+model.result_cache = ResultCache(max_entries=len(item_ids), version=model.version)
+for item_id in sample:
+    model.get_meal_completion_rows(item_id, 6)
+hit = percentiles(lambda i: model.get_meal_completion_rows(i, 6), sample)
+
+start = time.perf_counter()
+model.precomputed_recs = model.precompute_recommendations(6) if table is None else table
+precompute_note = f"built in {time.perf_counter() - start:.2f}s" if table is None else "already in snapshot"
+precomputed = percentiles(lambda i: model.get_meal_completion_rows(i, 6), sample)
+
+print(f"\n{'path':>18} {'p50 ms':>8} {'p99 ms':>8}")
+print(f"{'miss (compute)':>18} {miss[0]:>8.4f} {miss[1]:>8.4f}")
+print(f"{'LRU hit':>18} {hit[0]:>8.4f} {hit[1]:>8.4f}")
+print(f"{'precomputed table':>18} {precomputed[0]:>8.4f} {precomputed[1]:>8.4f}   ({precompute_note}, "
+      f"{model.precomputed_recs.nbytes / 1e6:.2f} MB)")
+
+if table is None:
+    # Leave the snapshot as we found it, so other benchmarks keep measuring the compute path
+    os.remove(model.recs_table_path(6))
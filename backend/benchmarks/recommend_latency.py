@@ -0,0 +1,26 @@
+# Run from the backend directory: python -m benchmarks.recommend_latency
+import time
+import numpy as np
+
+from model_utils import current_model, get_meal_completion_recs
+
+SAMPLES = 2000
+
+df = current_model().df
+
+rng = np.random.default_rng(42)
+item_ids = rng.choice(df['item_id'].to_numpy(), size=SAMPLES)
+
+# Warm up caches and lazy allocations before timing
+for item_id in item_ids[:50]:
+    get_meal_completion_recs(item_id)
+
+timings = []
+for item_id in item_ids:
+    start = time.perf_counter()
+    get_meal_completion_recs(item_id)
+    timings.append((time.perf_counter() - start) * 1000)
+
+p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+print(f"Catalog: {len(df)} items across {df['restaurant_id'].nunique()} restaurants")
+print(f"get_meal_completion_recs over {SAMPLES} calls: p50={p50:.3f}ms p95={p95:.3f}ms p99={p99:.3f}ms")
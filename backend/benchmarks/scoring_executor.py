@@ -0,0 +1,111 @@
+# Run from the backend directory: python -m benchmarks.scoring_executor [--concurrency 64] [--search-share 0.05]
+# Tail latency under concurrent load against a uvicorn worker, with recommendation scoring inline on the
+# event loop (the old behaviour) and on the scoring thread pool, with and without micro-batches. Result
+# cache and precomputed table are off, so every /recommend is scored; --search-share of the requests are
+# ranked searches, the heaviest CPU work on large catalogs. A probe client polls a cheap endpoint
+# throughout, to show how long requests that need no scoring wait behind the ones that do.
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+
+from model_utils import current_model
+from benchmarks.suite import BACKEND_DIR, SEARCH_QUERIES, summarize
+
+ZIPF_EXPONENT = 1.1
+PORT = 8765
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--requests', type=int, default=20000)
+parser.add_argument('--concurrency', type=int, default=64)
+parser.add_argument('--threads', type=int, default=4)
+parser.add_argument('--search-share', type=float, default=0.05)
+args = parser.parse_args()
+
+model = current_model()
+item_ids = model.catalog['item_id']
+rng = np.random.default_rng(0)
+ranks = rng.zipf(ZIPF_EXPONENT, args.requests * 2)
+anchors = item_ids[rng.permutation(len(item_ids))[ranks[ranks <= len(item_ids)][:args.requests] - 1]].tolist()
+paths = [f"/recommend/{item_id}" for item_id in anchors]
+for i in np.flatnonzero(rng.random(len(paths)) < args.search_share):
+    paths[i] = f"/search?q={SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}&ranked=true"
+
+def start_server(settings):
+    # A real uvicorn worker, so the event loop is only shared with other requests, not with the load generator
+    env = dict(os.environ, ZOMATHON_RESULT_CACHE_SIZE='0', ZOMATHON_PRECOMPUTE_RECS='0', ZOMATHON_RELOAD_INTERVAL='0',
+               PYTHONPATH=os.pathsep.join([BACKEND_DIR, os.environ.get('PYTHONPATH', '')]), **settings)
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(PORT), '--log-level', 'warning'], env=env)
+    for _ in range(600):
+        try:
+            httpx.get(f'http://127.0.0.1:{PORT}/admin/model')
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('server did not start')
+
+def scoring_stats(client_metrics):
+    return {line.split()[0]: float(line.split()[1]) for line in client_metrics.splitlines() if line.startswith('zomathon_scoring_')}
+
+async def load():
+    queue = list(reversed(paths))
+    timings, search_timings, probe_timings, statuses = [], [], [], {}
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{PORT}', limits=limits, timeout=60) as client:
+        async def client_loop():
+            while queue:
+                path = queue.pop()
+                t = time.perf_counter()
+                response = await client.get(path)
+                (search_timings if path.startswith('/search') else timings).append((time.perf_counter() - t) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe_loop():
+            while queue:
+                t = time.perf_counter()
+                await client.get('/categories/available')
+                probe_timings.append((time.perf_counter() - t) * 1000)
+                await asyncio.sleep(0.005)
+
+        start = time.perf_counter()
+        await asyncio.gather(probe_loop(), *(client_loop() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        stats = scoring_stats((await client.get('/metrics')).text)
+    searches = summarize(search_timings, elapsed) if search_timings else {'p99_ms': float('nan')}
+    return summarize(timings, elapsed), searches, summarize(probe_timings, elapsed), statuses, stats
+
+# Same results either way: batched scoring against per-anchor scoring
+sample = np.unique(rng.choice(len(item_ids), 2000))
+batched = model.compute_meal_completion_batch(sample, 6)
+mismatches = sum(batched[row].tolist() != model.compute_meal_completion_rows(row, 6).tolist() for row in sample)
+print(f"batched vs per-anchor scoring: {mismatches} mismatches over {len(sample)} anchors")
+
+threads = str(args.threads)
+configs = [
+    ('inline (event loop)', {'ZOMATHON_SCORING_THREADS': '0'}),
+    (f'{threads} threads, no batching', {'ZOMATHON_SCORING_THREADS': threads, 'ZOMATHON_BATCH_WINDOW_MS': '0'}),
+    (f'{threads} threads, 1 ms batches', {'ZOMATHON_SCORING_THREADS': threads, 'ZOMATHON_BATCH_WINDOW_MS': '1'}),
+    (f'{threads} threads, 5 ms batches', {'ZOMATHON_SCORING_THREADS': threads, 'ZOMATHON_BATCH_WINDOW_MS': '5'}),
+    (f'{threads} threads, queue limit 16', {'ZOMATHON_SCORING_THREADS': threads, 'ZOMATHON_SCORING_QUEUE': '16'}),
+]
+
+print(f"{len(paths)} requests, {args.search_share:.0%} ranked searches, the rest /recommend over {len(set(anchors))} anchors "
+      f"(Zipf s={ZIPF_EXPONENT}), {args.concurrency} clients, catalog {len(item_ids)} items, {os.cpu_count()} CPUs")
+print(f"{'':>30} {'rec p50':>8} {'rec p99':>8} {'req/s':>8} {'search p99':>11} {'probe p50':>10} {'probe p99':>10} "
+      f"{'coalesced':>10} {'batch size':>11} {'503s':>6}")
+for name, settings in configs:
+    server = start_server(settings)
+    try:
+        recommend, searches, probe, statuses, stats = asyncio.run(load())
+    finally:
+        server.terminate()
+        server.wait()
+    batches = stats['zomathon_scoring_batches_total']
+    batch_size = stats['zomathon_scoring_batched_requests_total'] / batches if batches else 1
+    print(f"{name:>30} {recommend['p50_ms']:>8.2f} {recommend['p99_ms']:>8.2f} {len(paths) / (recommend['requests'] / recommend['throughput_rps']):>8.0f} "
+          f"{searches['p99_ms']:>11.2f} {probe['p50_ms']:>10.2f} {probe['p99_ms']:>10.2f} {stats['zomathon_scoring_coalesced_total']:>10.0f} {batch_size:>11.1f} {statuses.get(503, 0):>6}")
@@ -0,0 +1,40 @@
+# Run from the backend directory: python -m benchmarks.search_latency
+# Compares the regex scans the endpoints used to run with the inverted index, as the catalog grows.
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from search_index import SearchIndex
+from snapshot import read_catalog
+
+ITEMS_PATH = 'items.parquet' if os.path.exists('items.parquet') else 'items.csv'
+SCALES = [1, 10, 100]
+QUERIES = ['paneer', 'chicken', 'naan', 'resto', 'ice cream', 'a', 'zzz']
+FIELDS = ['name', 'restaurant_name', 'category']
+REPEATS = 20
+
+def median_ms(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+base = read_catalog(ITEMS_PATH)
+print(f"{'items':>9} {'query':>10} {'regex scan ms':>14} {'index ms':>9} {'hits':>8}")
+for scale in SCALES:
+    # Every copy gets its own restaurants so the dictionary grows with the catalog
+    df = pd.concat([base.assign(restaurant_name=base['restaurant_name'] + f" {copy}") for copy in range(scale)], ignore_index=True)
+
+    start = time.perf_counter()
+    index = SearchIndex({col: df[col].to_numpy() for col in FIELDS}, FIELDS)
+    print(f"{len(df):>9} index built in {time.perf_counter() - start:.2f}s")
+
+    for query in QUERIES:
+        scan = lambda: df[np.logical_or.reduce([df[f].str.contains(query, case=False, na=False) for f in FIELDS])]
+        lookup = lambda: index.match([query], FIELDS)
+        hits = len(lookup())
+        assert hits == len(scan())
+        print(f"{len(df):>9} {query:>10} {median_ms(scan):>14.3f} {median_ms(lookup):>9.3f} {hits:>8}")
@@ -0,0 +1,56 @@
+# Run from the backend directory: python -m benchmarks.serialization_throughput
+# Compares the DataFrame.to_dict('records') + JSONResponse path with the pre-encoded fragment cache,
+# for the menu, search and recommendation response shapes. Both must produce identical bytes.
+import gzip
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from serialization import FragmentCache
+from snapshot import read_catalog
+
+ITEMS_PATH = 'items.parquet' if os.path.exists('items.parquet') else 'items.csv'
+REC_FIELDS = ['item_id', 'name', 'price', 'category', 'is_veg', 'restaurant_name']
+REQUESTS = 2000
+
+def legacy_encode(df, rows, fields=None):
+    frame = df.iloc[rows]
+    if fields:
+        frame = frame[fields]
+    records = frame.where(pd.notna(frame), None).to_dict('records')
+    return json.dumps(jsonable_encoder(records), ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+def get_records(df):
+    frame = df.astype(object).where(df.notna(), None)
+    return lambda rows: frame.iloc[rows].to_dict('records')
+
+def per_second(fn, payloads):
+    start = time.perf_counter()
+    for rows in payloads:
+        fn(rows)
+    return len(payloads) / (time.perf_counter() - start)
+
+df = read_catalog(ITEMS_PATH)
+rng = np.random.default_rng(0)
+restaurant_rows = list(df.groupby('restaurant_id').indices.values())
+
+shapes = {
+    'menu': ([restaurant_rows[i] for i in rng.integers(0, len(restaurant_rows), REQUESTS)], None),
+    'search (25)': ([np.sort(rng.choice(len(df), 25, replace=False)) for _ in range(REQUESTS)], None),
+    'recommend (6)': ([rng.choice(len(df), 6, replace=False) for _ in range(REQUESTS)], REC_FIELDS),
+}
+
+print(f"{'shape':>14} {'to_dict req/s':>14} {'fragments req/s':>16} {'speedup':>8} {'avg bytes':>10} {'gzip bytes':>11}")
+for name, (payloads, fields) in shapes.items():
+    cache = FragmentCache(get_records(df), df['item_id'].to_numpy(), fields=fields)
+    for rows in payloads:
+        assert cache.encode_rows(rows) == legacy_encode(df, rows, fields)
+
+    legacy = per_second(lambda rows: legacy_encode(df, rows, fields), payloads)
+    fast = per_second(cache.encode_rows, payloads)
+    sizes = [len(cache.encode_rows(rows)) for rows in payloads[:200]]
+    gzipped = [len(gzip.compress(cache.encode_rows(rows), compresslevel=5)) for rows in payloads[:200]]
+    print(f"{name:>14} {legacy:>14.0f} {fast:>16.0f} {fast / legacy:>7.1f}x {np.mean(sizes):>10.0f} {np.mean(gzipped):>11.0f}")
@@ -0,0 +1,218 @@
+# Run from the backend directory:
+#   python -m benchmarks.suite --sizes 10000 100000 1000000 --out benchmark_results.json
+#   python -m benchmarks.suite --compare old_results.json benchmark_results.json
+# For each catalog size: generates a synthetic catalog, then measures cold and warm startup, memory,
+# /recommend and /search latency percentiles and throughput in-process and through the ASGI app.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_FIELDS = ['name', 'restaurant_name', 'category']
+SEARCH_QUERIES = ['paneer', 'chicken', 'naan', 'biryani', 'cola', 'restaurant 12', 'ice cream', 'zzz']
+# Metrics where bigger is worse, compared by --compare
+LATENCY_KEYS = ['p50_ms', 'p95_ms', 'p99_ms']
+
+def memory_mb():
+    # Linux: private (RssAnon), shared file-backed (RssFile) and peak (VmHWM) resident memory
+    try:
+        status = dict(line.split(':', 1) for line in open('/proc/self/status'))
+    except OSError:
+        return None
+    return {key: int(status[key].split()[0]) / 1024 for key in ['RssAnon', 'RssFile', 'VmHWM'] if key in status}
+
+def summarize(timings_ms, elapsed):
+    p50, p95, p99 = np.percentile(timings_ms, [50, 95, 99])
+    return {'requests': len(timings_ms), 'p50_ms': round(p50, 4), 'p95_ms': round(p95, 4), 'p99_ms': round(p99, 4),
+            'mean_ms': round(float(np.mean(timings_ms)), 4), 'throughput_rps': round(len(timings_ms) / elapsed, 1)}
+
+def run_in_process(fn, args):
+    timings = []
+    start = time.perf_counter()
+    for arg in args:
+        t = time.perf_counter()
+        fn(arg)
+        timings.append((time.perf_counter() - t) * 1000)
+    return summarize(timings, time.perf_counter() - start)
+
+async def run_asgi(app, paths, concurrency):
+    # Local load generator: `concurrency` clients issuing requests back to back through the ASGI app
+    import httpx
+    timings = []
+    queue = list(reversed(paths))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def client_loop():
+            while queue:
+                path = queue.pop()
+                t = time.perf_counter()
+                response = await client.get(path)
+                timings.append((time.perf_counter() - t) * 1000)
+                assert response.status_code == 200, (path, response.status_code)
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return summarize(timings, time.perf_counter() - start)
+
+def worker(args):
+    # Runs inside the catalog's directory, in a fresh interpreter, so startup and memory are per process
+    start = time.perf_counter()
+    import model_utils
+    startup = time.perf_counter() - start
+    result = {'startup_seconds': round(startup, 3), 'memory_after_startup_mb': memory_mb()}
+    if args.worker == 'startup':
+        print(json.dumps(result))
+        return
+
+    model = model_utils.current_model()
+    rng = np.random.default_rng(args.seed)
+    item_ids = rng.choice(model.catalog['item_id'], args.requests).tolist()
+    queries = [SEARCH_QUERIES[i % len(SEARCH_QUERIES)] for i in range(args.requests // 4)]
+
+    for item_id in item_ids[:100]:
+        model.get_meal_completion_rows(item_id)
+    result['in_process'] = {
+        'recommend': run_in_process(lambda i: model.rec_fragments.encode_rows(model.get_meal_completion_rows(i)), item_ids),
+        'search': run_in_process(lambda q: model.item_fragments.encode_rows(model.search_index.match([q], SEARCH_FIELDS)[:25]), queries),
+    }
+
+    import main
+    result['asgi'] = {
+        'concurrency': args.concurrency,
+        'recommend': asyncio.run(run_asgi(main.app, [f"/recommend/{i}" for i in item_ids], args.concurrency)),
+        'search': asyncio.run(run_asgi(main.app, [f"/search?q={q}" for q in queries], args.concurrency)),
+    }
+    result['memory_after_load_mb'] = memory_mb()
+    print(json.dumps(result))
+
+def run_worker(mode, workdir, args):
+    env = dict(os.environ,
+               PYTHONPATH=BACKEND_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''),
+               ZOMATHON_SNAPSHOT_DIR=os.path.join(workdir, 'snapshots'),
+               ZOMATHON_LOG_DIR=os.path.join(workdir, 'interaction_logs'),
+               ZOMATHON_RELOAD_INTERVAL='0',
+               # Every request hits the scoring path; the result cache would otherwise hide it
+               ZOMATHON_RESULT_CACHE_SIZE='0')
+    command = [sys.executable, '-m', 'benchmarks.suite', '--worker', mode, '--seed', str(args.seed),
+               '--requests', str(args.requests), '--concurrency', str(args.concurrency)]
+    start = time.perf_counter()
+    out = subprocess.run(command, cwd=workdir, env=env, check=True, capture_output=True, text=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def git_revision():
+    def git(*command):
+        out = subprocess.run(['git', *command], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else None
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+def run_suite(args):
+    from benchmarks.synthetic_catalog import write_synthetic_catalog
+
+    report = {
+        'meta': {
+            **git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'results': [],
+    }
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f'zomathon-bench-{size}-', dir=args.workdir)
+        try:
+            start = time.perf_counter()
+            catalog = write_synthetic_catalog(workdir, size, seed=args.seed)
+            generate_seconds = time.perf_counter() - start
+            print(f"[{size}] catalog: {catalog['items']} items, {catalog['restaurants']} restaurants ({generate_seconds:.1f}s)", flush=True)
+
+            # The first worker builds the snapshot (a fresh deploy); the second finds it ready
+            cold = run_worker('startup', workdir, args)
+            print(f"[{size}] cold startup {cold['startup_seconds']:.2f}s", flush=True)
+            warm = run_worker('full', workdir, args)
+            print(f"[{size}] warm startup {warm['startup_seconds']:.2f}s, "
+                  f"recommend p50 {warm['in_process']['recommend']['p50_ms']:.3f}ms, "
+                  f"search p50 {warm['in_process']['search']['p50_ms']:.3f}ms, "
+                  f"ASGI recommend {warm['asgi']['recommend']['throughput_rps']:.0f} req/s", flush=True)
+
+            report['results'].append({
+                'size': size,
+                'restaurants': catalog['restaurants'],
+                'generate_seconds': round(generate_seconds, 3),
+                'cold_startup_seconds': cold['startup_seconds'],
+                'warm_startup_seconds': warm['startup_seconds'],
+                'memory_after_startup_mb': warm['memory_after_startup_mb'],
+                'memory_after_load_mb': warm['memory_after_load_mb'],
+                'in_process': warm['in_process'],
+                'asgi': warm['asgi'],
+            })
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        # Written after every size, so a long 10M run still leaves results behind if interrupted
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+def flatten(result):
+    metrics = {'cold_startup_seconds': result['cold_startup_seconds'], 'warm_startup_seconds': result['warm_startup_seconds']}
+    for mode in ['in_process', 'asgi']:
+        for endpoint in ['recommend', 'search']:
+            for key in LATENCY_KEYS:
+                metrics[f"{mode}.{endpoint}.{key}"] = result[mode][endpoint][key]
+    return metrics
+
+def compare(args):
+    base, new = (json.load(open(path)) for path in args.compare)
+    print(f"base {base['meta']['commit'][:10] if base['meta']['commit'] else '?'} -> new {new['meta']['commit'][:10] if new['meta']['commit'] else '?'}")
+    base_results = {r['size']: flatten(r) for r in base['results']}
+    regressions = 0
+    for result in new['results']:
+        if result['size'] not in base_results:
+            continue
+        print(f"\n{result['size']} items")
+        for name, value in flatten(result).items():
+            old = base_results[result['size']][name]
+            change = (value - old) / old if old else 0.0
+            flag = ''
+            if change > args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"  {name:>32} {old:>10.4f} -> {value:>10.4f} ({change:+.1%}){flag}")
+    print(f"\n{regressions} metric(s) slower by more than {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup, memory and latency benchmarks over synthetic catalogs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workdir', default=None, help="where to generate catalogs (default: system temp dir)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated catalogs and snapshots")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative slowdown reported as a regression")
+    parser.add_argument('--worker', choices=['startup', 'full'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+    elif args.compare:
+        compare(args)
+    else:
+        run_suite(args)
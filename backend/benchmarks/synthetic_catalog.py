@@ -0,0 +1,40 @@
+# Synthetic catalogs for the benchmark suite, built from the same base_items and culinary_profiles
+# as training_pipeline/generate_catalog.py, at any size and with embeddings that cluster by dish.
+import os
+import numpy as np
+import pandas as pd
+
+from training_pipeline.generate_catalog import (
+    AREAS, CatalogWriter, base_items, menu_frame, menu_mask, synthetic_restaurants,
+)
+
+EMBEDDING_DIM = 64  # what train_twotower.py exports: 32 ID + 32 text dimensions
+# Restaurants are generated in blocks, so even 10M items never sit in memory as Python objects at once
+BLOCK_RESTAURANTS = 20000
+# Every locality synthetic_restaurants can produce, so all blocks share one categorical dtype
+LOCALITY_TYPE = pd.CategoricalDtype(sorted(synthetic_restaurants(50 * len(AREAS))['locality'].unique()))
+
+def write_synthetic_catalog(out_dir, n_items, seed=0, dim=EMBEDDING_DIM,
+                            catalog_name='items.parquet', npy_name='final_backend_embeddings.npy'):
+    rng = np.random.default_rng(seed)
+    # Each dish gets a centre; its copies across restaurants are noisy points around it, like trained embeddings
+    centres = rng.standard_normal((len(base_items), dim)).astype(np.float32)
+    embeddings = np.lib.format.open_memmap(os.path.join(out_dir, npy_name), mode='w+', dtype=np.float32, shape=(n_items, dim))
+
+    # Same menu rules and Parquet layout as training_pipeline/generate_catalog.py
+    writer = CatalogWriter(os.path.join(out_dir, catalog_name))
+    restaurants = 0
+    while writer.rows < n_items:
+        block = synthetic_restaurants(BLOCK_RESTAURANTS, restaurants)
+        restaurant, item = menu_mask(rng, BLOCK_RESTAURANTS)
+        restaurant, item = restaurant[:n_items - writer.rows], item[:n_items - writer.rows]
+        restaurants += BLOCK_RESTAURANTS
+
+        written = writer.rows
+        writer.write(menu_frame(block, restaurant, item, rng, LOCALITY_TYPE))
+        embeddings[written:writer.rows] = centres[item] + 0.35 * rng.standard_normal((len(item), dim), dtype=np.float32)
+
+    writer.close()
+    embeddings.flush()
+    del embeddings
+    return {'items': n_items, 'restaurants': int(block['restaurant_id'].iloc[restaurant[-1]]) - 99, 'dim': dim}
@@ -0,0 +1,49 @@
+# Run from the backend directory: python -m benchmarks.text_embedding_cache [--items 50000] [--model DIR]  (needs sentence-transformers)
+# Time of the text-embedding stage in train_twotower.py: encoding every description (the old path) against the
+# content-addressed cache cold, warm, and after 1% new items with descriptions the cache has not seen.
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from training_pipeline.generate_catalog import build_menu, synthetic_restaurants
+from training_pipeline.text_embedding_cache import TextEmbeddingCache
+from benchmarks.synthetic_catalog import LOCALITY_TYPE
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--items', type=int, default=50000)
+parser.add_argument('--model', default='all-MiniLM-L6-v2', help='hub name or local model directory')
+args = parser.parse_args()
+
+menu = build_menu(synthetic_restaurants(args.items // 35 + 1), np.random.default_rng(0), LOCALITY_TYPE).iloc[:args.items]
+descriptions = menu['description'].astype(str).tolist()
+# New items written by hand rather than from the generator's templates
+new_items = max(1, args.items // 100)
+grown = descriptions + [f"{text} Chef's special no. {i}." for i, text in enumerate(descriptions[:new_items])]
+print(f"{len(descriptions)} descriptions ({len(set(descriptions))} distinct), then {new_items} new ones")
+
+model = SentenceTransformer(args.model)
+encode = lambda texts: model.encode(texts, batch_size=64)
+model_key = os.path.basename(os.path.normpath(args.model))
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+full_seconds, full = timed(lambda: encode(descriptions))
+with tempfile.TemporaryDirectory() as cache_dir:
+    cold_seconds, cold = timed(lambda: TextEmbeddingCache(cache_dir, model_key).encode(descriptions, encode))
+    warm_seconds, _ = timed(lambda: TextEmbeddingCache(cache_dir, model_key).encode(descriptions, encode))
+    grown_seconds, _ = timed(lambda: TextEmbeddingCache(cache_dir, model_key).encode(grown, encode))
+    grown_full_seconds, _ = timed(lambda: encode(grown))
+
+print(f"{'':>36} {'seconds':>8}")
+print(f"{'encode every description':>36} {full_seconds:>8.2f}")
+print(f"{'cache, cold':>36} {cold_seconds:>8.2f}")
+print(f"{'cache, warm (process restart)':>36} {warm_seconds:>8.2f}")
+print(f"{'encode every description, +1%':>36} {grown_full_seconds:>8.2f}")
+print(f"{'cache, +1% new descriptions':>36} {grown_seconds:>8.2f}")
+print(f"  max abs difference cached vs direct {float(np.abs(cold - full).max()):.2e}")
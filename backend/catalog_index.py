@@ -0,0 +1,111 @@
+import copy
+import hashlib
+from collections import namedtuple
+import numpy as np
+
+from search_index import FieldIndex
+from serialization import CompressedBodies, encode_json
+from snapshot import locality_area
+
+# Response body encoded once, with the ETag clients send back in If-None-Match
+JSONPayload = namedtuple('JSONPayload', ['body', 'etag'])
+
+LISTING_COLUMNS = ['restaurant_id', 'restaurant_name', 'locality', 'cuisine_type']
+
+def make_etag(*parts):
+    return '"' + hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:20] + '"'
+
+def json_payload(content, version, *key):
+    return JSONPayload(encode_json(content), make_etag(version, *key))
+
+def category_labels(df):
+    labels = {str(c).strip() for c in df['category'].dropna().unique().tolist() + df['cuisine_type'].dropna().unique().tolist()}
+    return {c for c in labels if c and c.lower() != 'nan'}
+
+def area_names(df):
+    return {locality_area(loc) for loc in df['locality'].dropna().unique()} - {''}
+
+class CatalogIndex:
+    """Lookup tables for the listing endpoints, built once per snapshot.
+
+    Menus are contiguous slices of the snapshot's restaurant-ordered rows.
+    Category, location and per-area restaurant listings are kept as ready
+    JSON bytes, since they only change when the catalog does.
+    """
+
+    def __init__(self, df, snapshot):
+        self.bind(snapshot)
+        self.compressed = CompressedBodies()
+
+        self.labels = category_labels(df)
+        self.categories = json_payload(sorted(self.labels), self.version, 'categories')
+
+        self.areas = area_names(df)
+        self.locations = json_payload(sorted(self.areas), self.version, 'locations')
+
+        # One listing row per distinct restaurant/cuisine pair, in catalog order
+        listing = df[LISTING_COLUMNS].drop_duplicates()
+        self.listing_records = listing.to_dict('records')
+        self.listing_localities = FieldIndex(listing['locality'].to_numpy())
+        self.fallback_listing = json_payload(self.listing_records[:10], self.version, 'restaurants', '')
+        self.area_listings = {area.lower(): self.build_area_listing(area.lower()) for area in sorted(self.areas)}
+
+    def bind(self, snapshot):
+        self.version = snapshot['manifest']['version']
+        self.restaurant_ids = snapshot['restaurant_ids']
+        self.restaurant_offsets = snapshot['restaurant_offsets']
+        self.restaurant_rows = snapshot['restaurant_rows']
+
+    def extended(self, items, snapshot):
+        # A copy for the snapshot with `items` added: only payloads whose content changes are rebuilt,
+        # the others keep their bytes and ETags
+        index = copy.copy(self)
+        index.bind(snapshot)
+        # ETags carry the new version, so none of the old compressed bodies would be asked for again
+        index.compressed = CompressedBodies()
+
+        labels = self.labels | category_labels(items)
+        if labels != self.labels:
+            index.labels = labels
+            index.categories = json_payload(sorted(labels), index.version, 'categories')
+        areas = self.areas | area_names(items)
+        if areas != self.areas:
+            index.areas = areas
+            index.locations = json_payload(sorted(areas), index.version, 'locations')
+
+        known = {tuple(record.values()) for record in self.listing_records}
+        listing = items[LISTING_COLUMNS].drop_duplicates()
+        new_records = [record for record in listing.to_dict('records') if tuple(record.values()) not in known]
+        if not new_records:
+            return index
+
+        index.listing_records = self.listing_records + new_records
+        index.listing_localities = self.listing_localities.extended([record['locality'] for record in new_records])
+        index.fallback_listing = json_payload(index.listing_records[:10], index.version, 'restaurants', '')
+        # An area listing changes when one of the new localities matches its key
+        new_localities = [str(record['locality']).lower() for record in new_records]
+        index.area_listings = dict(self.area_listings)
+        for key in {area.lower() for area in areas}:
+            if key not in self.area_listings or any(key in locality for locality in new_localities):
+                index.area_listings[key] = index.build_area_listing(key)
+        return index
+
+    def menu_rows(self, res_id):
+        slot = np.searchsorted(self.restaurant_ids, res_id)
+        if slot == len(self.restaurant_ids) or self.restaurant_ids[slot] != res_id:
+            return None
+        return self.restaurant_rows[self.restaurant_offsets[slot]:self.restaurant_offsets[slot + 1]]
+
+    def menu_etag(self, res_id):
+        return make_etag(self.version, 'menu', res_id)
+
+    def build_area_listing(self, key):
+        matches = self.listing_localities.match(key)
+        if len(matches) == 0:
+            return self.fallback_listing
+        return json_payload([self.listing_records[i] for i in matches.tolist()], self.version, 'restaurants', key)
+
+    def restaurants_in_area(self, area):
+        # Known areas are served from bytes built at load; free-text queries are matched on demand
+        key = area.lower().strip()
+        return self.area_listings.get(key) or self.build_area_listing(key)
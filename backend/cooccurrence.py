@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Written by training_pipeline/mine_cooccurrence.py: top-K item neighbours by co-purchase NPMI, keyed by item_id
+COOCCURRENCE_NAME = 'item_cooccurrence.npz'
+
+def cooccurrence_sources(npy_path):
+    # The mined co-occurrence graph next to the item matrix, or [] when there is none
+    path = os.path.join(os.path.dirname(os.path.abspath(npy_path)), COOCCURRENCE_NAME)
+    return [path] if os.path.exists(path) else []
+
+def write_cooccurrence(folder, source_path, item_ids, restaurant_slots):
+    """Re-key the mined graph to catalog rows as cooc_*.npy CSR arrays; returns the number of edges.
+
+    Only neighbours on the anchor's own menu are kept, since those are the
+    only candidates it is ever scored against. Items the catalog no longer
+    has are dropped.
+    """
+    mined = np.load(source_path)
+    degree = np.diff(mined['indptr'])
+    edges = pd.DataFrame({
+        'anchor_id': np.repeat(mined['item_ids'], degree),
+        'neighbour_id': mined['neighbours'],
+        'weight': mined['weights'].astype(np.float32),
+    })
+    rows = pd.DataFrame({'item_id': item_ids, 'row': np.arange(len(item_ids)), 'slot': restaurant_slots})
+    edges = edges.merge(rows.rename(columns={'item_id': 'anchor_id'}), on='anchor_id')
+    edges = edges.merge(rows.rename(columns={'item_id': 'neighbour_id', 'row': 'neighbour', 'slot': 'neighbour_slot'}), on='neighbour_id')
+    edges = edges[edges['slot'] == edges['neighbour_slot']].sort_values(['row', 'weight'], ascending=[True, False])
+
+    counts = np.bincount(edges['row'].to_numpy(), minlength=len(item_ids))
+    np.save(os.path.join(folder, 'cooc_indptr.npy'), np.concatenate([[0], np.cumsum(counts)]))
+    np.save(os.path.join(folder, 'cooc_neighbours.npy'), edges['neighbour'].to_numpy(dtype=np.int32))
+    np.save(os.path.join(folder, 'cooc_weights.npy'), edges['weight'].to_numpy())
+    return len(edges)
+
+class CooccurrenceTable:
+    """Memory-mapped co-purchase neighbours of every catalog row, in CSR form.
+
+    Row r's neighbours are neighbours[indptr[r]:indptr[r + 1]], at most the
+    miner's top-K, with their NPMI weights: looking up an anchor costs the
+    same whatever the size of the log it was mined from. Rows added after
+    the snapshot was built have no purchase history and no neighbours.
+    """
+
+    def __init__(self, indptr, neighbours, weights):
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.weights = weights
+
+    @classmethod
+    def load(cls, folder):
+        return cls(*(np.load(os.path.join(folder, f"cooc_{name}.npy"), mmap_mode='r').view(np.ndarray)
+                     for name in ['indptr', 'neighbours', 'weights']))
+
+    def __len__(self):
+        return len(self.neighbours)
+
+    def edges(self, rows):
+        # (position in rows, neighbour row, weight) of every neighbour of every row
+        n = len(self.indptr) - 1
+        starts = self.indptr[np.minimum(rows, n)]
+        lengths = self.indptr[np.minimum(rows + 1, n)] - starts
+        anchors = np.repeat(np.arange(len(rows)), lengths)
+        edges = np.arange(len(anchors)) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return anchors, self.neighbours[edges], self.weights[edges]
@@ -0,0 +1,82 @@
+import copy
+import numpy as np
+
+EMBEDDING_DTYPES = {'float32': np.float32, 'float16': np.float16}
+
+def l2_normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def write_embedding_store(path, vectors, dtype='float32', normalize=False):
+    # Plain .npy on disk, so any process can memory-map it without a private copy
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if normalize:
+        vectors = l2_normalize(vectors)
+    np.save(path, np.ascontiguousarray(vectors, dtype=EMBEDDING_DTYPES[dtype]))
+
+class EmbeddingStore:
+    """Read-only memory-mapped item vectors.
+
+    Every worker maps the same file, so the pages live once in the OS page cache
+    instead of once per process. Rows always come back as float32, whatever the
+    on-disk dtype. When the store was written with normalize=True, cosine
+    similarity is a plain dot product. Rows added later with inserted() are
+    the only ones held in process memory.
+    """
+
+    def __init__(self, path, normalized=False):
+        self.vectors = np.load(path, mmap_mode='r').view(np.ndarray)
+        self.normalized = normalized
+        # Rows inserted since loading (see inserted): their sorted positions in this store, and their values
+        self.added_positions = np.zeros(0, dtype=np.int64)
+        self.added_vectors = self.vectors[:0]
+
+    def __len__(self):
+        return len(self.vectors) + len(self.added_positions)
+
+    def __getitem__(self, rows):
+        if len(self.added_positions) == 0:
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            before = np.searchsorted(self.added_positions, [start, stop])
+            if step == 1 and before[0] == before[1]:
+                # No inserted row in the range: one contiguous slice of the mapping
+                return np.asarray(self.vectors[start - before[0]:stop - before[0]], dtype=np.float32)
+            rows = np.arange(start, stop, step)
+
+        rows = np.asarray(rows)
+        flat = rows.ravel()
+        before = np.searchsorted(self.added_positions, flat)
+        added = self.added_positions[np.minimum(before, len(self.added_positions) - 1)] == flat
+        out = np.empty((len(flat), self.vectors.shape[1]), dtype=np.float32)
+        out[~added] = self.vectors[flat[~added] - before[~added]]
+        out[added] = self.added_vectors[before[added]]
+        return out.reshape(rows.shape + (self.vectors.shape[1],))
+
+    @property
+    def shape(self):
+        return (len(self), self.vectors.shape[1])
+
+    @property
+    def dtype(self):
+        return self.vectors.dtype
+
+    def inserted(self, positions, vectors):
+        # A copy with rows inserted before `positions`, with np.insert semantics (len(self) appends).
+        # Only the new rows are held in memory; every other row is still read from the shared mapping.
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.normalized:
+            vectors = l2_normalize(vectors)
+        positions = np.broadcast_to(positions, len(vectors))
+        order = np.argsort(positions, kind='stable')
+        positions = positions[order] + np.arange(len(vectors))
+
+        # Rows added earlier move up by the number of new rows inserted at or before them
+        earlier = self.added_positions + np.searchsorted(positions - np.arange(len(vectors)), self.added_positions, side='right')
+        merged = np.concatenate([earlier, positions])
+        merged_order = np.argsort(merged, kind='stable')
+        store = copy.copy(self)
+        store.added_positions = merged[merged_order]
+        store.added_vectors = np.concatenate([self.added_vectors, vectors[order].astype(self.vectors.dtype)])[merged_order]
+        return store
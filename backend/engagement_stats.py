@@ -0,0 +1,370 @@
+import io
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from interaction_log import LOG_COLUMNS, LOG_DIR
+
+IMPRESSION = 'impression'
+ADD = 'added_to_cart'
+ACTION_FIELDS = {IMPRESSION: 0, ADD: 1}
+USED_COLUMNS = ['timestamp', 'anchor_item_id', 'recommended_item_id', 'action']
+
+# Seconds between passes over new log lines; 0 turns the tailer off
+ANALYTICS_INTERVAL = float(os.environ.get('ZOMATHON_ANALYTICS_INTERVAL', 10))
+# 96 buckets of 15 minutes: counts for any window up to 24 hours
+BUCKET_SECONDS = int(os.environ.get('ZOMATHON_ANALYTICS_BUCKET_SECONDS', 900))
+NUM_BUCKETS = int(os.environ.get('ZOMATHON_ANALYTICS_BUCKETS', 96))
+# Keys tracked at once; the least seen are evicted past this
+MAX_ANCHORS = int(os.environ.get('ZOMATHON_ANALYTICS_ANCHORS', 5000))
+MAX_PAIRS = int(os.environ.get('ZOMATHON_ANALYTICS_PAIRS', 20000))
+CHECKPOINT_NAME = 'engagement-checkpoint.npz'
+CHECKPOINT_INTERVAL = 60
+MAX_READ_BYTES = 16 << 20
+# Drift alert: recent accept rate this many standard errors from the baseline, given enough impressions on both sides
+ALERT_Z = 3.0
+ALERT_MIN_IMPRESSIONS = 200
+
+def local_seconds(timestamps):
+    # The logger writes naive local ISO timestamps; compare them with the naive local clock
+    return pd.to_datetime(timestamps, format='ISO8601', errors='coerce').to_numpy().astype('datetime64[s]')
+
+def now_seconds():
+    return np.datetime64(pd.Timestamp.now().floor('s').to_datetime64(), 's')
+
+class WindowedCounters:
+    """Event counts per int64 key over a ring of time buckets, in fixed-size arrays.
+
+    counts[bucket, slot, field] holds one key's impressions (field 0) and
+    adds (field 1) in one bucket. A bucket is cleared when the ring wraps
+    onto it, and a key is given a slot on first sight. When every slot is
+    taken, a new key takes the slot of the key with the fewest events in
+    the ring if it has more events in the incoming batch, so memory is
+    capacity * num_buckets * 8 bytes however many keys pass through and
+    the most frequent keys keep their counts.
+    """
+
+    def __init__(self, capacity, num_buckets=NUM_BUCKETS):
+        self.counts = np.zeros((num_buckets, capacity, 2), dtype=np.int32)
+        self.bucket_ids = np.full(num_buckets, -1, dtype=np.int64)
+        self.keys = np.full(capacity, -1, dtype=np.int64)
+        self.evictions = 0
+        self.dropped = 0
+
+    @property
+    def capacity(self):
+        return len(self.keys)
+
+    def __len__(self):
+        return int((self.keys >= 0).sum())
+
+    def lookup(self, keys):
+        # Slot of each key, -1 when untracked
+        order = np.argsort(self.keys, kind='stable')
+        positions = np.minimum(np.searchsorted(self.keys[order], keys), len(order) - 1)
+        return np.where(self.keys[order][positions] == keys, order[positions], -1)
+
+    def add(self, keys, buckets, fields):
+        num_buckets = len(self.bucket_ids)
+        for bucket in np.unique(buckets):
+            position = bucket % num_buckets
+            if bucket > self.bucket_ids[position]:
+                self.counts[position] = 0
+                self.bucket_ids[position] = bucket
+        # Events older than the bucket now holding their ring position have nowhere to go
+        keep = self.bucket_ids[buckets % num_buckets] == buckets
+        slots = self.slots_for(keys[keep])
+        placed = slots >= 0
+        self.dropped += int(len(keys) - placed.sum())
+        np.add.at(self.counts, (buckets[keep][placed] % num_buckets, slots[placed], fields[keep][placed]), 1)
+
+    def slots_for(self, keys):
+        unique, inverse, batch_counts = np.unique(keys, return_inverse=True, return_counts=True)
+        slots = self.lookup(unique)
+        # New keys in order of how often they occur in this batch
+        missing = np.flatnonzero(slots < 0)
+        missing = missing[np.argsort(-batch_counts[missing], kind='stable')]
+        free = np.flatnonzero(self.keys < 0)
+        if len(missing) > len(free):
+            known = slots >= 0
+            totals = self.counts.sum(axis=(0, 2), dtype=np.int64)
+            totals[slots[known]] += batch_counts[known]
+            victims = self.evict(totals, batch_counts[missing[len(free):]])
+            # Tracked keys that lost their slot have this batch's events dropped with them
+            slots[np.isin(slots, victims)] = -1
+            free = np.concatenate([free, victims])
+        missing = missing[:len(free)]
+        slots[missing] = free[:len(missing)]
+        self.keys[slots[missing]] = unique[missing]
+        return slots[inverse]
+
+    def evict(self, totals, contenders):
+        # Slots given up to new keys (counts in descending order) that occur more often than the slot's key
+        totals[self.keys < 0] = np.iinfo(np.int64).max
+        n = min(len(contenders), self.capacity)
+        candidates = np.argpartition(totals, n - 1)[:n]
+        candidates = candidates[np.argsort(totals[candidates], kind='stable')]
+        victims = candidates[:int((contenders[:n] > totals[candidates]).sum())]
+        self.keys[victims] = -1
+        self.counts[:, victims] = 0
+        self.evictions += len(victims)
+        return victims
+
+    def totals(self, first_bucket, last_bucket):
+        # (capacity, 2) impressions and adds per slot over buckets first_bucket..last_bucket
+        positions = np.flatnonzero((self.bucket_ids >= first_bucket) & (self.bucket_ids <= last_bucket))
+        return self.counts[positions].sum(axis=0, dtype=np.int64)
+
+    def state(self, prefix):
+        return {f'{prefix}_counts': self.counts, f'{prefix}_bucket_ids': self.bucket_ids, f'{prefix}_keys': self.keys}
+
+    def restore(self, arrays, prefix):
+        self.counts = arrays[f'{prefix}_counts']
+        self.bucket_ids = arrays[f'{prefix}_bucket_ids']
+        self.keys = arrays[f'{prefix}_keys']
+
+def rate_summary(impressions, adds):
+    impressions, adds = int(impressions), int(adds)
+    return {'impressions': impressions, 'adds': adds, 'accept_rate': round(adds / impressions, 5) if impressions else None}
+
+def drift_z(recent, baseline):
+    # Two-proportion z statistic of the recent accept rate against the baseline; None without enough impressions
+    (n1, a1), (n2, a2) = recent, baseline
+    if n1 < ALERT_MIN_IMPRESSIONS or n2 < ALERT_MIN_IMPRESSIONS:
+        return None
+    pooled = (a1 + a2) / (n1 + n2)
+    spread = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    return float((a1 / n1 - a2 / n2) / spread) if spread > 0 else 0.0
+
+class EngagementStats:
+    """Impressions, adds and accept rate over sliding windows, tailed from the interaction log.
+
+    A background thread reads only what was appended to the segments in
+    log_dir since its last pass: CSV segments from a byte offset up to
+    the last complete line, Parquet and Arrow segments once closed. Events
+    are counted per 15-minute bucket in total, per anchor and per (anchor,
+    recommended item) pair. A checkpoint of the counters and the offsets
+    they cover is written every CHECKPOINT_INTERVAL seconds and on stop,
+    so a restart resumes from it instead of rescanning old segments.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, interval=ANALYTICS_INTERVAL, bucket_seconds=BUCKET_SECONDS, num_buckets=NUM_BUCKETS,
+                 max_anchors=MAX_ANCHORS, max_pairs=MAX_PAIRS, checkpoint_path=None):
+        self.log_dir = log_dir
+        self.interval = interval
+        self.bucket_seconds = bucket_seconds
+        self.checkpoint_path = checkpoint_path or os.path.join(log_dir, CHECKPOINT_NAME)
+        self.total = WindowedCounters(1, num_buckets)
+        self.anchors = WindowedCounters(max_anchors, num_buckets)
+        self.pairs = WindowedCounters(max_pairs, num_buckets)
+        self.offsets = {}
+        self.events = 0
+        self.skipped = 0
+        self.checkpointed_at = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.load_checkpoint()
+
+    def config(self):
+        return {'bucket_seconds': self.bucket_seconds, 'num_buckets': len(self.total.bucket_ids),
+                'max_anchors': self.anchors.capacity, 'max_pairs': self.pairs.capacity}
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with np.load(self.checkpoint_path) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if meta['config'] != self.config():
+                print("Engagement checkpoint has different bucket or table sizes; rescanning the interaction log")
+                return
+            for name, counters in self.counter_tables():
+                counters.restore({key: arrays[key] for key in arrays.files if key.startswith(name + '_')}, name)
+        self.offsets = meta['offsets']
+        self.events = meta['events']
+        self.skipped = meta['skipped']
+
+    def counter_tables(self):
+        return [('total', self.total), ('anchors', self.anchors), ('pairs', self.pairs)]
+
+    def save_checkpoint(self):
+        with self.lock:
+            meta = {'config': self.config(), 'offsets': self.offsets, 'events': self.events, 'skipped': self.skipped}
+            arrays = {'meta': np.array(json.dumps(meta))}
+            for name, counters in self.counter_tables():
+                arrays.update({key: value.copy() for key, value in counters.state(name).items()})
+        # Every worker tails the same log; each writes its own temporary file and the last replace wins
+        tmp = f"{self.checkpoint_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.checkpoint_path)
+        self.checkpointed_at = time.monotonic()
+
+    def segments(self):
+        if not os.path.isdir(self.log_dir):
+            return []
+        # Names start with a timestamp, so this is write order; .part files are columnar segments still open
+        return sorted(name for name in os.listdir(self.log_dir)
+                      if name.startswith('interactions-') and name.endswith(('.csv', '.parquet', '.arrow')))
+
+    def read_new_rows(self, name):
+        # (frame of rows appended since the stored offset, new offset), or (None, offset) when there is nothing new
+        path = os.path.join(self.log_dir, name)
+        offset = self.offsets.get(name, 0)
+        if name.endswith('.csv'):
+            with open(path, 'rb') as f:
+                # A file shorter than the offset was replaced under the same name: read it from the start
+                if os.fstat(f.fileno()).st_size < offset:
+                    offset = 0
+                f.seek(offset)
+                data = f.read(MAX_READ_BYTES)
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                return None, offset
+            chunk = data[:end]
+            if offset == 0:
+                chunk = chunk[chunk.index(b'\n') + 1:]
+            if not chunk:
+                return pd.DataFrame(columns=USED_COLUMNS), offset + end
+            # Ids parse as integers unless a line is malformed, and then consume() coerces them
+            frame = pd.read_csv(io.BytesIO(chunk), names=LOG_COLUMNS, header=None, usecols=USED_COLUMNS)
+            return frame, offset + end
+
+        if offset > 0:
+            # Closed columnar segments never change, and the offset counts their rows
+            return None, offset
+        if name.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            table = pq.read_table(path, columns=USED_COLUMNS)
+        else:
+            import pyarrow as pa
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all().select(USED_COLUMNS)
+        return table.to_pandas(), max(table.num_rows, 1)
+
+    def consume(self, frame):
+        field = frame['action'].map(ACTION_FIELDS).to_numpy(dtype=np.float64, na_value=np.nan)
+        anchor = pd.to_numeric(frame['anchor_item_id'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        recommended = pd.to_numeric(frame['recommended_item_id'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        seconds = local_seconds(frame['timestamp'])
+        valid = ~np.isnan(field) & ~np.isnan(anchor) & ~np.isnan(recommended) & ~np.isnat(seconds) & (anchor >= 0) & (recommended >= 0)
+
+        buckets = seconds[valid].astype(np.int64) // self.bucket_seconds
+        fields = field[valid].astype(np.int64)
+        anchor = anchor[valid].astype(np.int64)
+        recommended = recommended[valid].astype(np.int64)
+        with self.lock:
+            self.total.add(np.zeros(len(buckets), dtype=np.int64), buckets, fields)
+            self.anchors.add(anchor, buckets, fields)
+            self.pairs.add((anchor << 32) | recommended, buckets, fields)
+            self.events += int(valid.sum())
+            self.skipped += int(len(valid) - valid.sum())
+
+    def poll(self):
+        # One pass over everything appended since the last one; returns the number of rows read
+        names = self.segments()
+        read = 0
+        for name in names:
+            while True:
+                try:
+                    frame, offset = self.read_new_rows(name)
+                except (OSError, ValueError) as e:
+                    # Deleted or unreadable segment: skip it this pass
+                    print(f"Engagement stats could not read {name}: {e}")
+                    break
+                if frame is None:
+                    break
+                if len(frame):
+                    self.consume(frame)
+                    read += len(frame)
+                with self.lock:
+                    self.offsets[name] = offset
+                if not name.endswith('.csv'):
+                    break
+        # Offsets of segments removed from disk are no longer needed
+        with self.lock:
+            present = set(names)
+            self.offsets = {name: offset for name, offset in self.offsets.items() if name in present}
+        return read
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                read = self.poll()
+                if read and time.monotonic() - self.checkpointed_at >= CHECKPOINT_INTERVAL:
+                    self.save_checkpoint()
+            except Exception as e:
+                print(f"Engagement stats pass failed: {e}")
+
+    def start(self):
+        if self.interval > 0 and self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, name='engagement-stats', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+            self.save_checkpoint()
+
+    def report(self, window_seconds=3600, top=20, anchor_item_id=None, now=None):
+        """Counts over the last window_seconds, the rest of the ring as a baseline, and drift alerts."""
+        last = (now if now is not None else now_seconds()).astype(np.int64) // self.bucket_seconds
+        window = min(max(1, -(-window_seconds // self.bucket_seconds)), len(self.total.bucket_ids))
+        first = last - window + 1
+        ring_first = last - len(self.total.bucket_ids) + 1
+
+        with self.lock:
+            total, total_base = self.total.totals(first, last)[0], self.total.totals(ring_first, first - 1)[0]
+            anchors, anchors_base = self.anchors.totals(first, last), self.anchors.totals(ring_first, first - 1)
+            anchor_keys = self.anchors.keys.copy()
+            pairs = self.pairs.totals(first, last)
+            pair_keys = self.pairs.keys.copy()
+
+        alerts = []
+        z = drift_z(total, total_base)
+        if z is not None and abs(z) >= ALERT_Z:
+            alerts.append({'scope': 'total', 'accept_rate': rate_summary(*total)['accept_rate'],
+                           'baseline_accept_rate': rate_summary(*total_base)['accept_rate'], 'z': round(z, 2)})
+        for slot in np.flatnonzero((anchors[:, 0] >= ALERT_MIN_IMPRESSIONS) & (anchors_base[:, 0] >= ALERT_MIN_IMPRESSIONS)):
+            z = drift_z(anchors[slot], anchors_base[slot])
+            if abs(z) >= ALERT_Z:
+                alerts.append({'scope': 'anchor', 'anchor_item_id': int(anchor_keys[slot]),
+                               'accept_rate': rate_summary(*anchors[slot])['accept_rate'],
+                               'baseline_accept_rate': rate_summary(*anchors_base[slot])['accept_rate'], 'z': round(z, 2)})
+        alerts.sort(key=lambda alert: -abs(alert['z']))
+
+        top_anchors = [slot for slot in np.argsort(-anchors[:, 0], kind='stable')[:top] if anchors[slot].any()]
+        pair_anchor = np.where(pair_keys >= 0, pair_keys >> 32, -1)
+        candidates = np.flatnonzero(pairs.any(axis=1) & ((pair_anchor == anchor_item_id) if anchor_item_id is not None else True))
+        top_pairs = candidates[np.argsort(-pairs[candidates, 0], kind='stable')[:top]]
+
+        return {
+            'window_seconds': int(window * self.bucket_seconds),
+            'baseline_seconds': int((first - ring_first) * self.bucket_seconds),
+            'total': rate_summary(*total),
+            'baseline': rate_summary(*total_base),
+            'alerts': alerts,
+            'anchors': [{'anchor_item_id': int(anchor_keys[slot]), **rate_summary(*anchors[slot]),
+                         'baseline_accept_rate': rate_summary(*anchors_base[slot])['accept_rate']} for slot in top_anchors],
+            'pairs': [{'anchor_item_id': int(pair_keys[slot] >> 32), 'recommended_item_id': int(pair_keys[slot] & 0xFFFFFFFF),
+                       **rate_summary(*pairs[slot])} for slot in top_pairs],
+        }
+
+    def stats(self):
+        with self.lock:
+            return {'events': self.events, 'skipped': self.skipped, 'segments': len(self.offsets),
+                    'anchors_tracked': len(self.anchors), 'pairs_tracked': len(self.pairs),
+                    'evictions': self.anchors.evictions + self.pairs.evictions,
+                    'memory_bytes': sum(c.counts.nbytes + c.keys.nbytes for _, c in self.counter_tables())}
+
+if __name__ == "__main__":
+    # One pass over the log from the last checkpoint, then print the last hour
+    stats = EngagementStats()
+    print(f"Read {stats.poll()} new interaction rows")
+    stats.save_checkpoint()
+    print(json.dumps(stats.report(), indent=2))
@@ -0,0 +1,109 @@
+import numpy as np
+
+# Category pairs that belong in the same meal, with their edge weight
+SYNERGIES = [
+    ("Wet Curry", "Bread", 8.0),
+    ("Wet Curry", "Starter", 3.0),
+    ("Dry Main", "Side", 6.0),
+    ("Fast Food Main", "Side", 8.0),
+    ("Starter", "Dry Main", 4.0),
+    ("Starter", "Fast Food Main", 4.0),
+    ("Drink", "Fast Food Main", 3.0),
+    ("Drink", "Starter", 3.0),
+    ("Dessert", "Drink", 2.0)
+]
+
+# Restaurants with the same menu size are solved together, at most this many at a time, and no more than
+# fit one float64 adjacency stack in SCORE_BATCH_BYTES (the transition matrix and inverse take as much again each)
+SCORE_BATCH = 256
+SCORE_BATCH_BYTES = 32 * 1024 * 1024
+
+def build_restaurant_graph(res_df):
+    # Reference graph for one restaurant (used by benchmarks/graph_scores.py); snapshots use build_graph_score_tables
+    import networkx as nx
+
+    G = nx.Graph()
+
+    for _, row in res_df.iterrows():
+        item_id = int(row['item_id'])
+        G.add_node(item_id, type='item', data=row.to_dict())
+        G.add_node(f"CUISINE_{row['cuisine_type']}", type='cuisine')
+        G.add_node(f"CAT_{row['category']}", type='category')
+
+        G.add_edge(item_id, f"CUISINE_{row['cuisine_type']}", weight=1.0)
+        G.add_edge(item_id, f"CAT_{row['category']}", weight=1.0)
+
+    for u, v, w in SYNERGIES:
+        G.add_edge(f"CAT_{u}", f"CAT_{v}", weight=w)
+
+    return G
+
+def synergy_matrix(category_vocab, n_cuisines):
+    """Dense weights between the concept nodes every restaurant graph shares.
+
+    Nodes are the catalog's categories, then categories only named in
+    SYNERGIES, then one for a missing category, then the cuisines and one
+    for a missing cuisine. Only category pairs carry weight; a node no
+    restaurant item links to stays isolated and never receives PageRank mass.
+    """
+    categories = list(category_vocab)
+    for u, v, _ in SYNERGIES:
+        categories += [c for c in (u, v) if c not in categories]
+    size = len(categories) + 1 + n_cuisines + 1
+    matrix = np.zeros((size, size))
+    for u, v, w in SYNERGIES:
+        i, j = categories.index(u), categories.index(v)
+        matrix[i, j] = matrix[j, i] = w
+    return matrix, len(categories)
+
+def item_concept_csr(category_codes, cuisine_codes, n_category_nodes, n_cuisines):
+    # CSR adjacency from item rows to concept nodes: two unit-weight edges per item, to its category and cuisine.
+    # Codes of -1 (missing values) go to the dedicated missing-category and missing-cuisine nodes.
+    category_node = np.where(category_codes < 0, n_category_nodes, category_codes)
+    cuisine_node = n_category_nodes + 1 + np.where(cuisine_codes < 0, n_cuisines, cuisine_codes)
+    indices = np.stack([category_node, cuisine_node], axis=1).ravel().astype(np.int32)
+    indptr = np.arange(0, len(indices) + 1, 2)
+    return indptr, indices
+
+def personalized_pagerank_matrix(adjacency, alpha=0.85):
+    # Closed form of the power method: row s is the PageRank vector personalized to node s,
+    # (1 - alpha) * (I - alpha * P)^-1 with P the row-normalised transition matrix.
+    # Every node reachable from an item has at least one edge, so there is no dangling mass to redistribute.
+    # Works on a stack of adjacency matrices as well as on a single one.
+    degree = adjacency.sum(axis=-1)
+    transition = adjacency / np.where(degree == 0, 1, degree)[..., None]
+    return (1 - alpha) * np.linalg.inv(np.eye(adjacency.shape[-1]) - alpha * transition)
+
+def build_graph_score_tables(restaurant_offsets, indptr, indices, synergy, alpha=0.85):
+    """Flattened k x k item PageRank tables for every restaurant, in restaurant order.
+
+    Rows of the CSR arrays are items in restaurant order, so restaurant s
+    owns rows restaurant_offsets[s]:restaurant_offsets[s + 1].
+    """
+    sizes = np.diff(restaurant_offsets)
+    graph_offsets = np.concatenate([[0], np.cumsum(sizes ** 2)])
+    scores = np.zeros(graph_offsets[-1], dtype=np.float32)
+    n_concepts = len(synergy)
+
+    for size in np.unique(sizes[sizes > 0]).tolist():
+        slots = np.flatnonzero(sizes == size)
+        batch_size = max(1, min(SCORE_BATCH, SCORE_BATCH_BYTES // ((size + n_concepts) ** 2 * 8)))
+        for first in range(0, len(slots), batch_size):
+            batch = slots[first:first + batch_size]
+            # Item nodes first so the item x item block lines up with the restaurant index order
+            adjacency = np.zeros((len(batch), size + n_concepts, size + n_concepts))
+            adjacency[:, size:, size:] = synergy
+
+            items = (restaurant_offsets[batch][:, None] + np.arange(size)).ravel()
+            counts = indptr[items + 1] - indptr[items]
+            edge_item = np.repeat(np.arange(len(items)), counts)
+            edge_pos = np.repeat(indptr[items], counts) + np.arange(len(edge_item)) - np.repeat(np.cumsum(counts) - counts, counts)
+            graph, local, node = edge_item // size, edge_item % size, size + indices[edge_pos]
+            adjacency[graph, local, node] = 1.0
+            adjacency[graph, node, local] = 1.0
+
+            block = personalized_pagerank_matrix(adjacency, alpha)[:, :size, :size]
+            for slot, table in zip(batch.tolist(), block):
+                scores[graph_offsets[slot]:graph_offsets[slot + 1]] = table.ravel()
+
+    return scores, graph_offsets
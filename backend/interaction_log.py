@@ -0,0 +1,177 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+LOG_COLUMNS = ['timestamp', 'user_id', 'anchor_item_id', 'recommended_item_id', 'action']
+LOG_DIR = os.environ.get('ZOMATHON_LOG_DIR', 'interaction_logs')
+# csv (default, tail-able while open), parquet or arrow (Arrow IPC file); the last two need pyarrow
+LOG_FORMAT = os.environ.get('ZOMATHON_LOG_FORMAT', 'csv')
+
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 1.0
+SEGMENT_ROWS = 1_000_000
+SEGMENT_SECONDS = 3600
+MAX_PENDING = 100_000
+
+STOP = object()
+
+class CSVSegment:
+    extension = 'csv'
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(LOG_COLUMNS)
+
+    def write(self, events):
+        self.writer.writerows(events)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+class ArrowSegment:
+    """Columnar segment: one Parquet row group or Arrow record batch per flush.
+
+    Columnar files are only readable once their footer is written, so the
+    segment is written as `<name>.part` and renamed into place on close.
+    """
+
+    def __init__(self, path, fmt):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.path = path
+        self.schema = pa.schema([
+            ('timestamp', pa.string()), ('user_id', pa.string()),
+            ('anchor_item_id', pa.int64()), ('recommended_item_id', pa.int64()), ('action', pa.string()),
+        ])
+        self.sink = open(path + '.part', 'wb')
+        if fmt == 'parquet':
+            self.writer = pq.ParquetWriter(self.sink, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+
+    def write(self, events):
+        columns = list(zip(*events))
+        self.writer.write_table(self.pa.Table.from_arrays([self.pa.array(c, type=f.type) for c, f in zip(columns, self.schema)], schema=self.schema))
+        self.sink.flush()
+        os.fsync(self.sink.fileno())
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+        os.replace(self.path + '.part', self.path)
+
+def open_segment(log_dir, fmt, seq):
+    # One file per process and segment, so concurrent workers never share a file
+    name = f"interactions-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{seq:04d}"
+    if fmt == 'csv':
+        return CSVSegment(os.path.join(log_dir, name + '.csv'))
+    extension = 'parquet' if fmt == 'parquet' else 'arrow'
+    return ArrowSegment(os.path.join(log_dir, f"{name}.{extension}"), fmt)
+
+class InteractionLogger:
+    """Non-blocking interaction log.
+
+    Request handlers only put event tuples on an in-process queue. A background
+    thread drains it in batches (BATCH_SIZE events or FLUSH_INTERVAL seconds,
+    whichever comes first) and appends them to the current segment file,
+    rotating after SEGMENT_ROWS rows or SEGMENT_SECONDS. close() writes out
+    everything still queued and closes the segment.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, fmt=LOG_FORMAT, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 segment_rows=SEGMENT_ROWS, segment_seconds=SEGMENT_SECONDS, max_pending=MAX_PENDING):
+        if fmt not in ('csv', 'parquet', 'arrow'):
+            raise ValueError(f"Unknown interaction log format: {fmt}")
+        self.log_dir = log_dir
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self.segment = None
+        self.segment_seq = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def start(self):
+        if self.thread is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name='interaction-logger', daemon=True)
+            self.thread.start()
+
+    def log(self, event):
+        # event is a tuple in LOG_COLUMNS order; returns False when the queue is full
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def log_many(self, events):
+        return sum(self.log(event) for event in events)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                event = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.maybe_rotate()
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if event is STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    event = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def write(self, batch):
+        if self.segment is None:
+            self.segment = open_segment(self.log_dir, self.fmt, self.segment_seq)
+            self.segment_seq += 1
+            self.segment_started = time.monotonic()
+            self.segment_written = 0
+        self.segment.write(batch)
+        self.segment_written += len(batch)
+        self.written += len(batch)
+        self.flushes += 1
+        self.maybe_rotate()
+
+    def maybe_rotate(self):
+        if self.segment is None:
+            return
+        if self.segment_written >= self.segment_rows or time.monotonic() - self.segment_started >= self.segment_seconds:
+            self.segment.close()
+            self.segment = None
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(STOP)
+            self.thread.join()
+            self.thread = None
+
+    def stats(self):
+        return {'pending': self.queue.qsize(), 'written': self.written, 'dropped': self.dropped, 'flushes': self.flushes}
@@ -0,0 +1,321 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from ann_index import IVFIndex, nearest_centroids
+from embedding_store import l2_normalize
+from graph_scores import build_graph_score_tables, item_concept_csr, synergy_matrix
+from snapshot import ANN_ATTRIBUTES, CodedColumn, clean_item_name, code_dtype, locality_area, open_snapshot, read_catalog
+
+# Batches of onboarded items live next to the snapshot they extend: NNNNNN.npy (vectors), then NNNNNN.json (rows)
+ADDITIONS_DIR = 'additions'
+TEXT_PROJECTION_PATH = 'text_projection.npz'
+
+def additions_dir(snapshot_path):
+    return os.path.join(snapshot_path, ADDITIONS_DIR)
+
+def list_additions(snapshot_path):
+    # A batch exists once its .json is in place; it is written last
+    path = additions_dir(snapshot_path)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name[:-5] for name in os.listdir(path) if name.endswith('.json'))
+
+def read_addition(snapshot_path, name):
+    with open(os.path.join(additions_dir(snapshot_path), f"{name}.json")) as f:
+        items = pd.DataFrame(json.load(f))
+    return items, np.load(os.path.join(additions_dir(snapshot_path), f"{name}.npy"))
+
+def write_addition(snapshot_path, items, vectors):
+    path = additions_dir(snapshot_path)
+    os.makedirs(path, exist_ok=True)
+    names = list_additions(snapshot_path)
+    name = f"{int(names[-1]) + 1 if names else 1:06d}"
+    tmp = os.path.join(path, f".{name}.{os.getpid()}.tmp")
+
+    np.save(tmp + '.npy', np.asarray(vectors, dtype=np.float32))
+    os.replace(tmp + '.npy', os.path.join(path, f"{name}.npy"))
+    with open(tmp + '.json', 'w') as f:
+        json.dump(items.to_dict('list'), f, default=lambda v: v.item())
+    os.replace(tmp + '.json', os.path.join(path, f"{name}.json"))
+    return name
+
+class TextProjection:
+    """The item tower's text half, from the weights train_twotower.py saves to text_projection.npz.
+
+    Linear(384, 128) -> ReLU -> Linear(128, 32) in NumPy, so new items get
+    their vectors without torch or a retrain.
+    """
+
+    def __init__(self, path=TEXT_PROJECTION_PATH):
+        weights = np.load(path)
+        self.layers = [(weights['w1'], weights['b1']), (weights['w2'], weights['b2'])]
+        self.text_model = str(weights['text_model'])
+
+    @property
+    def dim(self):
+        return self.layers[-1][0].shape[0]
+
+    def __call__(self, text_vectors):
+        (w1, b1), (w2, b2) = self.layers
+        hidden = np.maximum(np.asarray(text_vectors, dtype=np.float32) @ w1.T + b1, 0)
+        return (hidden @ w2.T + b2).astype(np.float32)
+
+def encode_descriptions(descriptions, text_model):
+    # Same sentence model and embedding cache as training; the model only loads for descriptions not cached yet
+    from training_pipeline.text_embedding_cache import TextEmbeddingCache
+
+    def encode(texts):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(text_model).encode(texts)
+
+    cache = TextEmbeddingCache(os.environ.get('ZOMATHON_TEXT_CACHE_DIR', 'embedding_cache'), os.path.basename(os.path.normpath(text_model)))
+    return cache.encode(list(descriptions), encode)
+
+def new_item_vectors(snapshot, items, text_vectors, projection):
+    # [id half | text half]. A new item has no trained id vector, so it borrows the mean id half of the
+    # same dish at other restaurants (zeros for a dish the catalog has never had).
+    text_half = projection(text_vectors)
+    id_dim = snapshot['embeddings'].shape[1] - projection.dim
+    id_half = np.zeros((len(items), id_dim), dtype=np.float32)
+    names = name_code_lookup(snapshot)
+    codes = np.array([names.get(clean, -1) for clean in items['name'].map(clean_item_name)], dtype=np.int64)
+    known = codes >= 0
+    dishes = np.unique(codes[known])
+    if len(dishes):
+        rows = np.flatnonzero(np.isin(snapshot['name_codes'], dishes))
+        rows = rows[np.argsort(snapshot['name_codes'][rows], kind='stable')]
+        counts = np.bincount(np.searchsorted(dishes, snapshot['name_codes'][rows]), minlength=len(dishes))
+        sums = np.add.reduceat(snapshot['embeddings'][rows][:, :id_dim], np.concatenate([[0], np.cumsum(counts)[:-1]]))
+        id_half[known] = (sums / counts[:, None])[np.searchsorted(dishes, codes[known])]
+    return np.concatenate([id_half, text_half], axis=1)
+
+def extend_vocab(vocab, values):
+    # Codes of values in a list vocabulary, appending unseen values; missing values get -1 like pd.factorize
+    vocab = list(vocab)
+    lookup = {value: code for code, value in enumerate(vocab)}
+    codes = []
+    for value in values:
+        if pd.isna(value):
+            codes.append(-1)
+            continue
+        value = str(value)
+        if value not in lookup:
+            lookup[value] = len(vocab)
+            vocab.append(value)
+        codes.append(lookup[value])
+    return np.array(codes, dtype=np.int32), vocab
+
+def append_column(column, values):
+    if isinstance(column, CodedColumn):
+        strings = values.astype(object).fillna('').astype(str).tolist()
+        new_codes, vocab = extend_vocab(column.vocab.tolist(), strings)
+        codes = np.concatenate([column.codes, new_codes]).astype(code_dtype(len(vocab)))
+        return CodedColumn(codes, np.array(vocab, dtype=object))
+    if column.dtype.kind == 'U':
+        return np.concatenate([column, values.astype(object).fillna('').astype(str).to_numpy(dtype=str)])
+    return np.concatenate([column, values.to_numpy()])
+
+def name_code_lookup(snapshot):
+    # Clean item name -> name code, from one row per code
+    codes, first = np.unique(snapshot['name_codes'], return_index=True)
+    names = snapshot['catalog']['name'][first].tolist()
+    return {clean_item_name(name): int(code) for name, code in zip(names, codes)}
+
+def insert_positions(offsets, slots):
+    # Where rows of each slot go in a slot-ordered array: after the slot's existing rows, in the order given
+    insert_at = offsets[slots + 1]
+    order = np.argsort(insert_at, kind='stable')
+    return insert_at[order], order
+
+def shifted_positions(positions, insert_at):
+    # Position of every existing element once np.insert has put new ones before the sorted insert_at
+    return positions + np.searchsorted(insert_at, positions, side='right')
+
+def extend_snapshot(snapshot, items, vectors, name):
+    """The snapshot with `items` appended as new catalog rows, without rebuilding it.
+
+    Row-ordered arrays are appended to. In the restaurant-ordered arrays and
+    the ANN lists, new rows are inserted at the end of their restaurant's
+    slice and of their nearest centroid's list. Graph score tables are only
+    recomputed for restaurants that gained items. Centroids and every other
+    restaurant's tables are reused as they are, and the mapped files are
+    never written: extended arrays are in-memory copies.
+    """
+    manifest = snapshot['manifest']
+    catalog = snapshot['catalog']
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n_old = len(catalog['item_id'])
+    new_rows = n_old + np.arange(len(items))
+
+    item_ids = items['item_id'].astype(np.int64).to_numpy()
+    pos = np.searchsorted(snapshot['sorted_item_ids'], item_ids)
+    existing = snapshot['sorted_item_ids'][np.minimum(pos, n_old - 1)] == item_ids if n_old else np.zeros(len(items), dtype=bool)
+    if existing.any() or len(np.unique(item_ids)) < len(item_ids):
+        raise ValueError(f"Item ids already in the catalog or repeated: {sorted(set(item_ids[existing].tolist()))}")
+    if vectors.shape != (len(items), snapshot['embeddings'].shape[1]):
+        raise ValueError(f"Expected vectors of shape {(len(items), snapshot['embeddings'].shape[1])}, got {vectors.shape}")
+
+    out = dict(snapshot)
+    out['catalog'] = {col: append_column(catalog[col], items[col]) for col in manifest['columns']}
+    # The new rows as the snapshot stores them, for the indexes built from catalog values
+    added = pd.DataFrame({col: out['catalog'][col][new_rows] for col in manifest['columns']})
+
+    category_codes, category_vocab = extend_vocab(manifest['category_vocab'], items['category'])
+    cuisine_codes, cuisine_vocab = extend_vocab(manifest['cuisine_vocab'], items['cuisine_type'])
+    area_codes, area_vocab = extend_vocab(manifest['area_vocab'], items['locality'].map(locality_area, na_action='ignore'))
+    clean_names = items['name'].map(clean_item_name)
+    names = name_code_lookup(snapshot)
+    next_code = int(snapshot['name_codes'].max(initial=-1)) + 1
+    name_codes = []
+    for clean in clean_names:
+        if clean not in names:
+            names[clean] = next_code
+            next_code += 1
+        name_codes.append(names[clean])
+    name_codes = np.array(name_codes, dtype=np.int32)
+    drink_code = category_vocab.index('Drink') if 'Drink' in category_vocab else -2
+    is_hot_drink = clean_names.str.contains('tea|coffee|hot', regex=True).to_numpy() & (category_codes == drink_code)
+
+    for key, values in [('category_codes', category_codes), ('cuisine_codes', cuisine_codes),
+                        ('name_codes', name_codes), ('area_codes', area_codes)]:
+        out[key] = np.concatenate([snapshot[key], values])
+
+    id_order = np.argsort(item_ids, kind='stable')
+    id_insert = np.searchsorted(snapshot['sorted_item_ids'], item_ids[id_order])
+    out['sorted_item_ids'] = np.insert(snapshot['sorted_item_ids'], id_insert, item_ids[id_order])
+    out['item_id_order'] = np.insert(snapshot['item_id_order'], id_insert, new_rows[id_order])
+    out['embeddings'] = snapshot['embeddings'].inserted(n_old, vectors)
+
+    # Restaurant layout: new restaurants get slots in id order, so every later slot number moves up
+    old_ids = snapshot['restaurant_ids']
+    restaurant_ids = np.union1d(old_ids, items['restaurant_id'].astype(np.int64).to_numpy())
+    slot_map = np.searchsorted(restaurant_ids, old_ids)
+    new_slots = np.searchsorted(restaurant_ids, items['restaurant_id'].astype(np.int64).to_numpy())
+    old_offsets = snapshot['restaurant_offsets']
+    sizes = np.zeros(len(restaurant_ids), dtype=np.int64)
+    sizes[slot_map] = np.diff(old_offsets)
+    sizes += np.bincount(new_slots, minlength=len(restaurant_ids))
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    # End of each new row's restaurant in the old layout (for a new restaurant, where it slots in)
+    insert_at = old_offsets[np.searchsorted(slot_map, new_slots, side='right')]
+    order = np.argsort(insert_at, kind='stable')
+    insert_at = insert_at[order]
+    candidates = {
+        'restaurant_rows': new_rows,
+        'candidate_item_ids': item_ids,
+        'candidate_categories': category_codes,
+        'candidate_cuisines': cuisine_codes,
+        'candidate_names': name_codes,
+        'candidate_is_hot_drink': is_hot_drink,
+    }
+    for key, values in candidates.items():
+        out[key] = np.insert(snapshot[key], insert_at, values[order])
+    out['candidate_vectors'] = snapshot['candidate_vectors'].inserted(insert_at, vectors[order])
+
+    out['restaurant_ids'] = restaurant_ids
+    out['restaurant_offsets'] = offsets
+    out['restaurant_slots'] = np.concatenate([slot_map[snapshot['restaurant_slots']], new_slots])
+    restaurant_positions = np.empty(n_old + len(items), dtype=np.int64)
+    restaurant_positions[:n_old] = shifted_positions(snapshot['restaurant_positions'], insert_at)
+    restaurant_positions[new_rows[order]] = insert_at + np.arange(len(items))
+    out['restaurant_positions'] = restaurant_positions
+
+    # Graph tables: untouched restaurants are copied over in runs, the ones that gained items are recomputed
+    touched = np.unique(new_slots)
+    old_graph_offsets = snapshot['graph_offsets']
+    graph_offsets = np.concatenate([[0], np.cumsum(sizes ** 2)])
+    graph_scores = np.empty(graph_offsets[-1], dtype=np.float32)
+    new_to_old = np.full(len(restaurant_ids), -1)
+    new_to_old[slot_map] = np.arange(len(old_ids))
+    bounds = np.concatenate([[-1], touched, [len(restaurant_ids)]])
+    for first, end in zip((bounds[:-1] + 1).tolist(), bounds[1:].tolist()):
+        if first < end:
+            old_first, old_end = new_to_old[first], new_to_old[end - 1] + 1
+            graph_scores[graph_offsets[first]:graph_offsets[end]] = snapshot['graph_scores'][old_graph_offsets[old_first]:old_graph_offsets[old_end]]
+
+    synergy, n_category_nodes = synergy_matrix(category_vocab, len(cuisine_vocab))
+    touched_positions = np.concatenate([np.arange(offsets[s], offsets[s + 1]) for s in touched.tolist()])
+    indptr, indices = item_concept_csr(out['candidate_categories'][touched_positions], out['candidate_cuisines'][touched_positions],
+                                       n_category_nodes, len(cuisine_vocab))
+    tables, table_offsets = build_graph_score_tables(np.concatenate([[0], np.cumsum(sizes[touched])]), indptr, indices, synergy)
+    for i, slot in enumerate(touched.tolist()):
+        graph_scores[graph_offsets[slot]:graph_offsets[slot + 1]] = tables[table_offsets[i]:table_offsets[i + 1]]
+    out['graph_scores'] = graph_scores
+    out['graph_offsets'] = graph_offsets
+
+    # ANN: each new row joins its nearest existing centroid's list; slot attributes follow the new numbering
+    ann = snapshot['ann_index']
+    lists = nearest_centroids(l2_normalize(vectors), ann.centroids)
+    ann_insert, ann_order = insert_positions(snapshot['ann_offsets'], lists)
+    attributes = {
+        'slot': new_slots,
+        'cuisine': cuisine_codes,
+        'area': area_codes,
+        'is_veg': added['is_veg'].fillna(0).astype(np.int8).to_numpy(),
+    }
+    out['ann_rows'] = np.insert(snapshot['ann_rows'], ann_insert, new_rows[ann_order])
+    out['ann_offsets'] = snapshot['ann_offsets'] + np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(ann.centroids)))])
+    out['ann_vectors'] = snapshot['ann_vectors'].inserted(ann_insert, vectors[ann_order])
+    for attr in ANN_ATTRIBUTES:
+        existing_values = snapshot[f"ann_attr_{attr}"]
+        if attr == 'slot':
+            existing_values = slot_map[existing_values]
+        out[f"ann_attr_{attr}"] = np.insert(existing_values, ann_insert, attributes[attr][ann_order])
+    out['ann_index'] = IVFIndex(ann.centroids, out['ann_offsets'], out['ann_rows'], out['ann_vectors'],
+                                {attr: out[f"ann_attr_{attr}"] for attr in ANN_ATTRIBUTES})
+
+    out['manifest'] = {
+        **manifest,
+        'version': hashlib.sha256(f"{manifest['version']}+{name}".encode()).hexdigest(),
+        'base_version': manifest.get('base_version', manifest['version']),
+        'additions': manifest.get('additions', []) + [name],
+        'num_items': len(out['catalog']['item_id']),
+        'num_restaurants': len(restaurant_ids),
+        'category_vocab': category_vocab,
+        'cuisine_vocab': cuisine_vocab,
+        'area_vocab': area_vocab,
+    }
+    return out, {'rows': new_rows, 'items': added, 'touched_slots': touched, 'slot_map': slot_map}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Onboard new menu items into the serving snapshot without retraining")
+    parser.add_argument('new_items', help="CSV or Parquet with the catalog columns; item_id is optional")
+    parser.add_argument('--items', default='items.parquet' if os.path.exists('items.parquet') else 'items.csv')
+    parser.add_argument('--embeddings', default='final_backend_embeddings.npy')
+    parser.add_argument('--projection', default=TEXT_PROJECTION_PATH)
+    parser.add_argument('--text-model', default=os.environ.get('ZOMATHON_TEXT_MODEL'),
+                        help="sentence model name or local directory (default: the one the projection was trained with)")
+    args = parser.parse_args()
+
+    snapshot = open_snapshot(args.items, args.embeddings)
+    columns = snapshot['manifest']['columns']
+    items = read_catalog(args.new_items)
+    missing = [col for col in columns if col not in items.columns and col != 'item_id']
+    if missing:
+        parser.error(f"{args.new_items} is missing columns {missing}")
+
+    taken = set(snapshot['sorted_item_ids'].tolist())
+    for name in list_additions(snapshot['path']):
+        taken.update(read_addition(snapshot['path'], name)[0]['item_id'].tolist())
+    if 'item_id' not in items.columns:
+        items['item_id'] = max(taken, default=0) + 1 + np.arange(len(items))
+    clashes = sorted(taken & set(items['item_id'].tolist()))
+    if clashes:
+        parser.error(f"item ids already in use: {clashes[:10]}")
+    items = items[columns]
+
+    projection = TextProjection(args.projection)
+    text_vectors = encode_descriptions(items['description'].fillna('').astype(str), args.text_model or projection.text_model)
+    vectors = new_item_vectors(snapshot, items, text_vectors, projection)
+    # Dry run against the snapshot, so a batch that cannot be applied never reaches the servers
+    extend_snapshot(snapshot, items, vectors, 'check')
+
+    name = write_addition(snapshot['path'], items, vectors)
+    print(f"Wrote batch {name} with {len(items)} items to {additions_dir(snapshot['path'])}; "
+          f"servers pick it up on their next model check (or POST /admin/reload)")
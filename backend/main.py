@@ -1,16 +1,45 @@
-from fastapi import FastAPI, HTTPException, Query
+import atexit
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-import os
+import threading
 import uvicorn
 
-# Import the dataframe and your advanced recommendation logic
-from model_utils import df, get_meal_completion_recs
+# Import the model registry; each request works on the model version that is active when it starts
+from model_utils import registry, current_model
+from interaction_log import InteractionLogger
+from engagement_stats import EngagementStats
+from metrics import MetricsMiddleware, SlowRequestProfiler, gauge_lines, render_metrics
+from scoring_executor import ScoringBusy, ScoringExecutor
+from serialization import etag_matches, json_response
 
-df.columns = [str(c).strip().lower() for c in df.columns]
+# Clicks are queued and written to rotating segment files by a background thread
+interaction_logger = InteractionLogger()
+atexit.register(interaction_logger.close)
+# Impressions, adds and accept-rate drift, tailed from the interaction log segments
+engagement = EngagementStats()
+# Opt-in via ZOMATHON_PROFILE_SLOW_MS: folded stacks of slow requests, for flame graphs
+profiler = SlowRequestProfiler()
+# Scoring, search and encoding run on a thread pool so the event loop keeps serving cheap requests
+scoring = ScoringExecutor(profiler=profiler)
 
-app = FastAPI(title="Zomathon API")
+@asynccontextmanager
+async def lifespan(app):
+    interaction_logger.start()
+    engagement.start()
+    registry.start_watcher()
+    profiler.start()
+    yield
+    registry.stop_watcher()
+    # Flush everything still queued before the worker exits
+    interaction_logger.close()
+    engagement.stop()
+    scoring.close()
+
+app = FastAPI(title="Zomathon API", lifespan=lifespan)
 
 # Enable CORS for your React Frontend
 app.add_middleware(
@@ -19,6 +48,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
+@app.exception_handler(ScoringBusy)
+async def scoring_busy(request, exc):
+    return Response(content=orjson.dumps({"detail": "Too many requests waiting for scoring"}), status_code=503,
+                    media_type="application/json", headers={"Retry-After": "1"})
 
 class InteractionLog(BaseModel):
     user_id: str
@@ -26,121 +61,196 @@ class InteractionLog(BaseModel):
     recommended_item_id: int
     action: str
 
+class InteractionBatch(BaseModel):
+    events: list[InteractionLog] = Field(..., min_length=1, max_length=1000)
+
+class BatchRecommendRequest(BaseModel):
+    item_ids: list[int] = Field(..., min_length=1, max_length=100)
+    top_n: int = Field(6, ge=1, le=50)
+    user_id: str | None = None
+
+def interaction_event(log, timestamp):
+    return (timestamp, log.user_id, log.anchor_item_id, log.recommended_item_id, log.action)
+
 @app.post("/log_interaction")
 async def log_interaction(log: InteractionLog):
-    log_file = "drift_logs.csv"
-    
-    if not os.path.exists(log_file):
-        with open(log_file, "w") as f:
-            f.write("timestamp,user_id,anchor_item_id,recommended_item_id,action\n")
-            
-    with open(log_file, "a") as f:
-        timestamp = datetime.now().isoformat()
-        f.write(f"{timestamp},{log.user_id},{log.anchor_item_id},{log.recommended_item_id},{log.action}\n")
-        
+    if not interaction_logger.log(interaction_event(log, datetime.now().isoformat())):
+        raise HTTPException(status_code=503, detail="Interaction log queue is full")
     return {"status": "success"}
 
+@app.post("/log_interactions")
+async def log_interactions(batch: InteractionBatch):
+    timestamp = datetime.now().isoformat()
+    accepted = interaction_logger.log_many(interaction_event(log, timestamp) for log in batch.events)
+    if accepted == 0:
+        raise HTTPException(status_code=503, detail="Interaction log queue is full")
+    return {"status": "success", "accepted": accepted}
+
 @app.get("/restaurant/{res_id}/menu")
-async def get_menu(res_id: int):
-    menu = df[df['restaurant_id'] == res_id]
-    if menu.empty:
+async def get_menu(res_id: int, request: Request):
+    model = current_model()
+    rows = model.catalog_index.menu_rows(res_id)
+    if rows is None or len(rows) == 0:
         raise HTTPException(status_code=404, detail="Restaurant not found")
-    return menu.to_dict('records')
+    etag = model.catalog_index.menu_etag(res_id)
+    # Only encode the menu when the client's cached copy is stale
+    body = b"" if etag_matches(request, etag) else model.item_fragments.encode_rows(rows)
+    return json_response(request, body, etag, model.catalog_index.compressed)
 
 @app.get("/categories/available")
-async def get_available_categories():
-    if 'category' in df.columns and 'cuisine_type' in df.columns:
-        cats = df['category'].dropna().unique().tolist()
-        cuisines = df['cuisine_type'].dropna().unique().tolist()
-        all_cats = list(set([str(c).strip() for c in cats + cuisines]))
-        return sorted([c for c in all_cats if c.lower() != 'nan'])
-    return []
+async def get_available_categories(request: Request):
+    index = current_model().catalog_index
+    return json_response(request, *index.categories, index.compressed)
+
+CATEGORY_SYNONYMS = {
+    "dosa": "dosa|idli|vada|uttapam|south indian|sambhar",
+    "drinks": "drink|beverage|cola|sprite|pepsi|shake|lassi|tea|soda|juice|coffee",
+    "cakes": "cake|pastry|brownie|cupcake|muffin",
+    "burgers": "burger|sliders|zinger",
+    "biryani": "biryani|pulao|rice",
+    "pizza": "pizza|calzone|garlic bread",
+    "thali": "thali|platter|meal",
+    "dessert": "dessert|ice cream|halwa|jamun|rasmalai|sweet",
+    "mughlai": "mughlai|kebab|tandoori|butter chicken|naan|curry",
+    "street food": "street|chaat|gupchup|rolls|dahibara|momo|pav bhaji|vada pav",
+    "paneer": "paneer|cottage cheese",
+    "chicken": "chicken|poultry|wings",
+    "chinese": "chinese|manchurian|noodles|hakka|chowmein"
+}
+
+CATEGORY_FIELDS = ['name', 'category', 'cuisine_type']
+SEARCH_FIELDS = ['name', 'restaurant_name', 'category']
+# Relevance weights when ?ranked=true; otherwise results keep catalog order
+FIELD_WEIGHTS = {'name': 3, 'category': 2, 'cuisine_type': 2, 'restaurant_name': 1}
 
 @app.get("/category/{category_name}")
-async def get_global_category(category_name: str):
+async def get_global_category(category_name: str, request: Request, ranked: bool = False):
     search_term = category_name.lower().strip()
-    
-    synonyms = {
-        "dosa": "dosa|idli|vada|uttapam|south indian|sambhar",
-        "drinks": "drink|beverage|cola|sprite|pepsi|shake|lassi|tea|soda|juice|coffee",
-        "cakes": "cake|pastry|brownie|cupcake|muffin",
-        "burgers": "burger|sliders|zinger",
-        "biryani": "biryani|pulao|rice",
-        "pizza": "pizza|calzone|garlic bread",
-        "thali": "thali|platter|meal",
-        "dessert": "dessert|ice cream|halwa|jamun|rasmalai|sweet",
-        "mughlai": "mughlai|kebab|tandoori|butter chicken|naan|curry",
-        "street food": "street|chaat|gupchup|rolls|dahibara|momo|pav bhaji|vada pav",
-        "paneer": "paneer|cottage cheese",
-        "chicken": "chicken|poultry|wings",
-        "chinese": "chinese|manchurian|noodles|hakka|chowmein"
-    }
-    
-    search_pattern = synonyms.get(search_term, search_term)
-
-    mask = (
-        df['name'].str.contains(search_pattern, case=False, na=False, regex=True) |
-        df['category'].str.contains(search_pattern, case=False, na=False, regex=True) |
-        df['cuisine_type'].str.contains(search_pattern, case=False, na=False, regex=True)
-    )
-    
-    results = df[mask].drop_duplicates(subset=['item_id'])
-    return results.head(50).to_dict('records')
+    # Synonyms are query expansion: any alternative matching any field is a hit
+    terms = CATEGORY_SYNONYMS.get(search_term, search_term).split('|')
+
+    model = current_model()
+    def search():
+        rows = model.unique_item_rows(model.search_index.match(terms, CATEGORY_FIELDS))
+        if ranked:
+            rows = model.search_index.rank(rows, terms, {f: FIELD_WEIGHTS[f] for f in CATEGORY_FIELDS})
+        return model.item_fragments.encode_rows(rows[:50])
+    return json_response(request, await scoring.run(('category', model.version, search_term, ranked), search))
 
 @app.get("/locations/available")
-async def get_available_locations():
-    if 'locality' in df.columns:
-        unique_localities = df['locality'].dropna().unique()
-        areas = []
-        for loc in unique_localities:
-            parts = str(loc).split(',')
-            area = parts[1].strip() if len(parts) > 1 else parts[0].strip()
-            areas.append(area)
-        return sorted(list(set(areas)))
-    return ["Bhubaneswar"]
+async def get_available_locations(request: Request):
+    index = current_model().catalog_index
+    return json_response(request, *index.locations, index.compressed)
 
 @app.get("/restaurants/location/{area}")
-async def get_restaurants_by_location(area: str):
-    area_query = area.lower().strip()
-    if 'locality' in df.columns:
-        mask = df['locality'].str.contains(area_query, case=False, na=False)
-        nearby = df[mask][['restaurant_id', 'restaurant_name', 'locality', 'cuisine_type']].drop_duplicates()
-        
-        if nearby.empty:
-            return df[['restaurant_id', 'restaurant_name', 'locality', 'cuisine_type']].drop_duplicates().head(10).to_dict('records')
-        return nearby.to_dict('records')
-    return []
+async def get_restaurants_by_location(area: str, request: Request):
+    index = current_model().catalog_index
+    return json_response(request, *index.restaurants_in_area(area), index.compressed)
 
 @app.get("/search")
-async def global_search(q: str = Query(...)):
-    query = q.lower().strip()
-    mask = (
-        df['name'].str.contains(query, case=False, na=False) |
-        df['restaurant_name'].str.contains(query, case=False, na=False) |
-        df['category'].str.contains(query, case=False, na=False)
-    )
-    return df[mask].head(25).to_dict('records')
+async def global_search(request: Request, q: str = Query(...), ranked: bool = False):
+    model = current_model()
+    def search():
+        rows = model.search_index.match([q], SEARCH_FIELDS)
+        if ranked:
+            rows = model.search_index.rank(rows, [q], {f: FIELD_WEIGHTS[f] for f in SEARCH_FIELDS})
+        return model.item_fragments.encode_rows(rows[:25])
+    return json_response(request, await scoring.run(('search', model.version, q, ranked), search))
 
 @app.get("/recommend/{item_id}")
-async def get_recommendations(item_id: int):
+async def get_recommendations(item_id: int, request: Request, user_id: str = None):
+    # With a user_id the model was trained on, the list is re-ranked for that user; anyone else gets the shared list
     try:
-        recs = get_meal_completion_recs(item_id, top_n=6)
-        
-        cleaned_recs = []
-        for r in recs:
-            cleaned_recs.append({
-                "item_id": r.get("item_id"),
-                "name": r.get("name"),
-                "price": r.get("price"),
-                "category": r.get("category"),
-                "is_veg": r.get("is_veg"),
-                "restaurant_name": r.get("restaurant_name")
-            })
-        return cleaned_recs
+        model = current_model()
+        rows = await scoring.recommend(model, item_id, top_n=6, user_id=user_id)
+        return json_response(request, model.rec_fragments.encode_rows(rows))
+    except ScoringBusy:
+        raise
     except IndexError:
         raise HTTPException(status_code=404, detail="Item ID not found in dataset")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/recommend/batch")
+async def get_batch_recommendations(payload: BatchRecommendRequest, request: Request):
+    # One call for a whole cart: per-anchor results plus a merged cart-level list
+    try:
+        model = current_model()
+        def recommend():
+            batch = model.get_batch_rows(payload.item_ids, top_n=payload.top_n, user_id=payload.user_id)
+            return orjson.dumps({
+                "results": [
+                    {"item_id": item_id, "recommendations": model.rec_fragments.fragment(rows)}
+                    for item_id, rows in batch["results"]
+                ],
+                "cart": model.rec_fragments.fragment(batch["cart"])
+            })
+        key = ('batch', model.version, tuple(payload.item_ids), payload.top_n, payload.user_id)
+        return json_response(request, await scoring.run(key, recommend))
+    except ScoringBusy:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/similar/{item_id}")
+async def get_similar_nearby(item_id: int, request: Request, k: int = Query(10, ge=1, le=100), area: str = None, cuisine: str = None, veg: bool = None):
+    model = current_model()
+    def similar():
+        return model.item_fragments.encode_rows(model.get_similar_rows(item_id, top_n=k, area=area, cuisine=cuisine, veg=veg))
+    return json_response(request, await scoring.run(('similar', model.version, item_id, k, area, cuisine, veg), similar))
+
+@app.get("/admin/cache")
+async def get_cache_stats():
+    # For sizing ZOMATHON_RESULT_CACHE_SIZE: hit rate, evictions and memory of the recommendation cache
+    stats = registry.result_cache.stats()
+    stats["precomputed_top_n"] = current_model().info()["precomputed_top_n"]
+    return stats
+
+@app.get("/admin/engagement")
+async def get_engagement(window: int = Query(3600, ge=1), top: int = Query(20, ge=1, le=500), anchor_item_id: int = None):
+    # Impressions, adds and accept rate over the last `window` seconds against the rest of the last 24h, with drift alerts
+    return {**engagement.report(window, top, anchor_item_id), **engagement.stats()}
+
+@app.get("/admin/model")
+async def get_model_info():
+    # Active model version, when its snapshot was built and loaded, and the state of any background reload
+    return registry.info()
+
+@app.post("/admin/reload", status_code=202)
+async def trigger_reload():
+    # Check the model files now instead of waiting for the watcher (also retries a failed reload); the swap happens in the background
+    threading.Thread(target=registry.reload, daemon=True).start()
+    return {"status": "reloading", "active_version": current_model().version}
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text format; every worker process reports its own series
+    cache = registry.result_cache.stats()
+    logger = interaction_logger.stats()
+    executor = scoring.stats()
+    tailer = engagement.stats()
+    recent = engagement.report(3600, top=1)
+    extra = (
+        gauge_lines('zomathon_model_info', 'Active model version', [({'version': current_model().version[:16]}, 1)])
+        + gauge_lines('zomathon_result_cache_hits_total', 'Recommendation cache hits', [({}, cache['hits'])], 'counter')
+        + gauge_lines('zomathon_result_cache_misses_total', 'Recommendation cache misses', [({}, cache['misses'])], 'counter')
+        + gauge_lines('zomathon_result_cache_entries', 'Entries in the recommendation cache', [({}, cache['entries'])])
+        + gauge_lines('zomathon_result_cache_bytes', 'Estimated memory of the recommendation cache', [({}, cache['memory_bytes'])])
+        + gauge_lines('zomathon_interaction_log_pending', 'Interaction events queued for writing', [({}, logger['pending'])])
+        + gauge_lines('zomathon_interaction_log_written_total', 'Interaction events written to disk', [({}, logger['written'])], 'counter')
+        + gauge_lines('zomathon_interaction_log_dropped_total', 'Interaction events rejected because the queue was full', [({}, logger['dropped'])], 'counter')
+        + gauge_lines('zomathon_scoring_pending', 'Distinct scoring jobs waiting or running', [({}, executor['pending'])])
+        + gauge_lines('zomathon_scoring_submitted_total', 'Scoring jobs started', [({}, executor['submitted'])], 'counter')
+        + gauge_lines('zomathon_scoring_coalesced_total', 'Requests that joined an identical job already in flight', [({}, executor['coalesced'])], 'counter')
+        + gauge_lines('zomathon_scoring_rejected_total', 'Requests turned away because too many jobs were pending', [({}, executor['rejected'])], 'counter')
+        + gauge_lines('zomathon_scoring_batches_total', 'Batched recommendation scoring calls', [({}, executor['batches'])], 'counter')
+        + gauge_lines('zomathon_scoring_batched_requests_total', 'Recommendation misses scored in those batches', [({}, executor['batched_requests'])], 'counter')
+        + gauge_lines('zomathon_engagement_events_total', 'Interaction log rows counted by the engagement tailer', [({}, tailer['events'])], 'counter')
+        + gauge_lines('zomathon_engagement_impressions', 'Recommendation impressions in the last hour', [({}, recent['total']['impressions'])])
+        + gauge_lines('zomathon_engagement_adds', 'Recommended items added to cart in the last hour', [({}, recent['total']['adds'])])
+        + gauge_lines('zomathon_engagement_drift_alerts', 'Accept-rate drift alerts for the last hour', [({}, len(recent['alerts']))])
+    )
+    return Response(content=render_metrics(extra), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
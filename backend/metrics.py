@@ -0,0 +1,219 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+# Upper bounds in seconds, from 100us (a cached recommendation) to 10s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Opt-in: requests slower than this many milliseconds get their sampled stacks written out
+PROFILE_SLOW_MS = float(os.environ.get('ZOMATHON_PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL = float(os.environ.get('ZOMATHON_PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILE_DIR = os.environ.get('ZOMATHON_PROFILE_DIR', 'profiles')
+
+class Histogram:
+    """Fixed-bucket latency histogram: one bisect and two additions per observation."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def time(self):
+        return Span(self)
+
+class Span:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class HistogramFamily:
+    def __init__(self, name, description, label_names, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self.children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+def gauge_lines(name, description, samples, kind='gauge'):
+    # samples: list of (labels dict, value)
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(list(labels), list(labels.values()))} {value}")
+    return lines
+
+request_seconds = HistogramFamily('zomathon_request_duration_seconds', 'End-to-end request latency per route', ['method', 'route', 'status'])
+stage_seconds = HistogramFamily('zomathon_stage_duration_seconds', 'Time spent in each stage of request handling', ['stage'])
+
+def stage(name):
+    # Resolve once at import time and reuse: `with SCORE.time(): ...`
+    return stage_seconds.labels(name)
+
+def collapse_stack(frame):
+    # One line of Brendan Gregg's folded format, root first: usable with flamegraph.pl or speedscope
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+class SlowRequestProfiler:
+    """Sampling profiler for slow requests, off unless ZOMATHON_PROFILE_SLOW_MS is set.
+
+    A background thread snapshots the stack of every thread that is serving a
+    request, every PROFILE_INTERVAL seconds. When a request finishes above the
+    threshold, its samples are written to PROFILE_DIR as a folded-stack file.
+    Async handlers share the event loop thread, so when requests overlap their
+    samples include each other's frames. Work a request hands to another
+    thread (the scoring pool) is sampled too when wrapped with bind().
+    """
+
+    def __init__(self, threshold_ms=PROFILE_SLOW_MS, interval=PROFILE_INTERVAL, out_dir=PROFILE_DIR):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.out_dir = out_dir
+        self.active = {}
+        # The profile of the request being handled, set in begin() and inherited by everything it awaits
+        self.current = ContextVar('profiled_request', default=None)
+        self.thread = None
+        self.written = 0
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start(self):
+        if self.enabled and self.thread is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name='slow-request-profiler', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for thread_ids, samples in list(self.active.values()):
+                for thread_id in tuple(thread_ids):
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own:
+                        samples[collapse_stack(frame)] += 1
+
+    def begin(self):
+        token = object()
+        self.active[token] = ({threading.get_ident()}, Counter())
+        self.current.set(token)
+        return token
+
+    def request_token(self):
+        return self.current.get()
+
+    def bind(self, fn, tokens=None):
+        # fn, sampled under the profiles of `tokens` (default: the calling request) on whichever thread runs it
+        tokens = [t for t in ([self.current.get()] if tokens is None else tokens) if t is not None]
+        if not tokens:
+            return fn
+
+        def run(*args):
+            thread_id = threading.get_ident()
+            added = [entry[0] for entry in map(self.active.get, tokens) if entry is not None and thread_id not in entry[0]]
+            for thread_ids in added:
+                thread_ids.add(thread_id)
+            try:
+                return fn(*args)
+            finally:
+                for thread_ids in added:
+                    thread_ids.discard(thread_id)
+        return run
+
+    def end(self, token, route, seconds):
+        _, samples = self.active.pop(token)
+        if seconds < self.threshold or not samples:
+            return
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self.written:05d}-{route.strip('/').replace('/', '_') or 'root'}-{seconds * 1000:.0f}ms.folded"
+        with open(os.path.join(self.out_dir, name.replace('{', '').replace('}', '')), 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.written += 1
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template, e.g. /recommend/{item_id}."""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        status = [500]
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        token = self.profiler.begin() if self.profiler and self.profiler.enabled else None
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get('route')
+            # Unmatched paths share one label so random URLs cannot blow up the series count
+            path = route.path if route is not None else 'unmatched'
+            request_seconds.labels(scope['method'], path, str(status[0])).observe(elapsed)
+            if token is not None:
+                self.profiler.end(token, path, elapsed)
+
+def render_metrics(extra_lines=()):
+    lines = request_seconds.expose() + stage_seconds.expose() + list(extra_lines)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,393 @@
+import copy
+import glob
+import os
+import time
+import pandas as pd
+import numpy as np
+
+from catalog_index import CatalogIndex
+from item_additions import extend_snapshot
+from metrics import stage
+from search_index import SearchIndex
+from serialization import FragmentCache
+from snapshot import CodedColumn, load_mapped
+
+# Pre-encoded JSON per item: full catalog records, and the slimmer shape the recommend endpoints return
+REC_FIELDS = ['item_id', 'name', 'price', 'category', 'is_veg', 'restaurant_name']
+NO_ROWS = np.zeros(0, dtype=np.int64)
+
+LOOKUP_TIME = stage('recommend.lookup')
+SCORE_TIME = stage('recommend.score')
+SELECT_TIME = stage('recommend.select')
+BATCH_SCORE_TIME = stage('batch.score')
+BATCH_MERGE_TIME = stage('batch.merge')
+ANN_TIME = stage('similar.ann')
+# Weight of the user-item cosine in the hybrid score of personalized recommendations
+PERSONALIZATION_WEIGHT = float(os.environ.get('ZOMATHON_PERSONALIZATION_WEIGHT', 0.3))
+# Weight of the mined co-purchase NPMI between anchor and candidate in the hybrid score
+COOCCURRENCE_WEIGHT = float(os.environ.get('ZOMATHON_COOCCURRENCE_WEIGHT', 0.3))
+
+def vocab_code(vocab, value):
+    return vocab.index(value) if value in vocab else -2
+
+def lookup_code(vocab, value):
+    lowered = [v.lower() for v in vocab]
+    value = str(value).lower().strip()
+    return lowered.index(value) if value in lowered else -2
+
+def top_unique_by_name(scores, names, top_n):
+    # Keep the best scoring item per cleaned name, then pick the top N among those
+    order = np.lexsort((-scores, names))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = names[order][1:] != names[order][:-1]
+    winners = np.sort(order[first])
+
+    if len(winners) > top_n:
+        winners = np.sort(winners[np.argpartition(-scores[winners], top_n - 1)[:top_n]])
+    return winners[np.argsort(-scores[winners], kind='stable')]
+
+class ModelState:
+    """Everything served for one snapshot version: arrays, indexes and scoring.
+
+    Built once and never modified afterwards. A reload, or items added with
+    with_items, builds a new ModelState and swaps the reference, so a request
+    that picked up this object finishes on the same version it started with.
+    """
+
+    def __init__(self, snapshot, result_cache, precompute_top_n=0):
+        start = time.perf_counter()
+        # Everything here is memory-mapped from a snapshot built once per (catalog, embeddings) version,
+        # so workers share the catalog and embedding pages instead of each holding a private copy
+        self.bind(snapshot)
+
+        print("Building Search Index...")
+        self.search_index = SearchIndex(self.catalog, ['name', 'restaurant_name', 'category', 'cuisine_type'])
+        self.catalog_index = CatalogIndex(self.df, snapshot)
+
+        self.item_fragments = FragmentCache(self.get_item_records, self.catalog['item_id'])
+        self.rec_fragments = FragmentCache(self.get_item_records, self.catalog['item_id'], fields=REC_FIELDS)
+
+        self.result_cache = result_cache
+        self.precomputed_recs = self.load_precomputed_recs(precompute_top_n)
+        # Restaurants whose precomputed rows predate items added to them (see with_items)
+        self.stale_slots = None
+
+        self.loaded_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.load_seconds = round(time.perf_counter() - start, 3)
+
+    def bind(self, snapshot):
+        self.snapshot = snapshot
+        self.manifest = manifest = snapshot['manifest']
+        self.version = manifest['version']
+        self.catalog = catalog = snapshot['catalog']
+        self.df = pd.DataFrame({col: values.to_categorical() if isinstance(values, CodedColumn) else values
+                                for col, values in catalog.items()})
+        self.embeddings = snapshot['embeddings']
+
+        self.category_vocab = manifest['category_vocab']
+        self.cuisine_vocab = manifest['cuisine_vocab']
+        self.area_vocab = manifest['area_vocab']
+        self.category_codes = snapshot['category_codes']
+        self.cuisine_codes = snapshot['cuisine_codes']
+        self.name_codes = snapshot['name_codes']
+        self.area_codes = snapshot['area_codes']
+
+        self.drink_code = vocab_code(self.category_vocab, 'Drink')
+        self.dessert_code = vocab_code(self.category_vocab, 'Dessert')
+        self.heavy_main_cats = [vocab_code(self.category_vocab, c) for c in ['Wet Curry', 'Dry Main', 'Fast Food Main', 'Bread']]
+        self.hot_drink_clash_cuisines = [vocab_code(self.cuisine_vocab, c) for c in ['Fast Food', 'Chinese']]
+
+        self.sorted_item_ids = snapshot['sorted_item_ids']
+        self.item_id_order = snapshot['item_id_order']
+        self.restaurant_offsets = snapshot['restaurant_offsets']
+        self.restaurant_slots = snapshot['restaurant_slots']
+        self.restaurant_positions = snapshot['restaurant_positions']
+        # Unit-length vectors in restaurant order: cosine similarity is a dot product over a contiguous slice
+        self.candidate_vectors = snapshot['candidate_vectors']
+        self.graph_scores = snapshot['graph_scores']
+        self.graph_offsets = snapshot['graph_offsets']
+        self.ann_index = snapshot['ann_index']
+        # Two-Tower user vectors, when the model exported them
+        self.user_store = snapshot.get('user_store')
+        # Items bought together in past sessions, when the model shipped a mined co-occurrence graph
+        self.cooccurrence = snapshot.get('cooccurrence')
+
+    def with_items(self, items, vectors, name):
+        """A new state serving this one's catalog plus `items`, whose embeddings are `vectors`.
+
+        Nothing is rebuilt from scratch: the snapshot arrays, search index and
+        listing payloads are extended (see item_additions.extend_snapshot), and
+        this state is left untouched for requests still using it.
+        """
+        start = time.perf_counter()
+        snapshot, added = extend_snapshot(self.snapshot, items, vectors, name)
+        state = copy.copy(self)
+        state.bind(snapshot)
+
+        state.search_index = self.search_index.extended({field: added['items'][field].to_numpy() for field in self.search_index.fields})
+        state.catalog_index = self.catalog_index.extended(added['items'], snapshot)
+        # Existing items serialise the same way, so their cached fragments carry over
+        state.item_fragments = FragmentCache(state.get_item_records, state.catalog['item_id'])
+        state.item_fragments.fragments = self.item_fragments.fragments
+        state.rec_fragments = FragmentCache(state.get_item_records, state.catalog['item_id'], fields=REC_FIELDS)
+        state.rec_fragments.fragments = self.rec_fragments.fragments
+
+        if self.precomputed_recs is not None:
+            stale = np.zeros(len(state.restaurant_offsets) - 1, dtype=bool)
+            if self.stale_slots is not None:
+                stale[added['slot_map'][self.stale_slots]] = True
+            stale[added['touched_slots']] = True
+            state.stale_slots = stale
+        state.loaded_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        state.load_seconds = round(time.perf_counter() - start, 3)
+        return state
+
+    def find_item_row(self, item_id):
+        pos = np.searchsorted(self.sorted_item_ids, item_id)
+        if pos < len(self.sorted_item_ids) and self.sorted_item_ids[pos] == item_id:
+            return int(self.item_id_order[pos])
+        return None
+
+    def restaurant_candidates(self, slot):
+        # Views into the restaurant-ordered arrays; nothing is copied per request
+        start, end = self.restaurant_offsets[slot], self.restaurant_offsets[slot + 1]
+        return {
+            'rows': self.snapshot['restaurant_rows'][start:end],
+            'item_ids': self.snapshot['candidate_item_ids'][start:end],
+            'vectors': self.candidate_vectors[start:end],
+            'categories': self.snapshot['candidate_categories'][start:end],
+            'cuisines': self.snapshot['candidate_cuisines'][start:end],
+            'names': self.snapshot['candidate_names'][start:end],
+            'is_hot_drink': self.snapshot['candidate_is_hot_drink'][start:end],
+        }
+
+    def graph_score_row(self, slot, local):
+        # Personalized PageRank of every item in the restaurant, restarting at the item in position `local`
+        size = self.restaurant_offsets[slot + 1] - self.restaurant_offsets[slot]
+        start = self.graph_offsets[slot] + local * size
+        return self.graph_scores[start:start + size]
+
+    def get_item_records(self, rows):
+        columns = {col: self.catalog[col][rows].tolist() for col in self.manifest['columns']}
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def unique_item_rows(self, rows):
+        # First row per item_id, keeping row order
+        _, first = np.unique(self.catalog['item_id'][rows], return_index=True)
+        return rows[np.sort(first)]
+
+    def graph_score_block(self, slot):
+        size = self.restaurant_offsets[slot + 1] - self.restaurant_offsets[slot]
+        return self.graph_scores[self.graph_offsets[slot]:self.graph_offsets[slot + 1]].reshape(size, size)
+
+    def user_vector(self, user_id):
+        # Unit-length user vector, or None for no user, a user the model has not seen or a model without users
+        if user_id is None or self.user_store is None:
+            return None
+        return self.user_store.vector(user_id)
+
+    def score_anchors(self, slot, anchor_rows, user_vector=None):
+        # One matrix multiply scores every anchor from the same restaurant against all of its items
+        index = self.restaurant_candidates(slot)
+        local = self.restaurant_positions[anchor_rows] - self.restaurant_offsets[slot]
+
+        sim_scores = self.candidate_vectors[self.restaurant_positions[anchor_rows]] @ index['vectors'].T
+        graph_rows = self.graph_score_block(slot)[local] * 100
+
+        target_cuisines = self.cuisine_codes[anchor_rows]
+        target_cats = self.category_codes[anchor_rows]
+
+        candidates = (index['rows'][None, :] != anchor_rows[:, None]) & (index['names'][None, :] != self.name_codes[anchor_rows][:, None])
+        companions = (index['categories'] == self.drink_code) | (index['categories'] == self.dessert_code)
+        candidates &= (index['cuisines'][None, :] == target_cuisines[:, None]) | companions[None, :]
+
+        final_scores = (sim_scores * 0.6) + (graph_rows * 0.4)
+        if self.cooccurrence is not None:
+            # At most top-K neighbours per anchor, all on its own menu
+            anchors, neighbours, weights = self.cooccurrence.edges(anchor_rows)
+            final_scores[anchors, self.restaurant_positions[neighbours] - self.restaurant_offsets[slot]] += COOCCURRENCE_WEIGHT * weights
+        if user_vector is not None:
+            # How much this user likes each candidate, the same for every anchor
+            final_scores += PERSONALIZATION_WEIGHT * (index['vectors'] @ user_vector)[None, :]
+
+        hot_drink_clash = np.isin(target_cuisines, self.hot_drink_clash_cuisines)
+        final_scores[hot_drink_clash[:, None] & index['is_hot_drink'][None, :]] *= 0.01
+
+        heavy_main = np.isin(target_cats, self.heavy_main_cats)
+        final_scores[heavy_main[:, None] & (index['categories'] == self.dessert_code)[None, :]] *= 0.4
+
+        return index, final_scores, candidates
+
+    def pick_top_rows(self, index, scores, candidates, top_n):
+        local = np.flatnonzero(candidates)
+        if len(local) == 0 or top_n <= 0:
+            return local
+        picked = local[top_unique_by_name(scores[local], index['names'][local], top_n)]
+        return index['rows'][picked]
+
+    def compute_meal_completion_rows(self, idx, top_n, user_vector=None):
+        with SCORE_TIME.time():
+            index, final_scores, candidates = self.score_anchors(self.restaurant_slots[idx], np.array([idx]), user_vector)
+        with SELECT_TIME.time():
+            return self.pick_top_rows(index, final_scores[0], candidates[0], top_n)
+
+    def recs_table_path(self, top_n):
+        # Tables scored with co-occurrence carry its weight in the name, so changing the weight never serves a stale one
+        weight = f"-cooc{COOCCURRENCE_WEIGHT:g}" if self.cooccurrence is not None else ''
+        return os.path.join(self.snapshot['path'], f"recommendations_top{top_n}{weight}.npy")
+
+    def precompute_recommendations(self, top_n=6):
+        # Every item's recommendations in catalog row order, one restaurant at a time; -1 pads short lists
+        table = np.full((len(self.df), top_n), -1, dtype=np.int32)
+        for slot in range(len(self.restaurant_offsets) - 1):
+            rows = self.restaurant_candidates(slot)['rows']
+            index, final_scores, candidates = self.score_anchors(slot, rows)
+            for row, scores, mask in zip(rows.tolist(), final_scores, candidates):
+                picked = self.pick_top_rows(index, scores, mask, top_n)
+                table[row, :len(picked)] = picked
+
+        # Stored inside the versioned snapshot, so a new catalog or embedding file never sees a stale table
+        # The temp name starts with a dot, so load_precomputed_recs never picks up a half-written table
+        folder, name = os.path.split(self.recs_table_path(top_n))
+        tmp_path = os.path.join(folder, f".tmp-{os.getpid()}-{name}")
+        np.save(tmp_path, table)
+        os.replace(tmp_path, self.recs_table_path(top_n))
+        return table
+
+    def load_precomputed_recs(self, precompute_top_n):
+        # Only finished tables for this scoring: recommendations_top<N> and nothing else in the starred part
+        prefix, suffix = self.recs_table_path('*').split('*')
+        tables = [path for path in glob.glob(prefix + '*' + suffix) if path[len(prefix):len(path) - len(suffix)].isdigit()]
+        if precompute_top_n and self.recs_table_path(precompute_top_n) not in tables:
+            print(f"Precomputing top-{precompute_top_n} recommendations for every item...")
+            self.precompute_recommendations(precompute_top_n)
+            tables.append(self.recs_table_path(precompute_top_n))
+        if not tables:
+            return None
+        # The widest table also answers every smaller top_n
+        return max((load_mapped(path) for path in tables), key=lambda table: table.shape[1])
+
+    def rec_cache_key(self, idx, top_n):
+        return (int(self.catalog['item_id'][idx]), top_n, self.version)
+
+    def find_cached_rows(self, item_id, top_n=6):
+        # (row, recommendations) when no scoring is needed: unknown item, precomputed table or cache hit.
+        # Otherwise (row, None), and the row is scored with compute_meal_completion_rows or _batch.
+        with LOOKUP_TIME.time():
+            idx = self.find_item_row(int(item_id))
+            if idx is None:
+                return None, NO_ROWS
+
+            fresh = self.stale_slots is None or not self.stale_slots[self.restaurant_slots[idx]]
+            if self.precomputed_recs is not None and top_n <= self.precomputed_recs.shape[1] and fresh:
+                rows = self.precomputed_recs[idx, :top_n]
+                return idx, rows[rows >= 0]
+            return idx, self.result_cache.get(self.rec_cache_key(idx, top_n))
+
+    def get_meal_completion_rows(self, item_id, top_n=6, user_id=None):
+        user = self.user_vector(user_id)
+        if user is not None:
+            # Personalized lists are scored per request: neither the result cache nor the precomputed table holds them
+            idx = self.find_item_row(int(item_id))
+            return NO_ROWS if idx is None else self.compute_meal_completion_rows(idx, top_n, user)
+
+        idx, rows = self.find_cached_rows(item_id, top_n)
+        if rows is None:
+            rows = self.compute_meal_completion_rows(idx, top_n)
+            self.result_cache.put(self.rec_cache_key(idx, top_n), rows)
+        return rows
+
+    def compute_meal_completion_batch(self, anchor_rows, top_n=6):
+        # Recommendations for many anchors at once, one matrix multiply per restaurant; {row: rows}
+        anchor_rows = np.unique(np.asarray(anchor_rows, dtype=np.int64))
+        results = {}
+        slots = self.restaurant_slots[anchor_rows]
+        for slot in np.unique(slots):
+            group = anchor_rows[slots == slot]
+            with SCORE_TIME.time():
+                index, final_scores, candidates = self.score_anchors(slot, group)
+            with SELECT_TIME.time():
+                for row, scores, mask in zip(group.tolist(), final_scores, candidates):
+                    results[row] = self.pick_top_rows(index, scores, mask, top_n)
+                    self.result_cache.put(self.rec_cache_key(row, top_n), results[row])
+        return results
+
+    def get_meal_completion_recs(self, item_id, top_n=6, user_id=None):
+        return self.get_item_records(self.get_meal_completion_rows(item_id, top_n, user_id))
+
+    def get_batch_rows(self, item_ids, top_n=6, user_id=None):
+        # Anchors are grouped by restaurant so each group costs a single matrix multiply
+        user = self.user_vector(user_id)
+        anchors = {int(i): self.find_item_row(int(i)) for i in item_ids}
+        results = {item_id: NO_ROWS for item_id in anchors}
+        cart_rows = np.array([row for row in anchors.values() if row is not None], dtype=np.int64)
+        row_item_ids = {row: item_id for item_id, row in anchors.items() if row is not None}
+
+        merged_rows, merged_scores, merged_names = [], [], []
+        slots = self.restaurant_slots[cart_rows]
+        for slot in np.unique(slots):
+            group = cart_rows[slots == slot]
+            with BATCH_SCORE_TIME.time():
+                index, final_scores, candidates = self.score_anchors(slot, group, user)
+
+            for row, scores, mask in zip(group.tolist(), final_scores, candidates):
+                results[row_item_ids[row]] = self.pick_top_rows(index, scores, mask, top_n)
+
+            # Cart level: the best score any anchor gives an item, never re-suggesting what is already in the cart
+            best = np.where(candidates, final_scores, -np.inf).max(axis=0)
+            keep = np.isfinite(best) & ~np.isin(index['rows'], cart_rows) & ~np.isin(index['names'], self.name_codes[cart_rows])
+            merged_rows.append(index['rows'][keep])
+            merged_scores.append(best[keep])
+            merged_names.append(index['names'][keep])
+
+        cart = NO_ROWS
+        if merged_rows and top_n > 0:
+            with BATCH_MERGE_TIME.time():
+                rows, scores, names = np.concatenate(merged_rows), np.concatenate(merged_scores), np.concatenate(merged_names)
+                if len(rows):
+                    cart = rows[top_unique_by_name(scores, names, top_n)]
+
+        return {'results': list(results.items()), 'cart': cart}
+
+    def get_batch_recs(self, item_ids, top_n=6, user_id=None):
+        batch = self.get_batch_rows(item_ids, top_n, user_id)
+        return {
+            'results': [{'item_id': item_id, 'recommendations': self.get_item_records(rows)} for item_id, rows in batch['results']],
+            'cart': self.get_item_records(batch['cart']),
+        }
+
+    def get_similar_rows(self, item_id, top_n=10, area=None, cuisine=None, veg=None, n_probe=8):
+        # Embedding neighbours from other restaurants, by default restricted to the anchor's area
+        idx = self.find_item_row(int(item_id))
+        if idx is None:
+            return NO_ROWS
+
+        filters = {'area': lookup_code(self.area_vocab, area) if area else self.area_codes[idx]}
+        if cuisine:
+            filters['cuisine'] = lookup_code(self.cuisine_vocab, cuisine)
+        if veg is not None:
+            filters['is_veg'] = int(veg)
+
+        with ANN_TIME.time():
+            rows, _ = self.ann_index.search(self.embeddings[idx], k=top_n, n_probe=n_probe, filters=filters,
+                                            exclude={'slot': self.restaurant_slots[idx]})
+        return rows
+
+    def get_similar_items(self, item_id, top_n=10, area=None, cuisine=None, veg=None, n_probe=8):
+        return self.get_item_records(self.get_similar_rows(item_id, top_n, area, cuisine, veg, n_probe))
+
+    def info(self):
+        return {
+            'version': self.version,
+            'built_at': self.manifest['built_at'],
+            'build_seconds': self.manifest['build_seconds'],
+            'loaded_at': self.loaded_at,
+            'load_seconds': self.load_seconds,
+            'num_items': self.manifest['num_items'],
+            'num_restaurants': self.manifest['num_restaurants'],
+            'num_users': self.manifest.get('num_users', 0),
+            'num_cooccurrence_edges': self.manifest.get('num_cooccurrence_edges', 0),
+            'base_version': self.manifest.get('base_version', self.version),
+            'additions': len(self.manifest.get('additions', [])),
+            'precomputed_top_n': int(self.precomputed_recs.shape[1]) if self.precomputed_recs is not None else 0,
+        }
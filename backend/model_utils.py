@@ -1,108 +1,198 @@
-import pandas as pd
-import numpy as np
-import networkx as nx
-from sklearn.metrics.pairwise import cosine_similarity
-
-CSV_PATH = 'items.csv' 
-NPY_PATH = 'final_backend_embeddings.npy' 
-
-print("Loading Neural Embeddings & Catalog...")
-df = pd.read_csv(CSV_PATH)
-embeddings = np.load(NPY_PATH)
-
-print("Building the Knowledge Graph Bouncer...")
-def build_restaurant_graph(restaurant_id):
-    G = nx.Graph()
-    res_df = df[df['restaurant_id'] == restaurant_id]
-
-    for _, row in res_df.iterrows():
-        item_id = int(row['item_id'])
-        G.add_node(item_id, type='item', data=row.to_dict())
-        G.add_node(f"CUISINE_{row['cuisine_type']}", type='cuisine')
-        G.add_node(f"CAT_{row['category']}", type='category')
-        
-        G.add_edge(item_id, f"CUISINE_{row['cuisine_type']}", weight=1.0)
-        G.add_edge(item_id, f"CAT_{row['category']}", weight=1.0)
-
-    synergies = [
-        ("CAT_Wet Curry", "CAT_Bread", 8.0),
-        ("CAT_Wet Curry", "CAT_Starter", 3.0),
-        ("CAT_Dry Main", "CAT_Side", 6.0),
-        ("CAT_Fast Food Main", "CAT_Side", 8.0),
-        ("CAT_Starter", "CAT_Dry Main", 4.0),
-        ("CAT_Starter", "CAT_Fast Food Main", 4.0),
-        ("CAT_Drink", "CAT_Fast Food Main", 3.0),
-        ("CAT_Drink", "CAT_Starter", 3.0),
-        ("CAT_Dessert", "CAT_Drink", 2.0)
-    ]
-    for u, v, w in synergies:
-        G.add_edge(u, v, weight=w)
-        
-    return G
-
-graphs = {res_id: build_restaurant_graph(res_id) for res_id in df['restaurant_id'].unique()}
-
-def get_meal_completion_recs(item_id, top_n=6):
-    try:
-        idx = df[df['item_id'] == int(item_id)].index[0]
-    except IndexError:
-        return []
-
-    target_vec = embeddings[idx].reshape(1, -1)
-    target_row = df.iloc[idx]
-    res_id = target_row['restaurant_id']
-    target_cuisine = target_row['cuisine_type']
-    target_cat = target_row['category']
-    
-    if res_id not in graphs:
-        return []
-    G = graphs[res_id]
-
-    sim_scores = cosine_similarity(target_vec, embeddings).flatten()
-    
-    try:
-        pagerank_scores = nx.pagerank(G, personalization={int(item_id): 1.0}, weight='weight', alpha=0.85)
-    except Exception:
-        pagerank_scores = {}
-
-    hybrid_scores = []
-    seen_names = {str(target_row['name']).split('(')[0].strip().lower()}
-
-    for i, row in df.iterrows():
-        current_id = int(row['item_id'])
-        
-        if row['restaurant_id'] != res_id or current_id == int(item_id):
-            continue
-            
-        clean_name = str(row['name']).split('(')[0].strip().lower()
-        if clean_name in seen_names:
-            continue
-            
-        if row['cuisine_type'] != target_cuisine and row['category'] not in ['Drink', 'Dessert']:
-            continue
-
-        nn_score = sim_scores[i] 
-        graph_score = pagerank_scores.get(current_id, 0.0) * 100 
-        
-        final_score = (nn_score * 0.6) + (graph_score * 0.4)
-        
-        if row['category'] == 'Drink':
-            is_hot = any(w in clean_name for w in ['tea', 'coffee', 'hot'])
-            if target_cuisine in ['Fast Food', 'Chinese'] and is_hot:
-                final_score *= 0.01 
-
-        if target_cat in ['Wet Curry', 'Dry Main', 'Fast Food Main', 'Bread'] and row['category'] == 'Dessert':
-            final_score *= 0.4
-
-        hybrid_scores.append((final_score, row.to_dict(), clean_name))
-
-    hybrid_scores.sort(key=lambda x: x[0], reverse=True)
-    
-    final_recs = []
-    for score, data, clean_name in hybrid_scores:
-        final_recs.append(data)
-        seen_names.add(clean_name)
-        if len(final_recs) == top_n:
-            break
-            
-    return final_recs
\ No newline at end of file
+import os
+import threading
+import time
+
+from cooccurrence import cooccurrence_sources
+from item_additions import list_additions, read_addition
+from model_state import ModelState
+from result_cache import ResultCache
+from snapshot import open_snapshot
+from user_store import user_sources
+
+# items.parquet from training_pipeline/generate_catalog.py; catalogs exported before it are items.csv
+ITEMS_PATH = 'items.parquet' if os.path.exists('items.parquet') else 'items.csv'
+NPY_PATH = 'final_backend_embeddings.npy'
+# Set to a top_n (e.g. 6) to precompute every item's recommendations at startup when the snapshot has none
+PRECOMPUTE_TOP_N = int(os.environ.get('ZOMATHON_PRECOMPUTE_RECS', 0))
+# Seconds between checks of the catalog and the embedding file for a new model version; 0 disables the watcher
+RELOAD_INTERVAL = float(os.environ.get('ZOMATHON_RELOAD_INTERVAL', 10))
+
+def source_stamp(items_path, npy_path):
+    # Cheap change detection: the files are only hashed (by open_snapshot) once their size or mtime moves
+    paths = [items_path, npy_path] + user_sources(npy_path) + cooccurrence_sources(npy_path)
+    return tuple((st.st_size, st.st_mtime_ns) for st in map(os.stat, paths))
+
+class ModelRegistry:
+    """Holds the active ModelState and replaces it when the model files change.
+
+    A watcher thread polls the catalog file and the embedding matrix. Once they have
+    changed and then stayed unchanged for a full interval (so a half-copied
+    file is never picked up), the new snapshot is opened or built and its
+    indexes are built in the background. The registry then swaps a single
+    reference. Requests call current() once and keep that state until they
+    finish, so in-flight requests complete on the version they started on.
+
+    Items onboarded with item_additions.py are batches stored next to the
+    active snapshot. The watcher applies new batches to the current state
+    (ModelState.with_items) and swaps that in the same way.
+    """
+
+    def __init__(self, items_path, npy_path, precompute_top_n=0, reload_interval=RELOAD_INTERVAL):
+        self.items_path = items_path
+        self.npy_path = npy_path
+        self.precompute_top_n = precompute_top_n
+        self.reload_interval = reload_interval
+        self.result_cache = ResultCache()
+        self.reload_lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.watcher = None
+
+        self.stamp = source_stamp(items_path, npy_path)
+        self.state = self.build(with_additions=False)
+        self.result_cache.set_version(self.state.version)
+        self.status = 'idle'
+        self.last_error = None
+        self.failed_stamp = None
+        self.failed_additions = None
+        self.previous_version = None
+        self.swapped_at = None
+        # A bad batch is reported instead of stopping the server from starting
+        self.apply_additions()
+
+    def current(self):
+        return self.state
+
+    def build(self, with_additions=True):
+        state = ModelState(open_snapshot(self.items_path, self.npy_path), self.result_cache, self.precompute_top_n)
+        return self.add_pending_items(state) if with_additions else state
+
+    def add_pending_items(self, state):
+        # Batches written for this snapshot since the state was built, in order
+        path = state.snapshot['path']
+        for name in list_additions(path)[len(state.manifest.get('additions', [])):]:
+            items, vectors = read_addition(path, name)
+            state = state.with_items(items, vectors, name)
+            print(f"Added {len(items)} items from batch {name}")
+        return state
+
+    def swap(self, state):
+        self.previous_version = self.state.version
+        self.state = state
+        self.result_cache.set_version(state.version)
+        self.swapped_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        print(f"Now serving model version {state.version[:16]}")
+
+    def apply_additions(self):
+        # Onboarded items go live on top of the current state, without rebuilding it
+        with self.reload_lock:
+            state = self.state
+            pending = list_additions(state.snapshot['path'])[len(state.manifest.get('additions', [])):]
+            if not pending or pending == self.failed_additions:
+                return False
+            try:
+                state = self.add_pending_items(state)
+            except Exception as e:
+                # Not retried until another batch arrives
+                self.failed_additions = pending
+                self.last_error = repr(e)
+                print(f"Adding items failed, still serving {self.state.version[:16]}: {e!r}")
+                return False
+            self.failed_additions = None
+            self.last_error = None
+            self.swap(state)
+            return True
+
+    def reload(self):
+        # Builds the new state off to the side; requests keep using the old one until the swap
+        with self.reload_lock:
+            stamp = None
+            try:
+                stamp = source_stamp(self.items_path, self.npy_path)
+                if stamp == self.stamp:
+                    return self.apply_additions()
+                self.status = 'building'
+                print("Model files changed, loading the new snapshot...")
+                state = self.build()
+            except Exception as e:
+                # Keep serving the old version; the watcher waits for the files to change again before retrying
+                self.status = 'failed'
+                self.failed_stamp = stamp
+                self.last_error = repr(e)
+                print(f"Model reload failed, still serving {self.state.version[:16]}: {e!r}")
+                return False
+
+            self.stamp = stamp
+            self.status = 'idle'
+            self.last_error = None
+            if state.version == self.state.version:
+                return False
+            self.swap(state)
+            return True
+
+    def watch(self):
+        pending = None
+        while not self.stop_event.wait(self.reload_interval):
+            try:
+                stamp = source_stamp(self.items_path, self.npy_path)
+            except OSError:
+                # A file is being replaced right now
+                continue
+            if stamp in (self.stamp, self.failed_stamp):
+                pending = None
+                if stamp == self.stamp:
+                    self.apply_additions()
+            elif stamp != pending:
+                pending = stamp
+            else:
+                self.reload()
+                pending = None
+
+    def start_watcher(self):
+        if self.reload_interval > 0 and self.watcher is None:
+            self.stop_event.clear()
+            self.watcher = threading.Thread(target=self.watch, name='model-watcher', daemon=True)
+            self.watcher.start()
+
+    def stop_watcher(self):
+        if self.watcher is not None:
+            self.stop_event.set()
+            self.watcher.join()
+            self.watcher = None
+
+    def info(self):
+        return {
+            **self.state.info(),
+            'status': self.status,
+            'last_error': self.last_error,
+            'previous_version': self.previous_version,
+            'swapped_at': self.swapped_at,
+            'reload_interval_seconds': self.reload_interval,
+        }
+
+print("Loading Model Snapshot...")
+registry = ModelRegistry(ITEMS_PATH, NPY_PATH, PRECOMPUTE_TOP_N)
+
+def current_model():
+    return registry.current()
+
+# Shortcuts on whichever version is active, for scripts and notebooks
+def get_meal_completion_recs(item_id, top_n=6, user_id=None):
+    return registry.current().get_meal_completion_recs(item_id, top_n, user_id)
+
+def get_batch_recs(item_ids, top_n=6, user_id=None):
+    return registry.current().get_batch_recs(item_ids, top_n, user_id)
+
+def get_similar_items(item_id, top_n=10, area=None, cuisine=None, veg=None, n_probe=8):
+    return registry.current().get_similar_items(item_id, top_n, area, cuisine, veg, n_probe)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute every item's recommendations into the current snapshot")
+    parser.add_argument('--precompute-recs', type=int, default=6, metavar='TOP_N')
+    args = parser.parse_args()
+
+    # Tables belong to the snapshot as built from the files; added items are scored on demand
+    model = registry.build(with_additions=False)
+    model.precompute_recommendations(args.precompute_recs)
+    print(f"Recommendations written to {model.recs_table_path(args.precompute_recs)}")
@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = int(os.environ.get('ZOMATHON_RESULT_CACHE_SIZE', 50_000))
+# Seconds before an entry is recomputed; 0 keeps entries until evicted or the model version changes
+RESULT_CACHE_TTL = float(os.environ.get('ZOMATHON_RESULT_CACHE_TTL', 0))
+
+# Rough per-entry cost of the OrderedDict slot and expiry timestamp on top of key and value
+ENTRY_OVERHEAD_BYTES = 120
+
+class ResultCache:
+    """Bounded LRU cache of recommendation rows, with an optional TTL.
+
+    Keys end with the model version (the snapshot hash of the catalog and the
+    embedding matrix), so results from a previous catalog or embedding file
+    can never be served. set_version() drops them eagerly when the model
+    changes. Cached row arrays are read-only and shared between requests.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, version=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = version
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def entry_bytes(self, key, rows):
+        return sys.getsizeof(key) + sys.getsizeof(rows) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl and entry[1] < time.monotonic():
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, rows):
+        if self.max_entries <= 0:
+            return
+        rows.flags.writeable = False
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (rows, expires)
+            self.bytes += self.entry_bytes(key, rows)
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        rows, _ = self.entries.pop(key)
+        self.bytes -= self.entry_bytes(key, rows)
+
+    def set_version(self, version):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.bytes = 0
+                self.version = version
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'version': self.version,
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'memory_bytes': self.bytes,
+        }
@@ -0,0 +1,134 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Scoring threads, which is also how many scoring jobs run at once; 0 scores inline on the event loop
+SCORING_THREADS = int(os.environ.get('ZOMATHON_SCORING_THREADS', 4))
+# Requests waiting for or in scoring before new ones are turned away with a 503
+MAX_PENDING = int(os.environ.get('ZOMATHON_SCORING_QUEUE', 1000))
+# Recommendation misses arriving within this window are scored together; 0 sends each on its own
+BATCH_WINDOW_MS = float(os.environ.get('ZOMATHON_BATCH_WINDOW_MS', 1))
+MAX_BATCH = int(os.environ.get('ZOMATHON_MAX_BATCH', 64))
+
+class ScoringBusy(Exception):
+    pass
+
+class ScoringExecutor:
+    """Runs CPU-bound request work on a thread pool instead of the event loop.
+
+    Identical requests in flight at the same time share one computation (keyed
+    by model version and arguments). Recommendation misses are collected for
+    BATCH_WINDOW_MS, or until MAX_BATCH of them, and scored in one call per
+    model version and top_n, so anchors from the same restaurant share a
+    matrix multiply. Cache and precomputed hits are answered inline. When
+    MAX_PENDING distinct jobs are waiting, new ones raise ScoringBusy. All
+    bookkeeping happens on the event loop thread. With a SlowRequestProfiler,
+    a job's pool thread is sampled under the profiles of the requests that
+    started it.
+    """
+
+    def __init__(self, threads=SCORING_THREADS, max_pending=MAX_PENDING, batch_window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH,
+                 profiler=None):
+        self.threads = threads
+        self.profiler = profiler
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='scoring') if threads > 0 else None
+        self.max_pending = max_pending
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.inflight = {}
+        self.batch = []
+        self.flush_handle = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched = 0
+
+    async def run(self, key, fn):
+        # fn() on the pool; requests with the same key while it runs get the same result. key=None never shares.
+        if self.pool is None:
+            return fn()
+        loop = asyncio.get_running_loop()
+        return await self.join(object() if key is None else key, lambda: loop.run_in_executor(self.pool, self.profiled(fn)))
+
+    def profiled(self, fn, tokens=None):
+        return fn if self.profiler is None else self.profiler.bind(fn, tokens)
+
+    def request_token(self):
+        return None if self.profiler is None else self.profiler.request_token()
+
+    async def recommend(self, state, item_id, top_n=6, user_id=None):
+        # Same result as state.get_meal_completion_rows(item_id, top_n, user_id)
+        if self.pool is None:
+            return state.get_meal_completion_rows(item_id, top_n, user_id)
+        if state.user_vector(user_id) is not None:
+            # Personalized lists are per user: shared only between identical requests, never batched
+            return await self.run(('recommend', state.version, int(item_id), top_n, user_id),
+                                  lambda: state.get_meal_completion_rows(item_id, top_n, user_id))
+        row, rows = state.find_cached_rows(item_id, top_n)
+        if rows is not None:
+            return rows
+        return await self.join(('recommend', state.version, row, top_n), lambda: self.enqueue(state, row, top_n))
+
+    async def join(self, key, start):
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if len(self.inflight) >= self.max_pending:
+                self.rejected += 1
+                raise ScoringBusy()
+            self.submitted += 1
+            future = start()
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # A cancelled request must not cancel the job the others are waiting on
+        return await asyncio.shield(future)
+
+    def enqueue(self, state, row, top_n):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.batch.append((state, row, top_n, future, self.request_token()))
+        if len(self.batch) >= self.max_batch or self.batch_window <= 0:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_window, self.flush)
+        return future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.batch = self.batch, []
+        groups = {}
+        for state, row, top_n, future, token in batch:
+            groups.setdefault((state, top_n), []).append((row, future, token))
+
+        loop = asyncio.get_running_loop()
+        for (state, top_n), requests in groups.items():
+            self.batches += 1
+            self.batched += len(requests)
+            rows = np.array([row for row, _, _ in requests], dtype=np.int64)
+            score = self.profiled(state.compute_meal_completion_batch, [token for _, _, token in requests])
+            job = loop.run_in_executor(self.pool, score, rows, top_n)
+            job.add_done_callback(lambda job, requests=requests: self.deliver(job, requests))
+
+    def deliver(self, job, requests):
+        for row, future, _ in requests:
+            if future.done():
+                continue
+            if job.cancelled():
+                future.cancel()
+            elif job.exception() is not None:
+                future.set_exception(job.exception())
+            else:
+                future.set_result(job.result()[row])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {'threads': self.threads, 'pending': len(self.inflight), 'submitted': self.submitted, 'coalesced': self.coalesced,
+                'rejected': self.rejected, 'batches': self.batches, 'batched_requests': self.batched}
@@ -0,0 +1,159 @@
+import copy
+import numpy as np
+import pandas as pd
+
+from metrics import stage
+from snapshot import CodedColumn
+
+MATCH_TIME = stage('search.match')
+RANK_TIME = stage('search.rank')
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def union_rows(parts, size):
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    if len(parts) == 1:
+        return parts[0]
+    # Broad queries union many postings: marking a row bitmap beats sorting them together
+    if sum(len(p) for p in parts) > size // 16:
+        hits = np.zeros(size, dtype=bool)
+        for p in parts:
+            hits[p] = True
+        return np.flatnonzero(hits)
+    return np.unique(np.concatenate(parts))
+
+class FieldIndex:
+    """Inverted index over one catalog column.
+
+    The dictionary is the column's distinct lowercased values. Each value has a
+    sorted posting list of catalog rows, and trigram postings over the
+    dictionary find every value containing a substring without scanning the
+    column.
+    """
+
+    def __init__(self, values):
+        if isinstance(values, CodedColumn):
+            # Lowercase the column's dictionary, not every row
+            vocab_codes, vocab = pd.factorize(pd.Series(values.vocab).str.lower())
+            codes = vocab_codes[values.codes]
+        else:
+            codes, vocab = pd.factorize(pd.Series(values).fillna('').astype(str).str.lower())
+        self.vocab = [str(v) for v in vocab]
+
+        # CSR postings: rows of term t are rows[offsets[t]:offsets[t + 1]], already sorted
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=len(self.vocab))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.rows = order
+
+        grams = {}
+        for term_id, term in enumerate(self.vocab):
+            for gram in trigrams(term):
+                grams.setdefault(gram, []).append(term_id)
+        self.gram_terms = {gram: np.array(ids, dtype=np.int64) for gram, ids in grams.items()}
+
+        # Whole-word tokens per term, used for relevance ranking
+        self.term_tokens = [set(term.replace('(', ' ').replace(')', ' ').split()) for term in self.vocab]
+        self.term_codes = codes
+
+    def extended(self, values):
+        # A copy indexing `values` as rows appended after the existing ones. Existing terms keep their ids,
+        # new terms are added at the end, and each new row is inserted at the end of its term's postings.
+        values = pd.Series(values).fillna('').astype(str).str.lower().tolist()
+        index = copy.copy(self)
+        index.vocab = list(self.vocab)
+        index.term_tokens = list(self.term_tokens)
+        index.gram_terms = dict(self.gram_terms)
+        term_ids = {term: term_id for term_id, term in enumerate(self.vocab)}
+
+        codes = np.empty(len(values), dtype=np.int64)
+        for i, value in enumerate(values):
+            if value not in term_ids:
+                term_ids[value] = len(index.vocab)
+                index.vocab.append(value)
+                index.term_tokens.append(set(value.replace('(', ' ').replace(')', ' ').split()))
+                for gram in trigrams(value):
+                    index.gram_terms[gram] = np.append(index.gram_terms.get(gram, np.zeros(0, dtype=np.int64)), term_ids[value])
+            codes[i] = term_ids[value]
+
+        rows = len(self.term_codes) + np.arange(len(values))
+        insert_at = np.where(codes < len(self.vocab), self.offsets[np.minimum(codes, len(self.vocab) - 1) + 1], self.offsets[-1])
+        order = np.lexsort((rows, codes, insert_at))
+        index.rows = np.insert(self.rows, insert_at[order], rows[order])
+        counts = np.diff(self.offsets)
+        counts = np.concatenate([counts, np.zeros(len(index.vocab) - len(counts), dtype=counts.dtype)]) + np.bincount(codes, minlength=len(index.vocab))
+        index.offsets = np.concatenate([[0], np.cumsum(counts)])
+        index.term_codes = np.concatenate([self.term_codes, codes])
+        return index
+
+    def matching_terms(self, text):
+        if len(text) < 3:
+            candidates = range(len(self.vocab))
+        else:
+            postings = [self.gram_terms.get(gram) for gram in trigrams(text)]
+            if any(p is None for p in postings):
+                return []
+            candidates = postings[0]
+            for p in postings[1:]:
+                candidates = np.intersect1d(candidates, p, assume_unique=True)
+            candidates = candidates.tolist()
+        # Trigrams only narrow the dictionary down; the substring check is exact
+        return [t for t in candidates if text in self.vocab[t]]
+
+    def term_rows(self, term_ids):
+        if len(term_ids) > 64:
+            hit_terms = np.zeros(len(self.vocab), dtype=bool)
+            hit_terms[term_ids] = True
+            return np.flatnonzero(hit_terms[self.term_codes])
+        return union_rows([self.rows[self.offsets[t]:self.offsets[t + 1]] for t in term_ids], len(self.term_codes))
+
+    def match(self, text):
+        return self.term_rows(self.matching_terms(text))
+
+    def score(self, rows, text):
+        # Exact value > whole word > prefix > substring, scored once per dictionary term
+        term_scores = np.zeros(len(self.vocab))
+        for term_id in self.matching_terms(text):
+            term = self.vocab[term_id]
+            if term == text:
+                term_scores[term_id] = 4
+            elif text in self.term_tokens[term_id]:
+                term_scores[term_id] = 3
+            elif term.startswith(text):
+                term_scores[term_id] = 2
+            else:
+                term_scores[term_id] = 1
+        return term_scores[self.term_codes[rows]]
+
+class SearchIndex:
+    def __init__(self, columns, fields):
+        self.size = len(next(iter(columns.values())))
+        self.fields = {field: FieldIndex(columns[field]) for field in fields}
+
+    def extended(self, columns):
+        # Rows appended to the catalog: `columns` maps each indexed field to the new rows' values
+        index = copy.copy(self)
+        index.fields = {field: field_index.extended(columns[field]) for field, field_index in self.fields.items()}
+        index.size = self.size + len(next(iter(columns.values())))
+        return index
+
+    def match(self, texts, fields):
+        # Case-insensitive substring match of any text in any of the fields, as sorted row ids
+        texts = [t.lower().strip() for t in texts]
+        if any(t == '' for t in texts):
+            return np.arange(self.size)
+        with MATCH_TIME.time():
+            return union_rows([self.fields[field].match(text) for text in texts for field in fields], self.size)
+
+    def rank(self, rows, texts, weights):
+        # Stable sort, so equally relevant rows keep catalog order
+        texts = [t.lower().strip() for t in texts]
+        with RANK_TIME.time():
+            scores = np.zeros(len(rows))
+            for field, weight in weights.items():
+                field_scores = np.max([self.fields[field].score(rows, text) for text in texts], axis=0)
+                scores += weight * field_scores
+            return rows[np.argsort(-scores, kind='stable')]
@@ -0,0 +1,162 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+import orjson
+from fastapi import Response
+
+from metrics import stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed; the CPU is not worth it
+COMPRESS_MIN_BYTES = 1024
+ENCODING_SUFFIXES = ('-br"', '-gzip"')
+# Compressed bodies kept per snapshot; free-text area queries would otherwise add one per distinct query
+COMPRESSED_CACHE_SIZE = int(os.environ.get('ZOMATHON_COMPRESSED_CACHE_SIZE', 10000))
+
+SERIALIZE_TIME = stage('serialize')
+COMPRESS_TIME = stage('compress')
+
+def encode_json(content):
+    # Compact UTF-8 output, byte-for-byte what FastAPI's default JSONResponse produces for these payloads
+    return orjson.dumps(content)
+
+def join_fragments(fragments):
+    return b'[' + b','.join(fragments) + b']'
+
+class FragmentCache:
+    """Pre-encoded JSON objects for catalog items, keyed by item_id.
+
+    An item is serialised the first time it appears in a response. Every
+    later response containing it only joins cached bytes. `fields` restricts
+    the object to a subset of the record, for the recommendation shape.
+    """
+
+    def __init__(self, get_records, item_ids, fields=None):
+        self.get_records = get_records
+        self.item_ids = item_ids
+        self.fields = fields
+        self.fragments = {}
+
+    def encode_rows(self, rows):
+        with SERIALIZE_TIME.time():
+            return self.join_rows(rows)
+
+    def join_rows(self, rows):
+        ids = self.item_ids[rows].tolist()
+        missing = [i for i, item_id in enumerate(ids) if item_id not in self.fragments]
+        if missing:
+            for i, record in zip(missing, self.get_records(rows[missing])):
+                if self.fields:
+                    record = {field: record.get(field) for field in self.fields}
+                self.fragments[ids[i]] = orjson.dumps(record)
+        return join_fragments([self.fragments[item_id] for item_id in ids])
+
+    def fragment(self, rows):
+        # For embedding a list of items inside a larger orjson document
+        return orjson.Fragment(self.encode_rows(rows))
+
+def base_etag(etag):
+    for suffix in ENCODING_SUFFIXES:
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def etag_matches(request, etag):
+    candidates = [base_etag(tag.strip()) for tag in request.headers.get("if-none-match", "").split(",")]
+    return etag in candidates or "*" in candidates
+
+def accepted_encodings(header):
+    # {coding: q} from an Accept-Encoding header; a q that does not parse counts as 0
+    weights = {}
+    for part in header.lower().split(","):
+        coding, *params = [piece.strip() for piece in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+def pick_encoding(request, size):
+    # The accepted coding with the highest q, brotli first on ties; never one the client sent with q=0
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    weights = accepted_encodings(request.headers.get("accept-encoding", ""))
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding, best = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best:
+            encoding, best = coding, q
+    return encoding
+
+class CompressedBodies:
+    """Bounded LRU of compressed response bodies by (ETag, encoding).
+
+    Each CatalogIndex owns one, so the bodies of a replaced snapshot are
+    freed along with it instead of piling up across reloads.
+    """
+
+    def __init__(self, max_entries=COMPRESSED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+def compress(body, encoding, etag=None, cache=None):
+    # Bodies with an ETag never change for a snapshot, so compress them once
+    key = (etag, encoding)
+    if etag and cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    with COMPRESS_TIME.time():
+        data = brotli.compress(body, quality=5) if encoding == "br" else gzip.compress(body, compresslevel=5)
+    if etag and cache is not None:
+        cache.put(key, data)
+    return data
+
+def json_response(request, body, etag=None, cache=None):
+    # Sent on every response, compressed or not, so shared caches key on the client's Accept-Encoding
+    headers = {"Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    encoding = pick_encoding(request, len(body))
+    if encoding:
+        body = compress(body, encoding, etag, cache)
+        headers["Content-Encoding"] = encoding
+        if etag:
+            headers["ETag"] = etag[:-1] + f'-{encoding}"'
+    return Response(content=body, media_type="application/json", headers=headers)
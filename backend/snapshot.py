@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from ann_index import IVFIndex, build_ivf_arrays
+from cooccurrence import CooccurrenceTable, cooccurrence_sources, write_cooccurrence
+from embedding_store import EmbeddingStore, l2_normalize, write_embedding_store
+from graph_scores import build_graph_score_tables, item_concept_csr, synergy_matrix
+from user_store import UserStore, user_sources, write_user_store
+
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_DIR = os.environ.get('ZOMATHON_SNAPSHOT_DIR', 'snapshots')
+# float16 halves the mapped embedding pages at a small precision cost
+EMBEDDING_DTYPE = os.environ.get('ZOMATHON_EMBEDDING_DTYPE', 'float32')
+
+# Embedding stores, mapped to whether their rows are stored L2-normalised
+EMBEDDING_STORES = {'embeddings': False, 'candidate_vectors': True, 'ann_vectors': True}
+
+# Row attributes the ANN index can filter on inside its scan
+ANN_ATTRIBUTES = ['slot', 'cuisine', 'area', 'is_veg']
+
+# Arrays written next to the manifest, one .npy file each
+SNAPSHOT_ARRAYS = [
+    'category_codes', 'cuisine_codes', 'name_codes', 'area_codes',
+    'sorted_item_ids', 'item_id_order',
+    'restaurant_ids', 'restaurant_offsets', 'restaurant_rows', 'restaurant_slots', 'restaurant_positions',
+    'candidate_item_ids', 'candidate_categories', 'candidate_cuisines',
+    'candidate_names', 'candidate_is_hot_drink',
+    'graph_scores', 'graph_offsets',
+    'ann_centroids', 'ann_offsets', 'ann_rows',
+] + [f"ann_attr_{name}" for name in ANN_ATTRIBUTES]
+
+def clean_item_name(name):
+    return str(name).split('(')[0].strip().lower()
+
+def locality_area(locality):
+    parts = str(locality).split(',')
+    return parts[1].strip() if len(parts) > 1 else parts[0].strip()
+
+def read_catalog(path):
+    # items.parquet from generate_catalog.py, or a legacy items.csv
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+        # Categorical columns back to plain values, so the snapshot arrays are the same as from the CSV
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(df[col].cat.categories.dtype)
+    else:
+        df = pd.read_csv(path)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    return df
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_fingerprint(items_path, npy_path):
+    digest = hashlib.sha256(f"format={SNAPSHOT_FORMAT};dtype={EMBEDDING_DTYPE}".encode())
+    digest.update(file_sha256(items_path).encode())
+    digest.update(file_sha256(npy_path).encode())
+    # The user tower is trained with the item matrix, so it is part of the same version when exported
+    for path in user_sources(npy_path):
+        digest.update(file_sha256(path).encode())
+    # So is the co-occurrence graph mined from the same interactions
+    for path in cooccurrence_sources(npy_path):
+        digest.update(file_sha256(path).encode())
+    return digest.hexdigest()
+
+def build_snapshot_arrays(df, embeddings):
+    arrays = {'embeddings': np.ascontiguousarray(embeddings, dtype=np.float32)}
+
+    category_codes, category_vocab = pd.factorize(df['category'])
+    cuisine_codes, cuisine_vocab = pd.factorize(df['cuisine_type'])
+    clean_names = df['name'].map(clean_item_name)
+    name_codes, _ = pd.factorize(clean_names)
+    is_hot_name = clean_names.str.contains('tea|coffee|hot', regex=True).to_numpy()
+    drink = np.flatnonzero(category_vocab == 'Drink')
+    is_hot_drink = is_hot_name & np.isin(category_codes, drink)
+
+    arrays['category_codes'] = category_codes.astype(np.int32)
+    arrays['cuisine_codes'] = cuisine_codes.astype(np.int32)
+    arrays['name_codes'] = name_codes.astype(np.int32)
+    area_codes, area_vocab = pd.factorize(df['locality'].map(locality_area, na_action='ignore'))
+    arrays['area_codes'] = area_codes.astype(np.int32)
+
+    item_ids = df['item_id'].astype(np.int64).to_numpy()
+    arrays['item_id_order'] = np.argsort(item_ids, kind='stable')
+    arrays['sorted_item_ids'] = item_ids[arrays['item_id_order']]
+
+    # Rows grouped by restaurant so every restaurant is one contiguous slice of the candidate arrays
+    groups = df.groupby('restaurant_id', sort=True).indices
+    restaurant_ids = np.array(list(groups.keys()), dtype=np.int64)
+    restaurant_rows = np.concatenate(list(groups.values())) if groups else np.zeros(0, dtype=np.int64)
+    sizes = np.array([len(rows) for rows in groups.values()], dtype=np.int64)
+    restaurant_offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    restaurant_slots = np.zeros(len(df), dtype=np.int64)
+    restaurant_slots[restaurant_rows] = np.repeat(np.arange(len(restaurant_ids)), sizes)
+    restaurant_positions = np.zeros(len(df), dtype=np.int64)
+    restaurant_positions[restaurant_rows] = np.arange(len(restaurant_rows))
+
+    arrays.update({
+        'restaurant_ids': restaurant_ids,
+        'restaurant_offsets': restaurant_offsets,
+        'restaurant_rows': restaurant_rows,
+        'restaurant_slots': restaurant_slots,
+        'restaurant_positions': restaurant_positions,
+        'candidate_item_ids': item_ids[restaurant_rows],
+        'candidate_vectors': arrays['embeddings'][restaurant_rows],
+        'candidate_categories': arrays['category_codes'][restaurant_rows],
+        'candidate_cuisines': arrays['cuisine_codes'][restaurant_rows],
+        'candidate_names': arrays['name_codes'][restaurant_rows],
+        'candidate_is_hot_drink': is_hot_drink[restaurant_rows],
+    })
+
+    # Flattened k x k personalized PageRank tables, one per restaurant, from the shared category synergy
+    # matrix and each item's category and cuisine edges
+    synergy, n_category_nodes = synergy_matrix(category_vocab, len(cuisine_vocab))
+    indptr, indices = item_concept_csr(arrays['candidate_categories'], arrays['candidate_cuisines'], n_category_nodes, len(cuisine_vocab))
+    arrays['graph_scores'], arrays['graph_offsets'] = build_graph_score_tables(restaurant_offsets, indptr, indices, synergy)
+
+    ann = build_ivf_arrays(l2_normalize(arrays['embeddings']), {
+        'slot': restaurant_slots,
+        'cuisine': arrays['cuisine_codes'],
+        'area': arrays['area_codes'],
+        'is_veg': df['is_veg'].fillna(0).astype(np.int8).to_numpy(),
+    })
+    arrays.update({f"ann_{name}": values for name, values in ann.items()})
+
+    vocab = {
+        'category_vocab': [str(c) for c in category_vocab],
+        'cuisine_vocab': [str(c) for c in cuisine_vocab],
+        'area_vocab': [str(c) for c in area_vocab],
+    }
+    return arrays, vocab
+
+class CodedColumn:
+    """Dictionary-encoded catalog column: a small integer code per row plus the distinct values.
+
+    Indexing returns values like the plain column arrays do, and every row
+    with the same value shares one Python string object.
+    """
+
+    def __init__(self, codes, vocab):
+        self.codes = codes
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        return self.vocab[self.codes[rows]]
+
+    def to_categorical(self):
+        return pd.Categorical.from_codes(self.codes, self.vocab)
+
+def code_dtype(size):
+    return np.int8 if size <= 127 else np.int16 if size <= 32767 else np.int32
+
+def write_catalog_columns(df, catalog_dir):
+    os.makedirs(catalog_dir)
+    coded = []
+    for col in df.columns:
+        values = df[col]
+        path = os.path.join(catalog_dir, col)
+        if values.dtype == object or pd.api.types.is_string_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            strings = values.astype(object).fillna('').astype(str)
+            codes, vocab = pd.factorize(strings)
+            # Names, categories, cuisines and localities repeat a small vocabulary; unique text stays plain
+            if len(vocab) <= len(values) // 2:
+                np.save(f"{path}.codes.npy", codes.astype(code_dtype(len(vocab))))
+                np.save(f"{path}.vocab.npy", np.asarray(vocab, dtype=str))
+                coded.append(col)
+                continue
+            column = strings.to_numpy(dtype=str)
+        elif pd.api.types.is_integer_dtype(values):
+            # Smallest integer type that holds the values: ids fit int32, is_veg int8
+            column = pd.to_numeric(values, downcast='integer').to_numpy()
+        else:
+            column = values.to_numpy()
+        np.save(f"{path}.npy", column)
+    return coded
+
+def build_snapshot(items_path, npy_path, snapshot_dir=SNAPSHOT_DIR, fingerprint=None):
+    start = time.perf_counter()
+    fingerprint = fingerprint or source_fingerprint(items_path, npy_path)
+    target = os.path.join(snapshot_dir, fingerprint[:16])
+
+    df = read_catalog(items_path)
+    embeddings = np.load(npy_path)
+    arrays, vocab = build_snapshot_arrays(df, embeddings)
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.building-', dir=snapshot_dir)
+    try:
+        coded_columns = write_catalog_columns(df, os.path.join(staging, 'catalog'))
+        for name in SNAPSHOT_ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), arrays[name])
+        for name, normalize in EMBEDDING_STORES.items():
+            write_embedding_store(os.path.join(staging, f"{name}.npy"), arrays[name], EMBEDDING_DTYPE, normalize)
+        users = user_sources(npy_path)
+        num_users = write_user_store(staging, *users, EMBEDDING_DTYPE) if users else 0
+        cooccurrence = cooccurrence_sources(npy_path)
+        num_edges = write_cooccurrence(staging, *cooccurrence, df['item_id'].to_numpy(), arrays['restaurant_slots']) if cooccurrence else 0
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'version': fingerprint,
+            'sources': {'items': os.path.abspath(items_path), 'embeddings': os.path.abspath(npy_path)},
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'build_seconds': round(time.perf_counter() - start, 3),
+            'num_items': len(df),
+            'num_restaurants': len(arrays['restaurant_ids']),
+            'num_users': num_users,
+            'num_cooccurrence_edges': num_edges,
+            'embedding_dtype': EMBEDDING_DTYPE,
+            'columns': list(df.columns),
+            'coded_columns': coded_columns,
+            **vocab,
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # Another worker may have published the same version while we were building
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.exists(os.path.join(target, 'manifest.json')):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return target
+
+def load_mapped(path):
+    # Plain ndarray view of the mapping: slicing np.memmap objects adds overhead on every request
+    return np.load(path, mmap_mode='r').view(np.ndarray)
+
+def load_catalog_column(path, coded):
+    if coded:
+        return CodedColumn(load_mapped(f"{path}.codes.npy"), np.load(f"{path}.vocab.npy").astype(object))
+    return load_mapped(f"{path}.npy")
+
+def load_snapshot(path):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    snapshot = {name: load_mapped(os.path.join(path, f"{name}.npy")) for name in SNAPSHOT_ARRAYS}
+    for name, normalized in EMBEDDING_STORES.items():
+        snapshot[name] = EmbeddingStore(os.path.join(path, f"{name}.npy"), normalized=normalized)
+    snapshot['ann_index'] = IVFIndex(
+        snapshot['ann_centroids'], snapshot['ann_offsets'], snapshot['ann_rows'], snapshot['ann_vectors'],
+        {name: snapshot[f"ann_attr_{name}"] for name in ANN_ATTRIBUTES},
+    )
+    snapshot['user_store'] = UserStore.load(path) if manifest.get('num_users') else None
+    snapshot['cooccurrence'] = CooccurrenceTable.load(path) if manifest.get('num_cooccurrence_edges') else None
+    snapshot['catalog'] = {col: load_catalog_column(os.path.join(path, 'catalog', col), col in manifest['coded_columns'])
+                           for col in manifest['columns']}
+    snapshot['manifest'] = manifest
+    snapshot['path'] = path
+    return snapshot
+
+def open_snapshot(items_path, npy_path, snapshot_dir=SNAPSHOT_DIR):
+    # The snapshot directory is keyed by a hash of both source files, so a changed
+    # catalog or embedding matrix never matches a stale build
+    fingerprint = source_fingerprint(items_path, npy_path)
+    path = os.path.join(snapshot_dir, fingerprint[:16])
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        print(f"No snapshot for version {fingerprint[:16]}, building one...")
+        path = build_snapshot(items_path, npy_path, snapshot_dir, fingerprint)
+    return load_snapshot(path)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the serving snapshot for a catalog and embedding matrix")
+    parser.add_argument('--items', default='items.parquet' if os.path.exists('items.parquet') else 'items.csv')
+    parser.add_argument('--embeddings', default='final_backend_embeddings.npy')
+    parser.add_argument('--out', default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    path = build_snapshot(args.items, args.embeddings, args.out)
+    print(f"Snapshot written to {path}")
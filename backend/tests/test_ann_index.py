@@ -0,0 +1,28 @@
+import numpy as np
+
+from ann_index import IVFIndex, build_ivf_arrays
+from embedding_store import l2_normalize
+
+def make_index(num_vectors=2000, n_lists=20):
+    rng = np.random.default_rng(0)
+    vectors = l2_normalize(rng.normal(size=(num_vectors, 16))).astype(np.float32)
+    areas = rng.integers(0, 5, num_vectors)
+    arrays = build_ivf_arrays(vectors, {'area': areas}, n_lists=n_lists)
+    index = IVFIndex(arrays['centroids'], arrays['offsets'], arrays['rows'], arrays['vectors'], {'area': arrays['attr_area']})
+    return index, vectors, areas
+
+def test_filter_matching_nothing_scans_no_list():
+    index, vectors, _ = make_index()
+    scanned = []
+    filter_mask = index.filter_mask
+    index.filter_mask = lambda positions, *args: scanned.append(len(positions)) or filter_mask(positions, *args)
+    rows, scores = index.search(vectors[0], k=10, filters={'area': -2})
+    assert len(rows) == 0 and len(scores) == 0
+    assert scanned == []
+
+def test_filtered_search_only_returns_matching_rows():
+    index, vectors, areas = make_index()
+    rows, scores = index.search(vectors[0], k=10, n_probe=2, filters={'area': [1, 3]})
+    assert len(rows) == 10
+    assert set(areas[rows].tolist()) <= {1, 3}
+    assert np.allclose(scores, vectors[rows] @ vectors[0])
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from graph_scores import build_graph_score_tables, build_restaurant_graph, item_concept_csr, synergy_matrix
+
+nx = pytest.importorskip('networkx')
+
+# Two restaurants with the same menu size (solved in one batch) and one with a different size,
+# including a category no synergy names and a missing cuisine
+MENUS = pd.DataFrame({
+    'item_id': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+    'restaurant_id': [10, 10, 10, 20, 20, 20, 30, 30, 30, 30],
+    'category': ['Wet Curry', 'Bread', 'Drink', 'Fast Food Main', 'Side', 'Drink', 'Dry Main', 'Side', 'Dessert', 'Soup'],
+    'cuisine_type': ['North Indian', 'North Indian', 'Beverages', 'Fast Food', 'Fast Food', None, 'Chinese', 'Chinese', 'Desserts', 'Chinese'],
+})
+
+def test_tables_match_networkx_pagerank():
+    df = MENUS.sort_values('restaurant_id', kind='stable').reset_index(drop=True)
+    category_codes, category_vocab = pd.factorize(df['category'])
+    cuisine_codes, cuisine_vocab = pd.factorize(df['cuisine_type'])
+    synergy, n_category_nodes = synergy_matrix(category_vocab, len(cuisine_vocab))
+    indptr, indices = item_concept_csr(category_codes, cuisine_codes, n_category_nodes, len(cuisine_vocab))
+    offsets = np.concatenate([[0], np.cumsum(df.groupby('restaurant_id', sort=True).size().to_numpy())])
+    scores, graph_offsets = build_graph_score_tables(offsets, indptr, indices, synergy)
+
+    for slot in range(len(offsets) - 1):
+        menu = df.iloc[offsets[slot]:offsets[slot + 1]]
+        size = len(menu)
+        table = scores[graph_offsets[slot]:graph_offsets[slot + 1]].reshape(size, size)
+        G = build_restaurant_graph(menu)
+        for local, item_id in enumerate(menu['item_id'].tolist()):
+            expected = nx.pagerank(G, personalization={item_id: 1.0}, weight='weight', alpha=0.85, tol=1e-12)
+            np.testing.assert_allclose(table[local], [expected[i] for i in menu['item_id']], atol=1e-6)
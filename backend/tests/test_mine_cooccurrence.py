@@ -0,0 +1,21 @@
+import numpy as np
+
+from training_pipeline.mine_cooccurrence import PairCounts
+
+def test_prune_keeps_half_the_budget_on_tied_counts():
+    pairs = PairCounts(max_pairs=10)
+    # 30 pairs seen once and 2 seen twice: the cutoff falls inside the tied count-1 pairs
+    pairs.add(np.r_[np.arange(30), 100, 100, 101, 101])
+    pairs.merge()
+    assert len(pairs.keys) == 5
+    assert pairs.dropped == 27
+    assert {100, 101} <= set(pairs.keys.tolist())
+    assert (np.diff(pairs.keys) > 0).all()
+
+def test_merge_sums_counts_across_chunks():
+    pairs = PairCounts(max_pairs=100)
+    pairs.add(np.array([3, 1, 3]))
+    pairs.add(np.array([1, 2]))
+    pairs.merge()
+    assert pairs.keys.tolist() == [1, 2, 3]
+    assert pairs.counts.tolist() == [2, 1, 2]
@@ -0,0 +1,36 @@
+import gzip
+from types import SimpleNamespace
+
+from serialization import COMPRESS_MIN_BYTES, CompressedBodies, accepted_encodings, brotli, compress, pick_encoding
+
+def test_compressed_bodies_evict_least_recently_used():
+    cache = CompressedBodies(max_entries=2)
+    cache.put(('"a"', 'gzip'), b'a')
+    cache.put(('"b"', 'gzip'), b'b')
+    assert cache.get(('"a"', 'gzip')) == b'a'
+    cache.put(('"c"', 'gzip'), b'c')
+    assert len(cache) == 2
+    assert cache.get(('"b"', 'gzip')) is None
+    assert cache.get(('"a"', 'gzip')) == b'a'
+
+def test_compress_reuses_cached_body_per_etag():
+    cache = CompressedBodies()
+    body = b'{"items": []}' * 200
+    first = compress(body, 'gzip', '"v1"', cache)
+    assert gzip.decompress(first) == body
+    assert compress(b'ignored', 'gzip', '"v1"', cache) is first
+    assert len(cache) == 1
+
+def test_accepted_encodings_read_q_values():
+    assert accepted_encodings('gzip;q=0.5, br , identity; q=0') == {'gzip': 0.5, 'br': 1.0, 'identity': 0.0}
+    assert accepted_encodings('gzip;q=oops') == {'gzip': 0.0}
+
+def test_pick_encoding_never_picks_q_zero():
+    def pick(header):
+        return pick_encoding(SimpleNamespace(headers={'accept-encoding': header}), COMPRESS_MIN_BYTES)
+    assert pick('gzip;q=0') is None
+    assert pick('*;q=0.5, gzip;q=0, br;q=0') is None
+    assert pick('br;q=0, gzip') == 'gzip'
+    assert pick('*') == ('br' if brotli is not None else 'gzip')
+    assert pick('gzip') == 'gzip'
+    assert pick('') is None
@@ -0,0 +1,75 @@
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+class BPRBatches(IterableDataset):
+    """Whole BPR training batches sliced from tensors, instead of one tiny tensor per sample.
+
+    Every epoch permutes the positive (user, item) pairs once. Each batch is a
+    slice of that permutation, and the negatives for the whole batch are drawn
+    in one call, as a (batch, num_negatives) tensor. A hard_negative_ratio
+    share of them comes from the positive item's own restaurant (dishes the
+    user saw on the same menu but did not pick); the rest are uniform over
+    the catalog.
+
+    Use with DataLoader(batches, batch_size=None, num_workers=N): the workers
+    take turns over the batches of one shared permutation.
+    """
+
+    def __init__(self, users, items, num_items, batch_size=2048, num_negatives=1,
+                 item_restaurants=None, hard_negative_ratio=0.0, seed=0):
+        self.users = torch.as_tensor(np.asarray(users), dtype=torch.long)
+        self.items = torch.as_tensor(np.asarray(items), dtype=torch.long)
+        self.num_items = num_items
+        self.batch_size = batch_size
+        self.num_negatives = num_negatives
+        self.num_hard = int(round(num_negatives * hard_negative_ratio)) if item_restaurants is not None else 0
+        self.seed = seed
+        self.epoch = 0
+
+        if item_restaurants is not None:
+            # Items grouped by restaurant: item i's menu is restaurant_items[item_start[i]:item_start[i] + item_menu_size[i]],
+            # and item_local[i] is its own position in that slice
+            _, codes = np.unique(np.asarray(item_restaurants), return_inverse=True)
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes)
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            local = np.empty(len(codes), dtype=np.int64)
+            local[order] = np.arange(len(codes)) - offsets[codes[order]]
+            self.restaurant_items = torch.as_tensor(order, dtype=torch.long)
+            self.item_start = torch.as_tensor(offsets[codes], dtype=torch.long)
+            self.item_menu_size = torch.as_tensor(counts[codes], dtype=torch.long)
+            self.item_local = torch.as_tensor(local, dtype=torch.long)
+
+    def __len__(self):
+        return (len(self.items) + self.batch_size - 1) // self.batch_size
+
+    def set_epoch(self, epoch):
+        # Call before iterating: every epoch (and every worker within it) gets its own draws
+        self.epoch = epoch
+
+    def sample_negatives(self, pos_items, generator):
+        negatives = torch.randint(self.num_items, (len(pos_items), self.num_negatives), generator=generator)
+        if self.num_hard == 0:
+            return negatives
+
+        start = self.item_start[pos_items][:, None]
+        size = self.item_menu_size[pos_items][:, None]
+        # Step 1..size-1 places past the positive within its menu, so it is never its own negative
+        step = 1 + (torch.rand(len(pos_items), self.num_hard, generator=generator) * (size - 1)).long()
+        hard = self.restaurant_items[start + (self.item_local[pos_items][:, None] + step) % size]
+        # A restaurant with a single item has nothing else to offer: keep the uniform draw there
+        negatives[:, :self.num_hard] = torch.where(size > 1, hard, negatives[:, :self.num_hard])
+        return negatives
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        # Same permutation in every worker; negatives drawn from a per-worker stream
+        order = torch.randperm(len(self.items), generator=torch.Generator().manual_seed(self.seed * 100003 + self.epoch))
+        generator = torch.Generator().manual_seed(int(np.random.SeedSequence([self.seed, self.epoch, worker]).generate_state(1)[0]))
+
+        for batch in range(worker, len(self), workers):
+            index = order[batch * self.batch_size:(batch + 1) * self.batch_size]
+            pos_items = self.items[index]
+            yield self.users[index], pos_items, self.sample_negatives(pos_items, generator)
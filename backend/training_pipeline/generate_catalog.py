@@ -1,12 +1,9 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import random
-
-print("Loading the curated restaurant dataset...")
-res_df = pd.read_csv("restaurants.csv")
-restaurants = res_df.to_dict('records')
-
-print(f"Loaded {len(restaurants)} real restaurants.")
 
 #Categorizing data for better model understanding 
 base_items = [
@@ -118,10 +115,6 @@ base_items = [
     {"name": "Hot Chocolate", "cuisine": "Beverage", "cat": "Drink", "veg": 1, "base_price": 190}
 ]
 
-print("Distributing Items via Menu Specialization")
-final_menu_rows = []
-item_id_counter = 1
-
 # Culinary Profiles dictate what a restaurant is allowed to sell
 culinary_profiles = [
     ["Fast Food", "Beverage", "Dessert"], # Fast food restaurants can only sell fast food items
@@ -131,38 +124,142 @@ culinary_profiles = [
     ["Fast Food", "Chinese", "Beverage"] # fast food and chinese restaurants can sell fast food and chinese items
 ]
 
-for res in restaurants:
-    profile = random.choice(culinary_profiles)
-    
-    for item in base_items:
-        if item["cuisine"] in profile:
-            if random.random() < 0.80:
-                # Add 5% to 15% random price fluctuation per restaurant
-                price_variance = random.uniform(0.95, 1.15)
-                final_price = int(item["base_price"] * price_variance)
-                
-                # Format the ML description string perfectly
-                diet = "Vegetarian" if item["veg"] == 1 else "Non-Vegetarian"
-                desc = f"{item['name']}. A {diet} {item['cuisine']} {item['cat']}."
-                
-                final_menu_rows.append({
-                    "item_id": item_id_counter,
-                    "restaurant_id": res["restaurant_id"],
-                    "restaurant_name": res["restaurant_name"],
-                    "city": res["city"],
-                    "locality": res["locality"],
-                    "cuisine_type": item["cuisine"],
-                    "name": item["name"],
-                    "description": desc,
-                    "price": final_price,
-                    "category": item["cat"],
-                    "is_veg": item["veg"]
-                })
-                item_id_counter += 1
-
-final_df = pd.DataFrame(final_menu_rows)
-
-print("3. Exporting the Master Catalog...")
-final_df.to_csv("items.csv", index=False)
-print(f"SUCCESS. Generated {len(final_df)} highly structured menu items across {len(restaurants)} restaurants.")
-print("Saved as 'items.csv'")
\ No newline at end of file
+CUISINES = [item["cuisine"] for item in base_items]
+CATEGORIES = [item["cat"] for item in base_items]
+NAMES = np.array([item["name"] for item in base_items], dtype=object)
+IS_VEG = np.array([item["veg"] for item in base_items], dtype=np.int8)
+BASE_PRICES = np.array([item["base_price"] for item in base_items], dtype=np.float64)
+# Format the ML description string perfectly, once per base item
+DESCRIPTIONS = np.array([
+    f"{item['name']}. A {'Vegetarian' if item['veg'] == 1 else 'Non-Vegetarian'} {item['cuisine']} {item['cat']}."
+    for item in base_items
+], dtype=object)
+# PROFILE_MASKS[p, i]: a restaurant with profile p may sell base item i
+PROFILE_MASKS = np.array([[item["cuisine"] in profile for item in base_items] for profile in culinary_profiles])
+CUISINE_TYPE = pd.CategoricalDtype(list(dict.fromkeys(CUISINES)))
+CATEGORY_TYPE = pd.CategoricalDtype(list(dict.fromkeys(CATEGORIES)))
+CUISINE_CODES = np.array([CUISINE_TYPE.categories.get_loc(c) for c in CUISINES], dtype=np.int8)
+CATEGORY_CODES = np.array([CATEGORY_TYPE.categories.get_loc(c) for c in CATEGORIES], dtype=np.int8)
+
+CITY = "Bhubaneswar"
+AREAS = [
+    "Patia", "Saheed Nagar", "Jaydev Vihar", "Khandagiri", "Nayapalli", "Chandrasekharpur", "Old Town",
+    "Rasulgarh", "Baramunda", "Kalinga Nagar", "Unit 4", "Sailashree Vihar", "Bapuji Nagar", "Infocity",
+]
+
+# Restaurants per shard: one shard is generated (and written) at a time by each process
+SHARD_RESTAURANTS = 20000
+
+def menu_mask(rng, count):
+    # A random profile per restaurant, then each item the profile allows is kept with p=0.8
+    profiles = rng.integers(0, len(culinary_profiles), count)
+    keep = PROFILE_MASKS[profiles] & (rng.random((count, len(base_items))) < 0.80)
+    return np.nonzero(keep)
+
+def menu_frame(restaurants, restaurant, item, rng, locality_type):
+    """Menu rows for (restaurant row, base item) pairs, without item ids (assigned when shards are written in order)."""
+    # Add 5% to 15% random price fluctuation per restaurant
+    price = (BASE_PRICES[item] * rng.uniform(0.95, 1.15, len(item))).astype(np.int64)
+    return pd.DataFrame({
+        "restaurant_id": restaurants["restaurant_id"].to_numpy()[restaurant],
+        "restaurant_name": restaurants["restaurant_name"].to_numpy()[restaurant],
+        "city": restaurants["city"].to_numpy()[restaurant],
+        "locality": pd.Categorical(restaurants["locality"].to_numpy()[restaurant], dtype=locality_type),
+        "cuisine_type": pd.Categorical.from_codes(CUISINE_CODES[item], dtype=CUISINE_TYPE),
+        "name": NAMES[item],
+        "description": DESCRIPTIONS[item],
+        "price": price,
+        "category": pd.Categorical.from_codes(CATEGORY_CODES[item], dtype=CATEGORY_TYPE),
+        "is_veg": IS_VEG[item],
+    })
+
+def build_menu(restaurants, rng, locality_type):
+    restaurant, item = menu_mask(rng, len(restaurants))
+    return menu_frame(restaurants, restaurant, item, rng, locality_type)
+
+def synthetic_restaurants(count, first=0):
+    # Stand-ins for restaurants.csv when planning for more restaurants than the curated list has
+    index = first + np.arange(count)
+    ids = 100 + index
+    return pd.DataFrame({
+        "restaurant_id": ids,
+        "restaurant_name": "Restaurant " + pd.Series(ids).astype(str),
+        "city": CITY,
+        "locality": "Lane " + pd.Series(index // len(AREAS) % 50).astype(str) + ", " + np.array(AREAS, dtype=object)[index % len(AREAS)],
+    })
+
+def build_shard(restaurants, seed, locality_type):
+    return build_menu(restaurants, np.random.default_rng(seed), locality_type)
+
+class CatalogWriter:
+    """Appends shards to items.parquet (one row group each) or a CSV, numbering item ids as it goes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.rows = 0
+
+    def write(self, menu):
+        menu.insert(0, "item_id", np.arange(self.rows + 1, self.rows + len(menu) + 1))
+        if self.path.endswith(".csv"):
+            menu.to_csv(self.path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(menu, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        self.rows += len(menu)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def generate_catalog(restaurants, out_path, seed=42, shard_restaurants=SHARD_RESTAURANTS, workers=1):
+    # Same categories in every shard, so every row group shares one dictionary type
+    locality_type = pd.CategoricalDtype(sorted(restaurants["locality"].dropna().astype(str).unique()))
+    starts = range(0, len(restaurants), shard_restaurants)
+    # One seed per shard: the catalog is identical whatever the number of workers
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    shards = [(restaurants.iloc[start:start + shard_restaurants], s, locality_type) for start, s in zip(starts, seeds)]
+
+    writer = CatalogWriter(out_path)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            for shard in shards:
+                pending.append(pool.submit(build_shard, *shard))
+                # Bounded look-ahead keeps at most `workers + 1` shards in memory
+                if len(pending) > workers:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+    else:
+        for shard in shards:
+            writer.write(build_shard(*shard))
+    writer.close()
+    return writer.rows
+
+# The item list, profiles and menu functions above are importable (the benchmark suite builds synthetic catalogs from them)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distribute the base items across restaurants into the master catalog")
+    parser.add_argument("--restaurants", default="restaurants.csv", help="curated restaurant list")
+    parser.add_argument("--synthetic-restaurants", type=int, default=0, metavar="N", help="generate N restaurants instead of reading --restaurants")
+    parser.add_argument("--out", default="items.parquet", help="a .csv path writes CSV instead")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shard-restaurants", type=int, default=SHARD_RESTAURANTS)
+    parser.add_argument("--workers", type=int, default=1, help="processes building shards in parallel")
+    args = parser.parse_args()
+
+    if args.synthetic_restaurants:
+        res_df = synthetic_restaurants(args.synthetic_restaurants)
+    else:
+        print("Loading the curated restaurant dataset...")
+        res_df = pd.read_csv(args.restaurants)
+    print(f"Loaded {len(res_df)} restaurants.")
+
+    print("Distributing Items via Menu Specialization")
+    total = generate_catalog(res_df, args.out, args.seed, args.shard_restaurants, min(args.workers, os.cpu_count() or 1))
+    print(f"SUCCESS. Generated {total} highly structured menu items across {len(res_df)} restaurants.")
+    print(f"Saved as '{args.out}'")
@@ -0,0 +1,176 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# Events that put an item in the session's cart; views say too little about what is bought together
+BASKET_EVENTS = ['add_to_cart', 'order']
+COLUMNS = ['session_id', 'item_id', 'interaction_type']
+
+def read_chunks(path, chunk_rows):
+    # (session_id, item_id, interaction_type) frames of at most chunk_rows rows, from CSV or Parquet
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=COLUMNS):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=COLUMNS, chunksize=chunk_rows)
+
+def basket_pairs(basket, item, num_items):
+    """Co-occurring (a, b) pairs, a < b, as a * num_items + b keys, and the items of each basket.
+
+    `basket` numbers the rows' sessions; an item bought twice in a session
+    counts once. Pairs come from comparing every row with the one d places
+    further on in the (basket, item) order, for d up to the largest basket.
+    """
+    # Sort and drop repeats rather than np.unique, whose hash table is many times slower on these keys
+    keys = np.sort(basket * num_items + item)
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+    basket, item = keys // num_items, keys % num_items
+    pairs = []
+    for d in range(1, len(keys)):
+        same = basket[d:] == basket[:-d]
+        if not same.any():
+            break
+        pairs.append(item[:-d][same] * num_items + item[d:][same])
+    return np.concatenate(pairs) if pairs else np.zeros(0, dtype=np.int64), item, int((np.diff(basket) != 0).sum()) + (len(basket) > 0)
+
+class PairCounts:
+    """Counts per item pair, merged from per-chunk counts.
+
+    Chunk results wait in a list and are merged once they outgrow the merged
+    table (or reach max_pairs), so each pair is re-sorted O(log chunks)
+    times. Past max_pairs distinct pairs the rarest are dropped, and a
+    dropped pair that turns up again counts from zero: memory stays bounded
+    on any log, at the cost of undercounting pairs near the cutoff.
+    """
+
+    def __init__(self, max_pairs):
+        self.max_pairs = max_pairs
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.pending = []
+        self.pending_size = 0
+        self.dropped = 0
+
+    def add(self, keys):
+        keys, counts = np.unique(keys, return_counts=True)
+        self.pending.append((keys, counts))
+        self.pending_size += len(keys)
+        if self.pending_size > min(max(len(self.keys), 1_000_000), self.max_pairs):
+            self.merge()
+
+    def merge(self):
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [k for k, _ in self.pending])
+        counts = np.concatenate([self.counts] + [c for _, c in self.pending])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(self.keys)).astype(np.int64)
+        self.pending, self.pending_size = [], 0
+        if len(self.keys) > self.max_pairs:
+            # Keep the max_pairs / 2 most frequent pairs, ties broken arbitrarily; sorted again so keys stay in order
+            kth = len(self.counts) - self.max_pairs // 2
+            keep = np.sort(np.argpartition(self.counts, kth)[kth:])
+            self.dropped += len(self.counts) - len(keep)
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+
+def count_sessions(path, catalog_ids, chunk_rows, max_pairs):
+    # One pass over the log. Sessions are runs of rows, as simulate_interactions.py writes them, so the
+    # last session of a chunk is held back until the next chunk shows where it ends.
+    num_items = len(catalog_ids)
+    item_counts = np.zeros(num_items, dtype=np.int64)
+    pair_counts = PairCounts(max_pairs)
+    num_baskets, rows = 0, 0
+    carry = None
+
+    def add(basket, item_ids):
+        nonlocal num_baskets
+        item = np.searchsorted(catalog_ids, item_ids)
+        known = catalog_ids[np.minimum(item, num_items - 1)] == item_ids
+        pairs, items, baskets = basket_pairs(basket[known], item[known], num_items)
+        item_counts[:] += np.bincount(items, minlength=num_items)
+        pair_counts.add(pairs)
+        num_baskets += baskets
+
+    for chunk in read_chunks(path, chunk_rows):
+        rows += len(chunk)
+        chunk = chunk.loc[chunk['interaction_type'].isin(BASKET_EVENTS), ['session_id', 'item_id']]
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if len(chunk) == 0:
+            continue
+        session = pd.factorize(chunk['session_id'])[0]
+        basket = np.cumsum(np.r_[True, session[1:] != session[:-1]]) - 1
+        last = int(np.searchsorted(basket, basket[-1]))
+        carry = chunk.iloc[last:]
+        add(basket[:last], chunk['item_id'].to_numpy(dtype=np.int64)[:last])
+        print(f"  {rows:,} rows read, {num_baskets:,} baskets")
+    if carry is not None and len(carry):
+        add(np.zeros(len(carry), dtype=np.int64), carry['item_id'].to_numpy(dtype=np.int64))
+    pair_counts.merge()
+    return item_counts, pair_counts, num_baskets
+
+def npmi_neighbours(item_counts, pair_counts, num_baskets, num_items, min_count, top_k):
+    """Top-K neighbours per item by normalised PMI, as CSR arrays over item codes.
+
+    NPMI = log(p(a, b) / (p(a) p(b))) / -log p(a, b): 0 for independent
+    items, 1 for items that only ever appear together. Unlike raw lift or
+    PMI it does not blow up for rare items, so one weight fits every pair.
+    Pairs seen fewer than min_count times, or not above chance, are dropped.
+    """
+    keep = pair_counts.counts >= min_count
+    a, b = pair_counts.keys[keep] // num_items, pair_counts.keys[keep] % num_items
+    p_ab = pair_counts.counts[keep] / num_baskets
+    p_a, p_b = item_counts[a] / num_baskets, item_counts[b] / num_baskets
+    with np.errstate(divide='ignore', invalid='ignore'):
+        npmi = np.where(p_ab < 1, np.log(p_ab / (p_a * p_b)) / -np.log(p_ab), 1.0)
+    positive = npmi > 0
+    src = np.concatenate([a[positive], b[positive]])
+    dst = np.concatenate([b[positive], a[positive]])
+    weight = np.concatenate([npmi[positive], npmi[positive]])
+
+    order = np.lexsort((-weight, src))
+    src, dst, weight = src[order], dst[order], weight[order]
+    degree = np.bincount(src, minlength=num_items)
+    rank = np.arange(len(src)) - np.repeat(np.cumsum(degree) - degree, degree)
+    top = rank < top_k
+    indptr = np.concatenate([[0], np.cumsum(np.minimum(degree, top_k))])
+    return indptr, dst[top], weight[top].astype(np.float32)
+
+def mine(interactions_path, items_path, out_path, chunk_rows, min_count, top_k, max_pairs):
+    print("Loading the Master Catalog")
+    ids = pd.read_parquet(items_path, columns=['item_id']) if items_path.endswith('.parquet') else pd.read_csv(items_path, usecols=['item_id'])
+    catalog_ids = np.unique(ids['item_id'].astype(np.int64).to_numpy())
+
+    print(f"Counting co-occurrences in {interactions_path}, {chunk_rows:,} rows at a time")
+    item_counts, pair_counts, num_baskets = count_sessions(interactions_path, catalog_ids, chunk_rows, max_pairs)
+    if pair_counts.dropped:
+        print(f"  Dropped {pair_counts.dropped:,} rare pairs to stay under {max_pairs:,}")
+    indptr, neighbours, weights = npmi_neighbours(item_counts, pair_counts, num_baskets, len(catalog_ids), min_count, top_k)
+
+    # CSR keyed by item_id; the backend snapshot re-keys it to catalog rows and memory-maps it
+    has_neighbours = np.flatnonzero(np.diff(indptr))
+    np.savez(out_path,
+             item_ids=catalog_ids[has_neighbours],
+             indptr=np.concatenate([[0], indptr[has_neighbours + 1]]),
+             neighbours=catalog_ids[neighbours],
+             weights=weights,
+             num_baskets=num_baskets)
+    print(f"SUCCESS. {len(pair_counts.keys):,} distinct pairs in {num_baskets:,} baskets; "
+          f"{len(neighbours):,} edges for {len(has_neighbours):,} items written to {out_path}")
+    return len(neighbours)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine item co-occurrence from session carts into a top-K NPMI graph")
+    parser.add_argument('--interactions', default='interactions.csv', help="CSV or Parquet from simulate_interactions.py")
+    parser.add_argument('--items', default='items.parquet' if os.path.exists('items.parquet') else 'master_items.csv',
+                        help="items.parquet from generate_catalog.py, or a catalog CSV")
+    parser.add_argument('--out', default='item_cooccurrence.npz')
+    parser.add_argument('--chunk-rows', type=int, default=5_000_000, help="log rows per chunk; bounds memory use")
+    parser.add_argument('--min-count', type=int, default=3, help="sessions a pair needs to count as a neighbour")
+    parser.add_argument('--top-k', type=int, default=20, help="neighbours kept per item")
+    parser.add_argument('--max-pairs', type=int, default=50_000_000, help="distinct pairs held while counting")
+    args = parser.parse_args()
+
+    mine(args.interactions, args.items, args.out, args.chunk_rows, args.min_count, args.top_k, args.max_pairs)
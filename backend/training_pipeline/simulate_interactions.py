@@ -1,20 +1,9 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
-
-print("Loading the Master Catalog")
-df = pd.read_csv("master_items.csv")
-
-# Pre-compute menus by restaurant and exact category
-restaurants = df.groupby('restaurant_id')
-res_menus = {}
-
-for res_id, group in restaurants:
-    res_menus[res_id] = {cat: group[group['category'] == cat]['item_id'].tolist() for cat in group['category'].unique()}
-    res_menus[res_id]['all'] = group['item_id'].tolist()
-
-res_ids = list(res_menus.keys())
 
 #Personas To simulate the user behavior (Explained in the docs on how we decided the values)
 personas = [
@@ -22,9 +11,9 @@ personas = [
         "name": "The Curry Feast",
         "weight": 0.25,
         "cart_rules": [
-            {"cat": "Wet Curry", "prob": 1.0}, 
-            {"cat": "Bread", "prob": 1.0},      
-            {"cat": "Starter", "prob": 0.5}, 
+            {"cat": "Wet Curry", "prob": 1.0},
+            {"cat": "Bread", "prob": 1.0},
+            {"cat": "Starter", "prob": 0.5},
             {"cat": "Drink", "prob": 0.4}
         ]
     },
@@ -32,8 +21,8 @@ personas = [
         "name": "The Biryani/Thali Diner",
         "weight": 0.20,
         "cart_rules": [
-            {"cat": "Dry Main", "prob": 1.0}, 
-            {"cat": "Side", "prob": 0.8},       
+            {"cat": "Dry Main", "prob": 1.0},
+            {"cat": "Side", "prob": 0.8},
             {"cat": "Drink", "prob": 0.5}
         ]
     },
@@ -41,8 +30,8 @@ personas = [
         "name": "The Fast Food Junkie",
         "weight": 0.25,
         "cart_rules": [
-            {"cat": "Fast Food Main", "prob": 1.0}, 
-            {"cat": "Side", "prob": 0.9},       
+            {"cat": "Fast Food Main", "prob": 1.0},
+            {"cat": "Side", "prob": 0.9},
             {"cat": "Drink", "prob": 0.8}
         ]
     },
@@ -50,67 +39,224 @@ personas = [
         "name": "The Chinese Takeout",
         "weight": 0.15,
         "cart_rules": [
-            {"cat": "Dry Main", "prob": 0.7},   
-            {"cat": "Wet Curry", "prob": 0.5},  
-            {"cat": "Starter", "prob": 0.6}     
+            {"cat": "Dry Main", "prob": 0.7},
+            {"cat": "Wet Curry", "prob": 0.5},
+            {"cat": "Starter", "prob": 0.6}
         ]
     },
     {
         "name": "The Sweet Tooth & Snack",
         "weight": 0.15,
         "cart_rules": [
-            {"cat": "Dessert", "prob": 0.8}, 
-            {"cat": "Side", "prob": 0.4}, 
+            {"cat": "Dessert", "prob": 0.8},
+            {"cat": "Side", "prob": 0.4},
             {"cat": "Drink", "prob": 0.5}
         ]
     }
 ]
 
-users = [f"U_{i}" for i in range(1, 3501)]
-persona_weights = [p["weight"] for p in personas]
-
-events = []
-current_time = datetime(2025, 12, 1, 12, 0)
-
-print("Simulating 100,000 Highly Structured Sessions")
-for session_num in range(100000):
-    user_id = random.choice(users)
-    persona = random.choices(personas, weights=persona_weights, k=1)[0]
-    
-    # Pick a random restaurant
-    res_id = random.choice(res_ids)
-    menu = res_menus[res_id]
-    
-    cart = []
-    
-    # Build the cart based on the structural rules
-    for rule in persona["cart_rules"]:
-        category = rule["cat"]
-        if random.random() < rule["prob"] and category in menu and menu[category]:
-            cart.append(random.choice(menu[category]))
-            
+NUM_USERS = 3500
+USER_IDS = [f"U_{i}" for i in range(1, NUM_USERS + 1)]
+INTERACTION_TYPES = ['view', 'add_to_cart', 'order']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+START_TIME = np.datetime64('2025-12-01T12:00:00', 's')
+
+def build_menus(df):
+    # res_menus as flat arrays: items of restaurant r in category c are
+    # items[start[r, c]:start[r, c] + count[r, c]], and each restaurant's whole menu is one contiguous run
+    res_codes, res_ids = pd.factorize(df['restaurant_id'], sort=True)
+    cat_codes, categories = pd.factorize(df['category'])
+    order = np.lexsort((cat_codes, res_codes))
+    count = np.zeros((len(res_ids), len(categories)), dtype=np.int64)
+    np.add.at(count, (res_codes, cat_codes), 1)
+    start = (np.cumsum(count) - count.ravel()).reshape(count.shape)
+
+    # cart_rules as (persona, rule) tables; a category no restaurant sells never fires
+    categories = list(categories)
+    max_rules = max(len(p["cart_rules"]) for p in personas)
+    rule_cat = np.full((len(personas), max_rules), -1)
+    rule_prob = np.zeros((len(personas), max_rules))
+    for p, persona in enumerate(personas):
+        for k, rule in enumerate(persona["cart_rules"]):
+            if rule["cat"] in categories:
+                rule_cat[p, k] = categories.index(rule["cat"])
+                rule_prob[p, k] = rule["prob"]
+
+    return {
+        'items': df['item_id'].to_numpy()[order], 'start': start, 'count': count,
+        'res_ids': np.asarray(res_ids), 'res_start': start[:, 0], 'res_count': count.sum(axis=1),
+        'rule_cat': rule_cat, 'rule_prob': rule_prob,
+        'persona_weights': np.array([p["weight"] for p in personas]) / sum(p["weight"] for p in personas),
+    }
+
+menus = None
+
+def set_menus(value):
+    # Process pool initializer: every worker gets the menu arrays once, not with every chunk
+    global menus
+    menus = value
+
+def simulate_chunk(seed, first_session, n):
+    """Sessions [first_session, first_session + n) as event arrays, times in seconds from the chunk start."""
+    rng = np.random.default_rng(seed)
+    user = rng.integers(0, NUM_USERS, n)
+    persona = rng.choice(len(personas), size=n, p=menus['persona_weights'])
+    res = rng.integers(0, len(menus['res_ids']), n)
+
+    # Build the cart based on the structural rules: one column per rule of the session's persona
+    cats = menus['rule_cat'][persona]
+    safe_cats = np.maximum(cats, 0)
+    counts = menus['count'][res[:, None], safe_cats]
+    picked = (rng.random(cats.shape) < menus['rule_prob'][persona]) & (cats >= 0) & (counts > 0)
+    positions = menus['start'][res[:, None], safe_cats] + (rng.random(cats.shape) * counts).astype(np.int64)
+    cart = menus['items'][np.minimum(positions, len(menus['items']) - 1)]
+
     # Fallback if the restaurant didn't have the specific categories for that persona
-    if not cart:
-        cart.append(random.choice(menu['all']))
-        
-    session_id = f"sess_{user_id}_{session_num}"
-    current_time += timedelta(minutes=random.randint(5, 60))
-    day_of_week = current_time.strftime('%A')
-    
-    # Generate the funnel events
-    for item in set(cart):
-        events.append([user_id, item, res_id, "view", current_time, session_id, day_of_week])
-        current_time += timedelta(seconds=random.randint(5, 15))
-        
-        if random.random() < 0.85: 
-            events.append([user_id, item, res_id, "add_to_cart", current_time, session_id, day_of_week])
-            current_time += timedelta(seconds=random.randint(10, 30))
-            
-            if random.random() < 0.70: 
-                events.append([user_id, item, res_id, "order", current_time, session_id, day_of_week])
-
-print("Exporting to interactions.csv")
-df_events = pd.DataFrame(events, columns=["user_id", "item_id", "restaurant_id", "interaction_type", "timestamp", "session_id", "day_of_week"])
-df_events = df_events.sort_values("timestamp")
-df_events.to_csv("interactions.csv", index=False)
-print(f"SUCCESS. Generated {len(df_events)} interaction rows.")
\ No newline at end of file
+    empty = ~picked.any(axis=1)
+    fallback = menus['items'][menus['res_start'][res] + (rng.random(n) * menus['res_count'][res]).astype(np.int64)]
+    cart[:, 0] = np.where(empty, fallback, cart[:, 0])
+    picked[:, 0] |= empty
+
+    # An item picked by two rules is only viewed once
+    for k in range(1, cart.shape[1]):
+        for j in range(k):
+            picked[:, k] &= ~(picked[:, j] & (cart[:, j] == cart[:, k]))
+
+    session_of, slot = np.nonzero(picked)
+    items = cart[session_of, slot]
+
+    # Funnel per cart item: view, then add_to_cart (85%), then order (70% of adds)
+    view_gap = rng.integers(5, 16, len(items))
+    added = rng.random(len(items)) < 0.85
+    add_gap = np.where(added, rng.integers(10, 31, len(items)), 0)
+    ordered = added & (rng.random(len(items)) < 0.70)
+    duration = view_gap + add_gap
+
+    # Each session starts 5-60 minutes after the previous one's last event clock tick
+    session_gap = rng.integers(5, 61, n) * 60
+    session_duration = np.bincount(session_of, weights=duration, minlength=n).astype(np.int64)
+    session_end = np.cumsum(session_gap + session_duration)
+    session_start = session_end - session_duration
+    elapsed = np.cumsum(duration) - duration
+    first_item = np.flatnonzero(np.r_[True, session_of[1:] != session_of[:-1]])
+    view_time = session_start[session_of] + elapsed - elapsed[first_item][session_of]
+
+    per_item = 1 + added.astype(np.int64) + ordered
+    event_item = np.repeat(np.arange(len(items)), per_item)
+    kind = np.arange(len(event_item)) - np.repeat(np.cumsum(per_item) - per_item, per_item)
+    time = view_time[event_item] + np.where(kind >= 1, view_gap[event_item], 0) + np.where(kind == 2, add_gap[event_item], 0)
+
+    event_session = session_of[event_item]
+    return {
+        'user': user[event_session],
+        'item_id': items[event_item],
+        'restaurant_id': menus['res_ids'][res[event_session]],
+        'kind': kind,
+        'time': time,
+        'session_start': session_start[event_session],
+        'session': event_session,
+        'session_ids': [f"sess_{USER_IDS[u]}_{first_session + s}" for s, u in enumerate(user.tolist())],
+        'duration': int(session_end[-1]),
+    }
+
+def chunk_frame(chunk, base):
+    timestamp = START_TIME + (base + chunk['time']).astype('timedelta64[s]')
+    session_start = START_TIME + (base + chunk['session_start']).astype('timedelta64[s]')
+    # Day of the session's start, like the original loop; 1970-01-01 was a Thursday
+    weekday = (session_start.astype('datetime64[D]').astype(np.int64) + 3) % 7
+    return pd.DataFrame({
+        "user_id": pd.Categorical.from_codes(chunk['user'], USER_IDS),
+        "item_id": chunk['item_id'],
+        "restaurant_id": chunk['restaurant_id'],
+        "interaction_type": pd.Categorical.from_codes(chunk['kind'], INTERACTION_TYPES),
+        "timestamp": timestamp,
+        "session_id": pd.Categorical.from_codes(chunk['session'], chunk['session_ids']),
+        "day_of_week": pd.Categorical.from_codes(weekday, DAY_NAMES),
+    })
+
+class ParquetOutput:
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        table = self.pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            # Dictionary-encoded strings, one row group per chunk
+            self.schema = self.pa.schema([f.with_type(self.pa.dictionary(self.pa.int32(), self.pa.string()))
+                                          if self.pa.types.is_dictionary(f.type) else f for f in table.schema])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class CSVOutput:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+def chunk_plan(sessions, chunk_sessions, seed):
+    # Seeds per chunk, so the output is identical whatever the number of workers
+    seeds = np.random.SeedSequence(seed).spawn((sessions + chunk_sessions - 1) // chunk_sessions)
+    return [(s, first, min(chunk_sessions, sessions - first)) for s, first in zip(seeds, range(0, sessions, chunk_sessions))]
+
+def simulate(items_path, out_path, sessions, chunk_sessions, seed, workers):
+    print("Loading the Master Catalog")
+    columns = ['item_id', 'restaurant_id', 'category']
+    df = pd.read_parquet(items_path, columns=columns) if items_path.endswith('.parquet') else pd.read_csv(items_path, usecols=columns)
+    set_menus(build_menus(df))
+
+    output = ParquetOutput(out_path) if out_path.endswith('.parquet') else CSVOutput(out_path)
+    plan = chunk_plan(sessions, chunk_sessions, seed)
+    total, base = 0, 0
+
+    def write(chunk):
+        nonlocal total, base
+        # Chunks are written in order and each starts where the previous one's clock stopped, so timestamps never go back
+        output.write(chunk_frame(chunk, base))
+        base += chunk['duration']
+        total += len(chunk['kind'])
+
+    print(f"Simulating {sessions:,} Highly Structured Sessions in {len(plan)} chunks")
+    if workers > 1:
+        # At most `workers + 1` chunks in flight, so memory stays flat however many sessions are requested
+        with ProcessPoolExecutor(workers, initializer=set_menus, initargs=(menus,)) as pool:
+            pending = deque()
+            for task in plan:
+                pending.append(pool.submit(simulate_chunk, *task))
+                if len(pending) > workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    else:
+        for task in plan:
+            write(simulate_chunk(*task))
+
+    output.close()
+    print(f"SUCCESS. Generated {total} interaction rows.")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate persona-driven sessions into an interaction log")
+    parser.add_argument('--items', default='items.parquet' if os.path.exists('items.parquet') else 'master_items.csv',
+                        help="items.parquet from generate_catalog.py, or a catalog CSV")
+    parser.add_argument('--out', default='interactions.csv', help="a .parquet path writes Parquet, anything else CSV")
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--chunk-sessions', type=int, default=250000, help="sessions per chunk; bounds memory use")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1, help="processes generating chunks in parallel")
+    args = parser.parse_args()
+
+    simulate(args.items, args.out, args.sessions, args.chunk_sessions, args.seed, min(args.workers, os.cpu_count() or 1))
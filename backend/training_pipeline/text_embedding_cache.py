@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+KEY_BYTES = 16
+
+def text_key(model_name, text):
+    # Content address: the same description under the same model always maps to the same row
+    return hashlib.sha256(f"{model_name}\n{text}".encode('utf-8')).digest()[:KEY_BYTES]
+
+class TextEmbeddingCache:
+    """Content-addressed store of text embeddings, one row per distinct (model, text).
+
+    Vectors are appended to a raw float32 file that is memory-mapped for
+    reads. keys.bin holds each row's key (a SHA-256 prefix of the model name
+    and the text) in the same order. Keys are written after their vectors, so
+    the number of keys is the number of complete rows even if a run dies
+    mid-append. Meant for one writer at a time.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, model_name.replace('/', '__'))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, 'vectors.f32')
+        self.keys_path = os.path.join(self.dir, 'keys.bin')
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+
+        self.dim = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)['dim']
+        keys = b''
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, 'rb') as f:
+                keys = f.read()
+        self.num_rows = len(keys) // KEY_BYTES
+        self.rows = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(self.num_rows)}
+        self.vectors = self.map_vectors()
+
+    def __len__(self):
+        return self.num_rows
+
+    def map_vectors(self):
+        if self.num_rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.num_rows, self.dim)).view(np.ndarray)
+
+    def append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_path, 'w') as f:
+                json.dump({'model': self.model_name, 'dim': self.dim}, f)
+        # Rows past the last complete key (left by an interrupted run) are overwritten
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(self.num_rows * self.dim * 4)
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.keys_path, 'ab') as f:
+            f.truncate(self.num_rows * KEY_BYTES)
+            f.write(b''.join(keys))
+            f.flush()
+            os.fsync(f.fileno())
+        for key in keys:
+            self.rows[key] = self.num_rows
+            self.num_rows += 1
+
+    def encode(self, texts, encoder, batch_size=256):
+        """Embeddings for texts, calling encoder(list_of_texts) only on distinct texts not cached yet."""
+        keys = [text_key(self.model_name, text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.rows and key not in missing:
+                missing[key] = text
+
+        if missing:
+            print(f"Encoding {len(missing)} new texts ({len(texts)} requested, {len(self.rows)} cached)")
+            new_keys, new_texts = list(missing), list(missing.values())
+            # Appended batch by batch, so an interrupted run keeps what it already encoded
+            for start in range(0, len(new_texts), batch_size):
+                self.append(new_keys[start:start + batch_size], encoder(new_texts[start:start + batch_size]))
+            self.vectors = self.map_vectors()
+
+        return self.vectors[[self.rows[key] for key in keys]]
@@ -1,14 +1,33 @@
+import os
 import pandas as pd
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-from sentence_transformers import SentenceTransformer
+from torch.utils.data import DataLoader
 from tqdm import tqdm
 
+from bpr_sampler import BPRBatches
+from text_embedding_cache import TextEmbeddingCache
+
+# A hub name, or a local directory holding the model for offline runs
+TEXT_MODEL = os.environ.get('ZOMATHON_TEXT_MODEL', 'all-MiniLM-L6-v2')
+TEXT_CACHE_DIR = os.environ.get('ZOMATHON_TEXT_CACHE_DIR', 'embedding_cache')
+# items.parquet from generate_catalog.py; catalogs generated before it are master_items.csv
+ITEMS_PATH = 'items.parquet' if os.path.exists('items.parquet') else 'master_items.csv'
+
+def read_items(path):
+    # Read like the backend's snapshot.read_catalog: Parquet categoricals back to plain values
+    if not path.endswith('.parquet'):
+        return pd.read_csv(path)
+    df = pd.read_parquet(path)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
 print("Loading Data...")
-items_df = pd.read_csv("master_items.csv")
+items_df = read_items(ITEMS_PATH)
 interactions_df = pd.read_csv("interactions.csv")
 
 # Create contiguous indices for PyTorch
@@ -26,34 +45,45 @@ print(f"Mapped {num_users} users and {num_items} items.")
 
 # NLP TEXT EMBEDDINGS 
 print("Extracting NLP Text Embeddings (SentenceTransformers)")
-text_model = SentenceTransformer('all-MiniLM-L6-v2')
+text_model = None
+
+def encode_texts(texts):
+    # The model is only loaded when some description is not in the cache yet
+    global text_model
+    if text_model is None:
+        from sentence_transformers import SentenceTransformer
+        text_model = SentenceTransformer(TEXT_MODEL)
+    return text_model.encode(texts, show_progress_bar=True)
 
 items_df['item_idx'] = items_df['item_id'].map(item_mapping)
 items_df = items_df.sort_values('item_idx')
 
+# Descriptions repeat a few templates: each distinct one is encoded once, ever, per model.
+# A local copy of the model shares the cache with the hub name it was downloaded from.
+text_cache = TextEmbeddingCache(TEXT_CACHE_DIR, os.path.basename(os.path.normpath(TEXT_MODEL)))
 descriptions = items_df['description'].tolist()
-text_embeddings = text_model.encode(descriptions, show_progress_bar=True)
+text_embeddings = text_cache.encode(descriptions, encode_texts)
 text_embeddings_tensor = torch.tensor(text_embeddings, dtype=torch.float32)
 
 print("Building Implicit Feedback Dataset...")
-class BPRDataset(Dataset):
-    def __init__(self, interactions, num_items):
-        # Only use Add to Cart and Orders as strong positive signals
-        positives = interactions[interactions['interaction_type'].isin(['add_to_cart', 'order'])]
-        self.user_item_pairs = positives[['user_idx', 'item_idx']].drop_duplicates().values
-        self.num_items = num_items
-
-    def __len__(self):
-        return len(self.user_item_pairs)
-
-    def __getitem__(self, idx):
-        user_idx, pos_item_idx = self.user_item_pairs[idx]
-        # Negative Sampling: Grab a random item the user didn't interact with here
-        neg_item_idx = np.random.randint(self.num_items)
-        return torch.tensor(user_idx), torch.tensor(pos_item_idx), torch.tensor(neg_item_idx)
-
-train_dataset = BPRDataset(interactions_df, num_items)
-train_loader = DataLoader(train_dataset, batch_size=2048, shuffle=True)
+# Negatives per positive pair; HARD_NEGATIVE_RATIO of them come from the positive item's own restaurant
+NUM_NEGATIVES = 1
+HARD_NEGATIVE_RATIO = 0.0
+# Also rank every user's positive above the other positives in the same batch
+IN_BATCH_NEGATIVES = False
+# Batches are built from in-memory tensors; extra worker processes only pay off when the model step is on a GPU
+LOADER_WORKERS = 0
+
+# Only use Add to Cart and Orders as strong positive signals
+positives = interactions_df[interactions_df['interaction_type'].isin(['add_to_cart', 'order'])]
+user_item_pairs = positives[['user_idx', 'item_idx']].drop_duplicates().to_numpy()
+
+train_batches = BPRBatches(
+    user_item_pairs[:, 0], user_item_pairs[:, 1], num_items, batch_size=2048,
+    num_negatives=NUM_NEGATIVES, item_restaurants=items_df['restaurant_id'].to_numpy(),
+    hard_negative_ratio=HARD_NEGATIVE_RATIO,
+)
+train_loader = DataLoader(train_batches, batch_size=None, num_workers=LOADER_WORKERS, pin_memory=torch.cuda.is_available())
 
 print("Initializing Two-Tower Architecture...")
 class TwoTowerModel(nn.Module):
@@ -73,19 +103,19 @@ class TwoTowerModel(nn.Module):
             nn.Linear(128, 32)
         )
 
+    def item_vectors(self, item_idx):
+        # ID + Compressed Text, for item index tensors of any shape
+        id_vec = self.item_id_embedding(item_idx)
+        text_vec = self.text_projection(self.text_embedding(item_idx))
+        return torch.cat([id_vec, text_vec], dim=-1) # 32 + 32 = 64D
+
     def forward(self, user_idx, pos_item_idx, neg_item_idx):
         # Get User Vector
         user_vec = self.user_embedding(user_idx)
         
-        # Get Positive Item Vector (ID + Compressed Text)
-        pos_id_vec = self.item_id_embedding(pos_item_idx)
-        pos_text_vec = self.text_projection(self.text_embedding(pos_item_idx))
-        pos_item_vec = torch.cat([pos_id_vec, pos_text_vec], dim=1) # 32 + 32 = 64D
-        
-        # Get Negative Item Vector
-        neg_id_vec = self.item_id_embedding(neg_item_idx)
-        neg_text_vec = self.text_projection(self.text_embedding(neg_item_idx))
-        neg_item_vec = torch.cat([neg_id_vec, neg_text_vec], dim=1)
+        # Positive items are (batch,), negatives (batch, num_negatives)
+        pos_item_vec = self.item_vectors(pos_item_idx)
+        neg_item_vec = self.item_vectors(neg_item_idx)
         
         return user_vec, pos_item_vec, neg_item_vec
 
@@ -103,11 +133,18 @@ optimizer = optim.Adam(model.parameters(), lr=0.005)
 # BPR Loss Function (Bayesian Personalized Ranking)
 def bpr_loss(user_vec, pos_item_vec, neg_item_vec):
     pos_scores = (user_vec * pos_item_vec).sum(dim=1)
-    neg_scores = (user_vec * neg_item_vec).sum(dim=1)
+    neg_scores = (user_vec[:, None, :] * neg_item_vec).sum(dim=2)
     # Maximize distance between positive and negative items
-    loss = -torch.nn.functional.logsigmoid(pos_scores - neg_scores).mean()
+    loss = -torch.nn.functional.logsigmoid(pos_scores[:, None] - neg_scores).mean()
     return loss
 
+def in_batch_bpr_loss(user_vec, pos_item_vec, pos_items):
+    # Every other positive in the batch is a free negative, unless it is the same item
+    scores = user_vec @ pos_item_vec.T
+    mask = pos_items[None, :] != pos_items[:, None]
+    pairwise = torch.nn.functional.logsigmoid(scores.diagonal()[:, None] - scores)
+    return -(pairwise * mask).sum() / mask.sum().clamp(min=1)
+
 #The Training Loop
 epochs = 10
 print(f"Commencing Training on {device} for {epochs} Epochs...")
@@ -116,12 +153,16 @@ for epoch in range(epochs):
     model.train()
     total_loss = 0
     
+    train_batches.set_epoch(epoch)
+    
     for users, pos_items, neg_items in tqdm(train_loader, desc=f"Epoch {epoch+1}/{epochs}"):
         users, pos_items, neg_items = users.to(device), pos_items.to(device), neg_items.to(device)
         
         optimizer.zero_grad()
         user_vec, pos_vec, neg_vec = model(users, pos_items, neg_items)
         loss = bpr_loss(user_vec, pos_vec, neg_vec)
+        if IN_BATCH_NEGATIVES:
+            loss = loss + in_batch_bpr_loss(user_vec, pos_vec, pos_items)
         
         loss.backward()
         optimizer.step()
@@ -137,4 +178,17 @@ final_embeddings = model.get_all_item_embeddings()
 # Save the matrix
 np.save("final_backend_embeddings.npy", final_embeddings)
 print("SUCCESS. Matrix Shape:", final_embeddings.shape)
-print("Move the'final_backend_embeddings.npy' and 'items.csv' to the root backend directory")
+
+# User tower, for personalized recommendations (see user_store.py); row i belongs to user_ids[i]
+np.save("final_user_embeddings.npy", model.user_embedding.weight.detach().cpu().numpy())
+np.save("final_user_ids.npy", np.array([str(uid) for uid in user_mapping], dtype=str))
+print("User Matrix Shape:", (num_users, model.user_embedding.embedding_dim))
+
+# Text tower weights, so item_additions.py can embed new items without retraining
+first, last = model.text_projection[0], model.text_projection[2]
+np.savez("text_projection.npz",
+         w1=first.weight.detach().cpu().numpy(), b1=first.bias.detach().cpu().numpy(),
+         w2=last.weight.detach().cpu().numpy(), b2=last.bias.detach().cpu().numpy(),
+         text_model=TEXT_MODEL)
+catalog_name = 'items.parquet' if ITEMS_PATH.endswith('.parquet') else 'items.csv'
+print(f"Move the'final_backend_embeddings.npy', 'final_user_embeddings.npy', 'final_user_ids.npy', 'text_projection.npz' and '{catalog_name}' to the root backend directory")
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import numpy as np
+
+from embedding_store import EmbeddingStore, write_embedding_store
+
+# Written by train_twotower.py next to final_backend_embeddings.npy: the user tower and each row's user_id
+USER_EMBEDDINGS_NAME = 'final_user_embeddings.npy'
+USER_IDS_NAME = 'final_user_ids.npy'
+
+def user_key(user_id):
+    # 64-bit hash of the id: fixed-width keys that can be sorted, mapped and binary-searched
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+def user_sources(npy_path):
+    # The exported user tower files next to the item matrix, or [] when the model has none
+    folder = os.path.dirname(os.path.abspath(npy_path))
+    paths = [os.path.join(folder, USER_EMBEDDINGS_NAME), os.path.join(folder, USER_IDS_NAME)]
+    return paths if all(os.path.exists(p) for p in paths) else []
+
+def write_user_store(folder, embeddings_path, ids_path, dtype='float32'):
+    # user_keys.npy sorted, user_vectors.npy in the same order and unit length; returns the number of users
+    vectors = np.load(embeddings_path)
+    ids = np.load(ids_path)
+    if len(ids) != len(vectors):
+        raise ValueError(f"{len(ids)} user ids for {len(vectors)} user vectors")
+    keys = np.array([user_key(user_id) for user_id in ids.tolist()], dtype=np.uint64)
+    order = np.argsort(keys, kind='stable')
+    if len(keys) > 1 and (np.diff(keys[order]) == 0).any():
+        raise ValueError("Duplicate user ids (or a 64-bit hash collision) in the exported user tower")
+    np.save(os.path.join(folder, 'user_keys.npy'), keys[order])
+    write_embedding_store(os.path.join(folder, 'user_vectors.npy'), vectors[order], dtype, normalize=True)
+    return len(keys)
+
+class UserStore:
+    """Memory-mapped Two-Tower user vectors with an id -> row index.
+
+    Keys are 64-bit hashes of the user ids, sorted, so a lookup is one
+    binary search over a mapped array and no per-user Python objects are
+    held. Vectors are unit length: a dot product with candidate_vectors is
+    the cosine between the user and an item.
+    """
+
+    def __init__(self, keys, vectors):
+        self.keys = keys
+        self.vectors = vectors
+
+    @classmethod
+    def load(cls, folder):
+        return cls(np.load(os.path.join(folder, 'user_keys.npy'), mmap_mode='r').view(np.ndarray),
+                   EmbeddingStore(os.path.join(folder, 'user_vectors.npy'), normalized=True))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row(self, user_id):
+        key = np.uint64(user_key(user_id))
+        pos = np.searchsorted(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return int(pos)
+        return None
+
+    def vector(self, user_id):
+        # The user's vector, or None for a user the model was not trained on
+        row = self.row(user_id)
+        return None if row is None else self.vectors[row]
@@ -2,6 +2,23 @@ import React, { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useCart } from '../context/CartContext';
 
+// Every recommendation shown is an impression; adds are logged by the cart, so accept rate = adds / impressions
+const logImpressions = (anchorItemId, recs) => {
+  if (recs.length === 0) return;
+  fetch("http://localhost:8000/log_interactions", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      events: recs.map((rec) => ({
+        user_id: "demo_judge_user",
+        anchor_item_id: anchorItemId,
+        recommended_item_id: rec.item_id,
+        action: "impression"
+      }))
+    })
+  }).catch(err => console.error("ML Logging failed:", err));
+};
+
 const AddOnDrawer = ({ isOpen, onClose, item }) => {
   const { addToCart } = useCart();
   const [recommendations, setRecommendations] = useState([]);
@@ -16,6 +33,7 @@ const AddOnDrawer = ({ isOpen, onClose, item }) => {
         .then((data) => {
           setRecommendations(data || []);
           setLoading(false);
+          logImpressions(item.item_id, data || []);
         })
         .catch((err) => {
           console.error("Failed to fetch ML recommendations:", err);
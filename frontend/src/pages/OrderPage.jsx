@@ -19,13 +19,16 @@ const OrderPage = () => {
   useEffect(() => {
     if (cart.length > 0) {
       setLoading(true);
-      const lastItem = cart[cart.length - 1];
 
-      // Fetching 64D Embedding recommendations from FastAPI
-      fetch(`http://localhost:8000/recommend/${lastItem.item_id}`)
+      // One batch call scores the whole cart and leaves out what's already in it
+      fetch('http://localhost:8000/recommend/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ item_ids: cart.map(item => item.item_id), top_n: 6 })
+      })
         .then(res => res.json())
         .then(data => {
-          setRecs(data);
+          setRecs(data.cart || []);
           setLoading(false);
         })
         .catch(err => {